@@ -1,6 +1,11 @@
 import streamlit as st
 
-from ui_components.navigation import load_user_settings
+from database.db import DatabaseManager
+from database.query_metrics import track_queries
+from services.usage_service import get_usage_writer_stats
+from ui_components.navigation import load_user_settings, render_database_status
+from ui_components.query_debug import render_query_debug_panel
+from utils.config import QUERY_DEBUG
 from utils.env_loader import load_environment_variables
 from utils.error_handlers import handle_error
 from views.evaluation_settings_page import evaluation_settings_ui
@@ -55,6 +60,15 @@ if "evaluation_processing_time" not in st.session_state:
 
 @handle_error
 def main():
+    with track_queries("script_run") as scope:
+        render_database_status()
+        render_current_page()
+
+    if QUERY_DEBUG:
+        render_query_debug_panel(scope.summary(), DatabaseManager.pool_stats(), get_usage_writer_stats())
+
+
+def render_current_page():
     if st.session_state.current_page == "prompt_edit":
         prompt_management_ui()
         return
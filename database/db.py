@@ -1,12 +1,24 @@
 import os
-from typing import Any, Dict, List, Optional, Type
-
-from sqlalchemy import create_engine, text
-from sqlalchemy.orm import sessionmaker
-from sqlalchemy.pool import QueuePool
+import threading
+import time
+from contextlib import ExitStack, contextmanager
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Type
+
+from sqlalchemy import UniqueConstraint, and_, case, create_engine, delete, insert, or_, select, text, tuple_, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+from sqlalchemy.engine import Engine
+from sqlalchemy.exc import SQLAlchemyError
+from sqlalchemy.orm import Session, sessionmaker
 
 from database.models import Base
+from database.pool_metrics import InstrumentedQueuePool, get_pool_stats
 from utils.config import (
+    DB_MAX_OVERFLOW,
+    DB_POOL_RECYCLE,
+    DB_PROBE_MAX_INTERVAL,
+    DB_POOL_SIZE,
+    DB_POOL_TIMEOUT,
     POSTGRES_DB,
     POSTGRES_HOST,
     POSTGRES_PASSWORD,
@@ -17,22 +29,62 @@ from utils.config import (
 from utils.constants import MESSAGES
 from utils.exceptions import DatabaseError
 
+# ON CONFLICTに対応した方言ごとのINSERT構築関数
+UPSERT_INSERTS = {
+    "postgresql": pg_insert,
+    "sqlite": sqlite_insert,
+}
+
 
 class DatabaseManager:
-    _instance = None
-    _engine = None
-    _session_factory = None
+    _instance: Optional["DatabaseManager"] = None
+    _engine: Optional[Engine] = None
+    _session_factory: Optional[sessionmaker] = None
+    _ready = threading.Event()
+    _ready_error: Optional[str] = None
+    _lock = threading.RLock()
+    _pid: Optional[int] = None
 
     @classmethod
     def get_instance(cls):
         if cls._instance is None:
-            cls._instance = DatabaseManager()
+            with cls._lock:
+                if cls._instance is None:
+                    cls._instance = DatabaseManager()
+        DatabaseManager._check_pid()
         return cls._instance
 
     def __init__(self):
         if DatabaseManager._engine is not None:
             return
 
+        with DatabaseManager._lock:
+            if DatabaseManager._engine is None:
+                DatabaseManager._create_engine()
+
+    @staticmethod
+    def _check_pid() -> None:
+        """
+        fork後の子プロセスでは親プロセスの接続を使わないようプールを作り直す
+
+        dispose(close=False)は親プロセスが使用中の接続を閉じずにプールだけを破棄する
+        """
+        if DatabaseManager._engine is None or DatabaseManager._pid in (None, os.getpid()):
+            return
+
+        with DatabaseManager._lock:
+            if DatabaseManager._engine is not None and DatabaseManager._pid != os.getpid():
+                DatabaseManager._engine.dispose(close=False)
+                DatabaseManager._pid = os.getpid()
+
+    @staticmethod
+    def _after_fork_in_child() -> None:
+        # fork時に他のスレッドが保持していたロックは子プロセスで解放されないため作り直す
+        DatabaseManager._lock = threading.RLock()
+        DatabaseManager._check_pid()
+
+    @staticmethod
+    def _create_engine() -> None:
         database_url = os.environ.get("DATABASE_URL")
 
         if database_url:
@@ -61,115 +113,199 @@ class DatabaseManager:
         try:
             DatabaseManager._engine = create_engine(
                 connection_string,
-                poolclass=QueuePool,
+                poolclass=InstrumentedQueuePool,
                 pool_pre_ping=True,
-                pool_size=5,
-                max_overflow=10,
-                pool_timeout=30,
-                pool_recycle=3600
+                pool_size=DB_POOL_SIZE,
+                max_overflow=DB_MAX_OVERFLOW,
+                pool_timeout=DB_POOL_TIMEOUT,
+                pool_recycle=DB_POOL_RECYCLE
             )
 
             DatabaseManager._session_factory = sessionmaker(bind=DatabaseManager._engine)
-
-            with DatabaseManager._engine.connect() as conn:
-                conn.execute(text("SELECT 1"))
+            DatabaseManager._pid = os.getpid()
 
         except Exception as e:
             raise DatabaseError(MESSAGES["DATABASE_CONNECTION_ERROR"].format(error=str(e)))
 
+        # 接続確認は画面の初回描画を待たせないようバックグラウンドで行う
+        DatabaseManager._ready = threading.Event()
+        DatabaseManager._ready_error = None
+        threading.Thread(
+            target=DatabaseManager._probe_connection,
+            args=(DatabaseManager._engine, DatabaseManager._ready),
+            name="database-probe",
+            daemon=True
+        ).start()
+
     @staticmethod
-    def get_engine():
+    def _probe_connection(engine, ready: threading.Event) -> None:
+        """接続できるまで再試行し、接続後にプールへpool_size分の接続を確保する"""
+        delay = 1.0
+        while engine is DatabaseManager._engine:
+            try:
+                with engine.connect() as conn:
+                    conn.execute(text("SELECT 1"))
+                break
+            except Exception as e:
+                DatabaseManager._ready_error = MESSAGES["DATABASE_CONNECTION_ERROR"].format(error=str(e))
+                print(f"{DatabaseManager._ready_error}（{delay:.0f}秒後に再試行します）")
+                time.sleep(delay)
+                delay = min(delay * 2, DB_PROBE_MAX_INTERVAL)
+        else:
+            return
+
+        DatabaseManager._ready_error = None
+        ready.set()
+
+        try:
+            with ExitStack() as stack:
+                for _ in range(DB_POOL_SIZE):
+                    stack.enter_context(engine.connect())
+        except Exception as e:
+            print(f"コネクションプールのウォームアップに失敗しました: {str(e)}")
+
+    @staticmethod
+    def is_ready() -> bool:
+        """バックグラウンドの接続確認が完了しているかを返す"""
+        return DatabaseManager._ready.is_set()
+
+    @staticmethod
+    def wait_until_ready(timeout: Optional[float] = None) -> bool:
+        """接続確認の完了を最大timeout秒待ち、完了したかを返す"""
+        return DatabaseManager._ready.wait(timeout)
+
+    @staticmethod
+    def readiness_error() -> Optional[str]:
+        """直近の接続確認で発生したエラーメッセージを返す"""
+        return DatabaseManager._ready_error
+
+    @staticmethod
+    def get_engine() -> Engine:
+        if DatabaseManager._engine is None:
+            raise DatabaseError(MESSAGES["DATABASE_NOT_INITIALIZED"])
+        DatabaseManager._check_pid()
         return DatabaseManager._engine
 
+    @staticmethod
+    def pool_stats() -> Dict[str, Any]:
+        """コネクションプールの使用状況とチェックアウト待ち時間を返す"""
+        return {**get_pool_stats(DatabaseManager._engine), "max_overflow": DB_MAX_OVERFLOW}
+
     @staticmethod
     def get_session():
         if DatabaseManager._session_factory is None:
             raise DatabaseError(MESSAGES["DATABASE_NOT_INITIALIZED"])
+        DatabaseManager._check_pid()
         return DatabaseManager._session_factory()
 
-    def query_all(self, model_class: Type[Base], filters: Optional[Dict[str, Any]] = None,
-                  order_by: Optional[Any] = None) -> List[Dict[str, Any]]:
+    @contextmanager
+    def _session_scope(self, error_key: str, commit: bool = False) -> Iterator[Session]:
+        """1操作分のセッションを開き、エラー時はロールバックしてDatabaseErrorに変換する"""
+        session = self.get_session()
+        try:
+            yield session
+            if commit:
+                session.commit()
+
+        except Exception as e:
+            session.rollback()
+            raise DatabaseError(MESSAGES[error_key].format(error=str(e)))
+        finally:
+            session.close()
+
+    @contextmanager
+    def unit_of_work(self) -> Iterator["UnitOfWork"]:
         """
-        ORMを使用して全レコードを取得する
+        複数の読み書きを1つのセッション・トランザクションで実行する
 
-        Args:
-            model_class: クエリ対象のモデルクラス
-            filters: フィルタ条件の辞書
-            order_by: ソート条件
+        ブロックを正常に抜けた時点でコミットし、例外が発生した場合はロールバックする。
+
+        使用例:
+            with db_manager.unit_of_work() as uow:
+                existing = uow.query_one(Prompt, filters)
+                uow.insert(Prompt, data)
 
         Returns:
-            辞書形式のレコードリスト
+            UnitOfWork
         """
         session = self.get_session()
         try:
-            query = session.query(model_class)
-
-            if filters:
-                for key, value in filters.items():
-                    if hasattr(model_class, key):
-                        query = query.filter(getattr(model_class, key) == value)
-
-            if order_by is not None:
-                query = query.order_by(order_by)
-
-            results = query.all()
-            return [self._model_to_dict(record) for record in results]
+            yield UnitOfWork(session)
+            session.commit()
 
-        except Exception as e:
+        except SQLAlchemyError as e:
+            session.rollback()
+            raise DatabaseError(MESSAGES["DATABASE_TRANSACTION_ERROR"].format(error=str(e)))
+        except Exception:
             session.rollback()
-            raise DatabaseError(MESSAGES["DATABASE_QUERY_ERROR"].format(error=str(e)))
+            raise
         finally:
             session.close()
 
-    def query_one(self, model_class: Type[Base], filters: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+    def query_all(self, model_class: Type[Base], filters: Optional[Dict[str, Any]] = None,
+                  order_by: Optional[Any] = None, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
         """
-        ORMを使用して1レコードを取得する
+        全レコードを取得する
 
         Args:
             model_class: クエリ対象のモデルクラス
             filters: フィルタ条件の辞書
+            order_by: ソート条件
+            columns: 取得する列名のリスト（未指定の場合は全列）
+
+        Returns:
+            辞書形式のレコードリスト
+        """
+        with self._session_scope("DATABASE_QUERY_ERROR") as session:
+            return self._query_all(session, model_class, filters, order_by, columns)
+
+    def query_one(self, model_class: Type[Base], filters: Dict[str, Any],
+                  columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        1レコードを取得する
+
+        Args:
+            model_class: クエリ対象のモデルクラス
+            filters: フィルタ条件の辞書
+            columns: 取得する列名のリスト（未指定の場合は全列）
 
         Returns:
             辞書形式のレコード、見つからない場合はNone
         """
-        session = self.get_session()
-        try:
-            query = session.query(model_class)
+        with self._session_scope("DATABASE_QUERY_ERROR") as session:
+            return self._query_one(session, model_class, filters, columns)
 
-            for key, value in filters.items():
-                if hasattr(model_class, key):
-                    query = query.filter(getattr(model_class, key) == value)
+    def query_first_match(self, model_class: Type[Base], candidates: List[Dict[str, Any]],
+                          columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        """
+        複数の検索条件のうち、最も優先度の高い条件に一致する1レコードを1回のクエリで取得する
 
-            record = query.first()
-            return self._model_to_dict(record) if record else None
+        Args:
+            model_class: クエリ対象のモデルクラス
+            candidates: フィルタ条件の辞書のリスト（先頭ほど優先度が高い）
+            columns: 取得する列名のリスト（未指定の場合は全列）
 
-        except Exception as e:
-            session.rollback()
-            raise DatabaseError(MESSAGES["DATABASE_QUERY_ERROR"].format(error=str(e)))
-        finally:
-            session.close()
+        Returns:
+            辞書形式のレコード、見つからない場合はNone
+        """
+        with self._session_scope("DATABASE_QUERY_ERROR") as session:
+            return self._query_first_match(session, model_class, candidates, columns)
 
-    def get_by_id(self, model_class: Type[Base], record_id: int) -> Optional[Dict[str, Any]]:
+    def get_by_id(self, model_class: Type[Base], record_id: int,
+                  columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
         """
         IDでレコードを取得する
 
         Args:
             model_class: クエリ対象のモデルクラス
             record_id: 取得するレコードのID
+            columns: 取得する列名のリスト（未指定の場合は全列）
 
         Returns:
             辞書形式のレコード、見つからない場合はNone
         """
-        session = self.get_session()
-        try:
-            record = session.get(model_class, record_id)
-            return self._model_to_dict(record) if record else None
-
-        except Exception as e:
-            session.rollback()
-            raise DatabaseError(MESSAGES["DATABASE_GET_RECORD_ERROR"].format(error=str(e)))
-        finally:
-            session.close()
+        with self._session_scope("DATABASE_GET_RECORD_ERROR") as session:
+            return self._get_by_id(session, model_class, record_id, columns)
 
     def insert(self, model_class: Type[Base], data: Dict[str, Any]) -> Dict[str, Any]:
         """
@@ -182,19 +318,8 @@ class DatabaseManager:
         Returns:
             挿入されたレコードの辞書形式
         """
-        session = self.get_session()
-        try:
-            record = model_class(**data)
-            session.add(record)
-            session.commit()
-            session.refresh(record)
-            return self._model_to_dict(record)
-
-        except Exception as e:
-            session.rollback()
-            raise DatabaseError(MESSAGES["DATABASE_INSERT_ERROR"].format(error=str(e)))
-        finally:
-            session.close()
+        with self._session_scope("DATABASE_INSERT_ERROR", commit=True) as session:
+            return self._insert(session, model_class, data)
 
     def update(self, model_class: Type[Base], filters: Dict[str, Any],
                update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
@@ -209,37 +334,33 @@ class DatabaseManager:
         Returns:
             更新されたレコードの辞書形式、見つからない場合はNone
         """
-        session = self.get_session()
-        try:
-            query = session.query(model_class)
-
-            for key, value in filters.items():
-                if hasattr(model_class, key):
-                    query = query.filter(getattr(model_class, key) == value)
-
-            record = query.first()
-            if record is None:
-                return None
+        with self._session_scope("DATABASE_UPDATE_ERROR", commit=True) as session:
+            return self._update(session, model_class, filters, update_data)
 
-            for key, value in update_data.items():
-                if hasattr(record, key):
-                    setattr(record, key, value)
+    def update_where(self, model_class: Type[Base], filters: Dict[str, Any], values: Dict[str, Any]) -> int:
+        """
+        条件に一致する全レコードを1回のUPDATE文で更新する
 
-            session.commit()
-            session.refresh(record)
-            return self._model_to_dict(record)
+        Args:
+            model_class: 更新対象のモデルクラス
+            filters: 検索条件の辞書（空の場合はエラー）
+            values: 更新データの辞書
 
-        except Exception as e:
-            session.rollback()
-            raise DatabaseError(MESSAGES["DATABASE_UPDATE_ERROR"].format(error=str(e)))
-        finally:
-            session.close()
+        Returns:
+            更新されたレコード数
+        """
+        with self._session_scope("DATABASE_UPDATE_ERROR", commit=True) as session:
+            return self._update_where(session, model_class, filters, values)
 
     def upsert(self, model_class: Type[Base], filters: Dict[str, Any],
                data: Dict[str, Any]) -> Dict[str, Any]:
         """
         レコードを挿入または更新する
 
+        filtersの列がモデルの一意制約と一致し、ON CONFLICTに対応したDBに接続している場合は
+        INSERT ... ON CONFLICT DO UPDATE ... RETURNING を1回発行する。
+        それ以外の場合は検索してから挿入または更新する。
+
         Args:
             model_class: 対象のモデルクラス
             filters: 検索条件の辞書
@@ -248,34 +369,70 @@ class DatabaseManager:
         Returns:
             挿入/更新されたレコードの辞書形式
         """
-        session = self.get_session()
-        try:
-            query = session.query(model_class)
+        with self._session_scope("DATABASE_UPSERT_ERROR", commit=True) as session:
+            return self._upsert(session, model_class, filters, data)
 
-            for key, value in filters.items():
-                if hasattr(model_class, key):
-                    query = query.filter(getattr(model_class, key) == value)
+    def insert_many(self, model_class: Type[Base], rows: List[Dict[str, Any]],
+                    returning: bool = False) -> List[Dict[str, Any]]:
+        """
+        複数レコードを1トランザクションでまとめて挿入する
 
-            record = query.first()
+        Args:
+            model_class: 挿入対象のモデルクラス
+            rows: 挿入するデータの辞書のリスト（各辞書のキーは揃える）
+            returning: Trueの場合は挿入されたレコードを返す
 
-            if record:
-                for key, value in data.items():
-                    if hasattr(record, key):
-                        setattr(record, key, value)
-            else:
-                merged_data = {**filters, **data}
-                record = model_class(**merged_data)
-                session.add(record)
+        Returns:
+            returningがTrueの場合は挿入されたレコードの辞書形式のリスト、Falseの場合は空リスト
+        """
+        if not rows:
+            return []
 
-            session.commit()
-            session.refresh(record)
-            return self._model_to_dict(record)
+        with self._session_scope("DATABASE_INSERT_ERROR", commit=True) as session:
+            return self._insert_many(session, model_class, rows, returning)
 
-        except Exception as e:
-            session.rollback()
-            raise DatabaseError(MESSAGES["DATABASE_UPSERT_ERROR"].format(error=str(e)))
-        finally:
-            session.close()
+    def insert_missing(self, model_class: Type[Base], rows: List[Dict[str, Any]],
+                       key_columns: List[str]) -> int:
+        """
+        キー列が未登録のレコードだけを1トランザクションでまとめて挿入する
+
+        既存キーを1回のクエリで取得し、存在しない行を1回の一括INSERTで挿入する。
+
+        Args:
+            model_class: 挿入対象のモデルクラス
+            rows: 挿入候補のデータの辞書のリスト（各辞書のキーは揃える）
+            key_columns: 既存判定に使う列名
+
+        Returns:
+            挿入したレコード数
+        """
+        if not rows:
+            return 0
+
+        with self._session_scope("DATABASE_INSERT_ERROR", commit=True) as session:
+            return self._insert_missing(session, model_class, rows, key_columns)
+
+    def upsert_many(self, model_class: Type[Base], rows: List[Dict[str, Any]], conflict_columns: List[str],
+                    returning: bool = False,
+                    accumulate_columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        """
+        複数レコードを1回のINSERT ... ON CONFLICT DO UPDATEで挿入または更新する
+
+        Args:
+            model_class: 対象のモデルクラス
+            rows: 挿入/更新するデータの辞書のリスト（各辞書のキーは揃える）
+            conflict_columns: 一意制約または一意インデックスの列名
+            returning: Trueの場合は挿入/更新されたレコードを返す
+            accumulate_columns: 競合時に既存値へ加算する列名（集計テーブルの増分更新用）
+
+        Returns:
+            returningがTrueの場合は挿入/更新されたレコードの辞書形式のリスト、Falseの場合は空リスト
+        """
+        if not rows:
+            return []
+
+        with self._session_scope("DATABASE_UPSERT_ERROR", commit=True) as session:
+            return self._upsert_many(session, model_class, rows, conflict_columns, returning, accumulate_columns)
 
     def delete(self, model_class: Type[Base], filters: Dict[str, Any]) -> bool:
         """
@@ -288,27 +445,22 @@ class DatabaseManager:
         Returns:
             削除成功時はTrue、見つからない場合はFalse
         """
-        session = self.get_session()
-        try:
-            query = session.query(model_class)
+        with self._session_scope("DATABASE_DELETE_ERROR", commit=True) as session:
+            return self._delete(session, model_class, filters)
 
-            for key, value in filters.items():
-                if hasattr(model_class, key):
-                    query = query.filter(getattr(model_class, key) == value)
-
-            record = query.first()
-            if record is None:
-                return False
+    def delete_where(self, model_class: Type[Base], filters: Dict[str, Any]) -> int:
+        """
+        条件に一致する全レコードを1回のDELETE文で削除する
 
-            session.delete(record)
-            session.commit()
-            return True
+        Args:
+            model_class: 削除対象のモデルクラス
+            filters: 検索条件の辞書（空の場合はエラー）
 
-        except Exception as e:
-            session.rollback()
-            raise DatabaseError(MESSAGES["DATABASE_DELETE_ERROR"].format(error=str(e)))
-        finally:
-            session.close()
+        Returns:
+            削除されたレコード数
+        """
+        with self._session_scope("DATABASE_DELETE_ERROR", commit=True) as session:
+            return self._delete_where(session, model_class, filters)
 
     def count(self, model_class: Type[Base], filters: Optional[Dict[str, Any]] = None) -> int:
         """
@@ -321,22 +473,297 @@ class DatabaseManager:
         Returns:
             レコード数
         """
-        session = self.get_session()
-        try:
-            query = session.query(model_class)
+        with self._session_scope("DATABASE_COUNT_ERROR") as session:
+            return self._count(session, model_class, filters)
+
+    # 以下はセッションを受け取って1操作を実行する内部処理。コミットは呼び出し側で行う
 
-            if filters:
-                for key, value in filters.items():
-                    if hasattr(model_class, key):
-                        query = query.filter(getattr(model_class, key) == value)
+    @staticmethod
+    def _filter_query(query, model_class: Type[Base], filters: Optional[Dict[str, Any]]):
+        """フィルタ条件の辞書をクエリに適用する"""
+        if filters:
+            for key, value in filters.items():
+                if hasattr(model_class, key):
+                    query = query.filter(getattr(model_class, key) == value)
+        return query
 
-            return query.count()
+    @staticmethod
+    def _select_columns(model_class: Type[Base], columns: Optional[List[str]] = None):
+        """
+        列を指定したCoreのSELECTを作成する
 
-        except Exception as e:
-            session.rollback()
-            raise DatabaseError(MESSAGES["DATABASE_COUNT_ERROR"].format(error=str(e)))
-        finally:
-            session.close()
+        ORMインスタンスを生成せず、結果は行のマッピングとして受け取る
+        """
+        table = model_class.__table__
+        if columns is None:
+            return select(*table.columns)
+        return select(*[table.c[name] for name in columns])
+
+    @staticmethod
+    def _first_mapping(session: Session, statement) -> Optional[Dict[str, Any]]:
+        row = session.execute(statement.limit(1)).mappings().first()
+        return dict(row) if row else None
+
+    @staticmethod
+    def _query_all(session: Session, model_class: Type[Base], filters: Optional[Dict[str, Any]] = None,
+                   order_by: Optional[Any] = None, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        statement = DatabaseManager._filter_query(
+            DatabaseManager._select_columns(model_class, columns), model_class, filters
+        )
+
+        if order_by is not None:
+            statement = statement.order_by(order_by)
+
+        return [dict(row) for row in session.execute(statement).mappings()]
+
+    @staticmethod
+    def _query_one(session: Session, model_class: Type[Base], filters: Dict[str, Any],
+                   columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        statement = DatabaseManager._filter_query(
+            DatabaseManager._select_columns(model_class, columns), model_class, filters
+        )
+        return DatabaseManager._first_mapping(session, statement)
+
+    @staticmethod
+    def _query_first_match(session: Session, model_class: Type[Base], candidates: List[Dict[str, Any]],
+                           columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        conditions = [
+            and_(*[getattr(model_class, key) == value
+                   for key, value in filters.items() if hasattr(model_class, key)])
+            for filters in candidates
+        ]
+
+        specificity = case(
+            *[(condition, priority) for priority, condition in enumerate(conditions)],
+            else_=len(conditions)
+        )
+
+        statement = DatabaseManager._select_columns(model_class, columns).where(or_(*conditions)).order_by(specificity)
+        return DatabaseManager._first_mapping(session, statement)
+
+    @staticmethod
+    def _get_by_id(session: Session, model_class: Type[Base], record_id: int,
+                   columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        table: Any = model_class.__table__
+        primary_key = list(table.primary_key.columns)[0]
+        statement = DatabaseManager._select_columns(model_class, columns).where(primary_key == record_id)
+        return DatabaseManager._first_mapping(session, statement)
+
+    @staticmethod
+    def _insert(session: Session, model_class: Type[Base], data: Dict[str, Any]) -> Dict[str, Any]:
+        record = model_class(**data)
+        session.add(record)
+        session.flush()
+        session.refresh(record)
+        return DatabaseManager._model_to_dict(record)
+
+    @staticmethod
+    def _update(session: Session, model_class: Type[Base], filters: Dict[str, Any],
+                update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        record = DatabaseManager._filter_query(session.query(model_class), model_class, filters).first()
+        if record is None:
+            return None
+
+        for key, value in update_data.items():
+            if hasattr(record, key):
+                setattr(record, key, value)
+
+        session.flush()
+        session.refresh(record)
+        return DatabaseManager._model_to_dict(record)
+
+    @staticmethod
+    def _where_conditions(model_class: Type[Base], filters: Dict[str, Any]) -> List[Any]:
+        """一括更新・削除の条件を作成する。条件なしで全件が対象になるのを防ぐ"""
+        table = model_class.__table__
+        conditions = [table.c[key] == value for key, value in filters.items() if key in table.c]
+        if not conditions:
+            raise DatabaseError(MESSAGES["DATABASE_FILTER_REQUIRED"])
+        return conditions
+
+    @staticmethod
+    def _update_where(session: Session, model_class: Type[Base], filters: Dict[str, Any],
+                      values: Dict[str, Any]) -> int:
+        table: Any = model_class.__table__
+        update_values = {key: value for key, value in values.items() if key in table.c}
+        statement = update(table).where(*DatabaseManager._where_conditions(model_class, filters)).values(update_values)
+        return session.execute(statement).rowcount
+
+    @staticmethod
+    def _upsert(session: Session, model_class: Type[Base], filters: Dict[str, Any],
+                data: Dict[str, Any]) -> Dict[str, Any]:
+        conflict_columns = DatabaseManager._find_conflict_columns(model_class, filters.keys())
+
+        dialect_insert = UPSERT_INSERTS.get(session.get_bind().dialect.name)
+
+        if conflict_columns and dialect_insert:
+            statement = DatabaseManager._build_upsert_statement(
+                dialect_insert, model_class, conflict_columns, [{**filters, **data}]
+            )
+            return dict(session.execute(statement).mappings().one())
+
+        record = DatabaseManager._filter_query(session.query(model_class), model_class, filters).first()
+
+        if record:
+            for key, value in data.items():
+                if hasattr(record, key):
+                    setattr(record, key, value)
+        else:
+            merged_data = {**filters, **data}
+            record = model_class(**merged_data)
+            session.add(record)
+
+        session.flush()
+        session.refresh(record)
+        return DatabaseManager._model_to_dict(record)
+
+    @staticmethod
+    def _insert_many(session: Session, model_class: Type[Base], rows: List[Dict[str, Any]],
+                     returning: bool = False) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+
+        table: Any = model_class.__table__
+        statement = insert(table)
+
+        if returning:
+            result = session.execute(statement.returning(*table.columns), rows)
+            return [dict(row) for row in result.mappings()]
+
+        session.execute(statement, rows)
+        return []
+
+    @staticmethod
+    def _insert_missing(session: Session, model_class: Type[Base], rows: List[Dict[str, Any]],
+                        key_columns: List[str]) -> int:
+        if not rows:
+            return 0
+
+        table: Any = model_class.__table__
+        key_expression = tuple_(*[table.c[name] for name in key_columns])
+        candidate_keys = {tuple(row[name] for name in key_columns) for row in rows}
+
+        existing_keys = {
+            tuple(row) for row in session.execute(
+                select(*[table.c[name] for name in key_columns]).where(key_expression.in_(candidate_keys))
+            )
+        }
+
+        missing_rows: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            key = tuple(row[name] for name in key_columns)
+            if key not in existing_keys and key not in missing_rows:
+                missing_rows[key] = row
+
+        if missing_rows:
+            dialect_insert = UPSERT_INSERTS.get(session.get_bind().dialect.name)
+            if dialect_insert is not None:
+                # 並行して起動した他プロセスが先に挿入した行は無視する
+                statement = dialect_insert(table).on_conflict_do_nothing(index_elements=key_columns)
+            else:
+                statement = insert(table)
+            session.execute(statement, list(missing_rows.values()))
+
+        return len(missing_rows)
+
+    @staticmethod
+    def _upsert_many(session: Session, model_class: Type[Base], rows: List[Dict[str, Any]],
+                     conflict_columns: List[str], returning: bool = False,
+                     accumulate_columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        if not rows:
+            return []
+
+        dialect_name = session.get_bind().dialect.name
+        dialect_insert = UPSERT_INSERTS.get(dialect_name)
+        if dialect_insert is None:
+            raise DatabaseError(f"{dialect_name}はON CONFLICTに対応していません")
+
+        statement = DatabaseManager._build_upsert_statement(
+            dialect_insert, model_class, conflict_columns, rows, returning, accumulate_columns
+        )
+        result = session.execute(statement)
+        return [dict(row) for row in result.mappings()] if returning else []
+
+    @staticmethod
+    def _delete(session: Session, model_class: Type[Base], filters: Dict[str, Any]) -> bool:
+        record = DatabaseManager._filter_query(session.query(model_class), model_class, filters).first()
+        if record is None:
+            return False
+
+        session.delete(record)
+        session.flush()
+        return True
+
+    @staticmethod
+    def _delete_where(session: Session, model_class: Type[Base], filters: Dict[str, Any]) -> int:
+        table: Any = model_class.__table__
+        statement = delete(table).where(*DatabaseManager._where_conditions(model_class, filters))
+        return session.execute(statement).rowcount
+
+    @staticmethod
+    def _count(session: Session, model_class: Type[Base], filters: Optional[Dict[str, Any]] = None) -> int:
+        return DatabaseManager._filter_query(session.query(model_class), model_class, filters).count()
+
+    @staticmethod
+    def _find_conflict_columns(model_class: Type[Base], columns: Iterable[str]) -> Optional[List[str]]:
+        """指定した列の組み合わせと一致する一意制約または一意インデックスの列名を返す"""
+        table: Any = model_class.__table__
+        target = set(columns)
+
+        for constraint in table.constraints:
+            if isinstance(constraint, UniqueConstraint):
+                names = [column.name for column in constraint.columns]
+                if set(names) == target:
+                    return names
+
+        for index in table.indexes:
+            if index.unique and index.dialect_options["postgresql"].get("where") is None:
+                names = [column.name for column in index.columns]
+                if set(names) == target:
+                    return names
+
+        return None
+
+    @staticmethod
+    def _build_upsert_statement(dialect_insert, model_class: Type[Base], conflict_columns: List[str],
+                                rows: List[Dict[str, Any]], returning: bool = True,
+                                accumulate_columns: Optional[List[str]] = None):
+        """複数行VALUESのINSERT ... ON CONFLICT DO UPDATE (... RETURNING)文を構築する"""
+        table: Any = model_class.__table__
+        accumulate = set(accumulate_columns or [])
+
+        # 同じ文の中で同じ行を2回更新できないため、一意キーが重複する行は後勝ち（加算列は合計）でまとめる
+        unique_rows: Dict[tuple, Dict[str, Any]] = {}
+        for row in rows:
+            values = {key: value for key, value in row.items() if key in table.c}
+            key = tuple(values.get(column) for column in conflict_columns)
+            previous = unique_rows.get(key)
+            if previous is not None:
+                for column in accumulate:
+                    values[column] = (previous.get(column) or 0) + (values.get(column) or 0)
+            unique_rows[key] = values
+        values_list = list(unique_rows.values())
+
+        statement = dialect_insert(table).values(values_list)
+
+        update_values: Dict[str, Any] = {
+            key: table.c[key] + statement.excluded[key] if key in accumulate else statement.excluded[key]
+            for key in values_list[0] if key not in conflict_columns
+        }
+        for column in table.columns:
+            onupdate = column.onupdate
+            if column.name not in update_values and onupdate is not None and onupdate.is_clause_element:
+                update_values[column.name] = onupdate.arg
+
+        if not update_values:
+            # 競合時もRETURNINGで行を返すため、一意キーを同じ値で更新する
+            update_values = {conflict_columns[0]: statement.excluded[conflict_columns[0]]}
+
+        statement = statement.on_conflict_do_update(
+            index_elements=conflict_columns,
+            set_=update_values
+        )
+        return statement.returning(*table.columns) if returning else statement
 
     @staticmethod
     def _model_to_dict(record) -> Dict[str, Any]:
@@ -344,3 +771,80 @@ class DatabaseManager:
         if record is None:
             return {}
         return {c.name: getattr(record, c.name) for c in record.__table__.columns}
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=DatabaseManager._after_fork_in_child)
+
+
+class UnitOfWork:
+    """
+    DatabaseManager.unit_of_work()が返す、1つのセッションを共有する操作群
+
+    各操作はコミットせずにフラッシュのみ行い、コミット・ロールバックは
+    unit_of_work()のブロック終了時にまとめて行う。
+    """
+
+    def __init__(self, session: Session):
+        self.session = session
+
+    def _run(self, error_key: str, operation: Callable[..., Any], *args) -> Any:
+        try:
+            return operation(self.session, *args)
+        except DatabaseError:
+            raise
+        except Exception as e:
+            raise DatabaseError(MESSAGES[error_key].format(error=str(e)))
+
+    def query_all(self, model_class: Type[Base], filters: Optional[Dict[str, Any]] = None,
+                  order_by: Optional[Any] = None, columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return self._run("DATABASE_QUERY_ERROR", DatabaseManager._query_all, model_class, filters, order_by, columns)
+
+    def query_one(self, model_class: Type[Base], filters: Dict[str, Any],
+                  columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        return self._run("DATABASE_QUERY_ERROR", DatabaseManager._query_one, model_class, filters, columns)
+
+    def query_first_match(self, model_class: Type[Base], candidates: List[Dict[str, Any]],
+                          columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        return self._run("DATABASE_QUERY_ERROR", DatabaseManager._query_first_match, model_class, candidates, columns)
+
+    def get_by_id(self, model_class: Type[Base], record_id: int,
+                  columns: Optional[List[str]] = None) -> Optional[Dict[str, Any]]:
+        return self._run("DATABASE_GET_RECORD_ERROR", DatabaseManager._get_by_id, model_class, record_id, columns)
+
+    def insert(self, model_class: Type[Base], data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._run("DATABASE_INSERT_ERROR", DatabaseManager._insert, model_class, data)
+
+    def update(self, model_class: Type[Base], filters: Dict[str, Any],
+               update_data: Dict[str, Any]) -> Optional[Dict[str, Any]]:
+        return self._run("DATABASE_UPDATE_ERROR", DatabaseManager._update, model_class, filters, update_data)
+
+    def update_where(self, model_class: Type[Base], filters: Dict[str, Any], values: Dict[str, Any]) -> int:
+        return self._run("DATABASE_UPDATE_ERROR", DatabaseManager._update_where, model_class, filters, values)
+
+    def upsert(self, model_class: Type[Base], filters: Dict[str, Any], data: Dict[str, Any]) -> Dict[str, Any]:
+        return self._run("DATABASE_UPSERT_ERROR", DatabaseManager._upsert, model_class, filters, data)
+
+    def insert_many(self, model_class: Type[Base], rows: List[Dict[str, Any]],
+                    returning: bool = False) -> List[Dict[str, Any]]:
+        return self._run("DATABASE_INSERT_ERROR", DatabaseManager._insert_many, model_class, rows, returning)
+
+    def insert_missing(self, model_class: Type[Base], rows: List[Dict[str, Any]], key_columns: List[str]) -> int:
+        return self._run("DATABASE_INSERT_ERROR", DatabaseManager._insert_missing, model_class, rows, key_columns)
+
+    def upsert_many(self, model_class: Type[Base], rows: List[Dict[str, Any]], conflict_columns: List[str],
+                    returning: bool = False,
+                    accumulate_columns: Optional[List[str]] = None) -> List[Dict[str, Any]]:
+        return self._run(
+            "DATABASE_UPSERT_ERROR", DatabaseManager._upsert_many,
+            model_class, rows, conflict_columns, returning, accumulate_columns
+        )
+
+    def delete(self, model_class: Type[Base], filters: Dict[str, Any]) -> bool:
+        return self._run("DATABASE_DELETE_ERROR", DatabaseManager._delete, model_class, filters)
+
+    def delete_where(self, model_class: Type[Base], filters: Dict[str, Any]) -> int:
+        return self._run("DATABASE_DELETE_ERROR", DatabaseManager._delete_where, model_class, filters)
+
+    def count(self, model_class: Type[Base], filters: Optional[Dict[str, Any]] = None) -> int:
+        return self._run("DATABASE_COUNT_ERROR", DatabaseManager._count, model_class, filters)
@@ -0,0 +1,123 @@
+from typing import Callable, List, Tuple, Union
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection
+
+from database.partitioning import partition_summary_usage
+
+MigrationStep = Union[str, Callable[[Connection], None]]
+
+# (バージョン, 説明, 手順) のリスト。手順はSQL文またはConnectionを受け取る関数。
+# create_allで作成済みのテーブルにも適用できるよう、各手順は冪等にする。
+MIGRATIONS: List[Tuple[int, str, List[MigrationStep]]] = [
+    (
+        1,
+        "prompts(department, document_type, doctor)の重複行を削除し一意インデックスを追加",
+        [
+            # get_prompt・updateが参照していたid最小の行を残す
+            """
+            DELETE FROM prompts p
+            USING prompts q
+            WHERE p.department = q.department
+              AND p.document_type = q.document_type
+              AND p.doctor = q.doctor
+              AND p.id > q.id
+            """,
+            """
+            CREATE UNIQUE INDEX IF NOT EXISTS ix_prompts_department_document_type_doctor
+            ON prompts (department, document_type, doctor)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_prompts_default
+            ON prompts (document_type)
+            WHERE is_default
+            """,
+        ],
+    ),
+    (
+        2,
+        "summary_usageにproviderを追加してmodel_detailから補完し、集計用インデックスを追加",
+        [
+            "ALTER TABLE summary_usage ADD COLUMN IF NOT EXISTS provider VARCHAR(20)",
+            # 統計画面のILIKE '%gemini%' / '%claude%' 判定と同じ基準で補完する
+            """
+            UPDATE summary_usage
+            SET provider = CASE
+                WHEN model_detail ILIKE '%gemini%' THEN 'gemini'
+                WHEN model_detail ILIKE '%claude%' THEN 'claude'
+            END
+            WHERE provider IS NULL
+              AND (model_detail ILIKE '%gemini%' OR model_detail ILIKE '%claude%')
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_summary_usage_date
+            ON summary_usage (date)
+            """,
+            """
+            CREATE INDEX IF NOT EXISTS ix_summary_usage_provider_document_types_date
+            ON summary_usage (provider, document_types, date)
+            """,
+        ],
+    ),
+    (
+        3,
+        "summary_usage_dailyを既存のsummary_usageから作成",
+        [
+            # 以降は利用記録の保存時に同じトランザクションで増分更新するため、空の場合だけ補完する
+            """
+            INSERT INTO summary_usage_daily (
+                day, provider, department, doctor, document_types,
+                count, input_tokens, output_tokens, total_tokens, processing_time
+            )
+            SELECT
+                (date AT TIME ZONE 'Asia/Tokyo')::date,
+                COALESCE(provider, ''),
+                COALESCE(department, 'default'),
+                COALESCE(doctor, 'default'),
+                COALESCE(document_types, ''),
+                COUNT(*),
+                COALESCE(SUM(input_tokens), 0),
+                COALESCE(SUM(output_tokens), 0),
+                COALESCE(SUM(total_tokens), 0),
+                COALESCE(SUM(processing_time), 0)
+            FROM summary_usage
+            WHERE date IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM summary_usage_daily)
+            GROUP BY 1, 2, 3, 4, 5
+            ON CONFLICT ON CONSTRAINT unique_summary_usage_daily DO NOTHING
+            """,
+        ],
+    ),
+    (
+        4,
+        "summary_usageをdateの月単位のレンジパーティションに変換し、今後の月のパーティションを作成",
+        [partition_summary_usage],
+    ),
+]
+
+# 最新のスキーマバージョン
+SCHEMA_VERSION = MIGRATIONS[-1][0]
+
+
+def run_migrations(conn: Connection, current_version: int = 0) -> int:
+    """
+    current_versionより新しいマイグレーションを順に適用する
+
+    Args:
+        conn: トランザクション中のPostgreSQLの接続
+        current_version: 適用済みのスキーマバージョン
+
+    Returns:
+        適用後のスキーマバージョン
+    """
+    version = current_version
+    for migration_version, _, steps in MIGRATIONS:
+        if migration_version <= current_version:
+            continue
+        for step in steps:
+            if isinstance(step, str):
+                conn.execute(text(step))
+            else:
+                step(conn)
+        version = migration_version
+    return version
@@ -1,5 +1,20 @@
-from sqlalchemy import Boolean, Column, DateTime, Integer, String, Text, UniqueConstraint
+from sqlalchemy import (
+    BigInteger,
+    Boolean,
+    Column,
+    Date,
+    DateTime,
+    Index,
+    Integer,
+    PrimaryKeyConstraint,
+    String,
+    Text,
+    UniqueConstraint,
+    text,
+)
+from sqlalchemy.ext.compiler import compiles
 from sqlalchemy.orm import DeclarativeBase
+from sqlalchemy.schema import CreateColumn
 from sqlalchemy.sql import func
 
 
@@ -7,6 +22,10 @@ class Base(DeclarativeBase):
     pass
 
 
+def _not_sqlite(ddl, target, bind, compiler=None, **kw) -> bool:
+    return (bind or compiler).dialect.name != "sqlite"
+
+
 class AppSetting(Base):
     __tablename__ = 'app_settings'
 
@@ -37,15 +56,28 @@ class Prompt(Base):
     created_at = Column(DateTime(timezone=True), default=func.now())
     updated_at = Column(DateTime(timezone=True), default=func.now(), onupdate=func.now())
 
+    __table_args__ = (
+        Index('ix_prompts_department_document_type_doctor', 'department', 'document_type', 'doctor', unique=True),
+        Index('ix_prompts_default', 'document_type', postgresql_where=text('is_default')),
+    )
+
 
 class SummaryUsage(Base):
+    """
+    利用記録
+
+    PostgreSQLではマイグレーションでdateの月単位のパーティションテーブルに変換する。
+    パーティションキーを主キーに含める必要があるため主キーは(id, date)。
+    保持期間を過ぎた月はscripts/archive_summary_usage.pyでParquetにアーカイブする。
+    """
     __tablename__ = 'summary_usage'
 
-    id = Column(Integer, primary_key=True)
-    date = Column(DateTime(timezone=True), default=func.now())
+    id = Column(Integer, autoincrement=True)
+    date = Column(DateTime(timezone=True), nullable=False, default=func.now())
     app_type = Column(String(50))
     document_types = Column(String(100))
     model_detail = Column(String(100))
+    provider = Column(String(20))
     department = Column(String(100))
     doctor = Column(String(100))
     input_tokens = Column(Integer)
@@ -53,6 +85,50 @@ class SummaryUsage(Base):
     total_tokens = Column(Integer)
     processing_time = Column(Integer)
 
+    __table_args__ = (
+        PrimaryKeyConstraint('id', 'date', name='summary_usage_pkey').ddl_if(callable_=_not_sqlite),
+        Index('ix_summary_usage_date', 'date'),
+        Index('ix_summary_usage_provider_document_types_date', 'provider', 'document_types', 'date'),
+    )
+
+
+@compiles(CreateColumn, "sqlite")
+def _create_column_sqlite(element, compiler, **kw):
+    """
+    SQLiteは複合主キーの自動採番に対応しないため、summary_usage.idを単独の主キー（rowidの別名）にする
+
+    (id, date)の主キー制約はSQLiteでは作成しない。SQLiteはテスト・開発用のため一意性はidで担保する
+    """
+    column = element.element
+    if column.table.name == SummaryUsage.__tablename__ and column.name == "id":
+        return f"{compiler.preparer.format_column(column)} INTEGER NOT NULL PRIMARY KEY"
+    return compiler.visit_create_column(element, **kw)
+
+
+class SummaryUsageDaily(Base):
+    """summary_usageを日付(JST)・プロバイダー・診療科・医師・文書名ごとに集計したテーブル"""
+    __tablename__ = 'summary_usage_daily'
+
+    id = Column(Integer, primary_key=True)
+    day = Column(Date, nullable=False)
+    # 一意制約でNULL同士が別の行として扱われないよう、未設定値は空文字・'default'で保存する
+    provider = Column(String(20), nullable=False, default='')
+    department = Column(String(100), nullable=False, default='default')
+    doctor = Column(String(100), nullable=False, default='default')
+    document_types = Column(String(100), nullable=False, default='')
+    count = Column(Integer, nullable=False, default=0)
+    input_tokens = Column(BigInteger, nullable=False, default=0)
+    output_tokens = Column(BigInteger, nullable=False, default=0)
+    total_tokens = Column(BigInteger, nullable=False, default=0)
+    processing_time = Column(BigInteger, nullable=False, default=0)
+
+    __table_args__ = (
+        UniqueConstraint(
+            'day', 'provider', 'department', 'doctor', 'document_types',
+            name='unique_summary_usage_daily'
+        ),
+    )
+
 
 class EvaluationPrompt(Base):
     __tablename__ = 'evaluation_prompts'
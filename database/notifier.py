@@ -0,0 +1,203 @@
+import json
+import os
+import select
+import threading
+from abc import ABC, abstractmethod
+from typing import Any, Callable, Dict, List, Optional, Sequence
+
+from sqlalchemy import text
+
+from database.db import DatabaseManager
+from utils.config import CACHE_INVALIDATION_BACKEND
+
+CACHE_INVALIDATION_CHANNEL = "cache_invalidation"
+
+InvalidationHandler = Callable[[Dict[str, Any]], None]
+
+_handlers: List[InvalidationHandler] = []
+_notifier: Optional["CacheInvalidationNotifier"] = None
+_notifier_lock = threading.Lock()
+
+
+def _dispatch(message: Dict[str, Any]) -> None:
+    for handler in list(_handlers):
+        try:
+            handler(message)
+        except Exception as e:
+            print(f"キャッシュ無効化の処理に失敗しました: {str(e)}")
+
+
+class CacheInvalidationNotifier(ABC):
+    """
+    プロセス間でキャッシュ無効化を通知する
+
+    メッセージは {"model": モデル名, "key": キー} の辞書。
+    modelまたはkeyがNoneの場合は該当するキャッシュ全体を無効化する。
+    """
+
+    @abstractmethod
+    def publish(self, message: Dict[str, Any]) -> None:
+        pass
+
+    def start(self) -> None:
+        pass
+
+    def close(self) -> None:
+        pass
+
+
+class InMemoryNotifier(CacheInvalidationNotifier):
+    """同一プロセス内でのみ通知する（テスト・単一プロセス用）"""
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        _dispatch(message)
+
+
+class PostgresNotifier(CacheInvalidationNotifier):
+    """PostgreSQLのLISTEN/NOTIFYで全プロセスに通知する"""
+
+    def __init__(self, channel: str = CACHE_INVALIDATION_CHANNEL, poll_interval: float = 5.0):
+        self.channel = channel
+        self.poll_interval = poll_interval
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+
+    def publish(self, message: Dict[str, Any]) -> None:
+        engine = DatabaseManager.get_instance().get_engine()
+        with engine.begin() as conn:
+            conn.execute(
+                text("SELECT pg_notify(:channel, :payload)"),
+                {"channel": self.channel, "payload": json.dumps(message, ensure_ascii=False)}
+            )
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(
+                target=self._listen_loop,
+                name="cache-invalidation-listener",
+                daemon=True
+            )
+            self._thread.start()
+
+    def close(self) -> None:
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=self.poll_interval + 1)
+
+    def _listen_loop(self) -> None:
+        retry_wait = 1.0
+        while not self._stop_event.is_set():
+            try:
+                self._listen()
+                retry_wait = 1.0
+            except Exception as e:
+                print(f"キャッシュ無効化の受信が切断されました（{retry_wait:.0f}秒後に再接続）: {str(e)}")
+                self._stop_event.wait(retry_wait)
+                retry_wait = min(retry_wait * 2, 60.0)
+
+    def _listen(self) -> None:
+        engine = DatabaseManager.get_instance().get_engine()
+        pooled_connection = engine.raw_connection()
+        # 受信専用の接続はプールに戻さず占有する
+        pooled_connection.detach()
+        dbapi_connection: Any = pooled_connection.dbapi_connection
+
+        try:
+            dbapi_connection.autocommit = True
+            with dbapi_connection.cursor() as cursor:
+                cursor.execute(f'LISTEN "{self.channel}"')
+
+            # 接続が切れていた間の通知を取りこぼしている可能性があるため全体を無効化する
+            _dispatch({"model": None, "key": None})
+
+            while not self._stop_event.is_set():
+                readable, _, _ = select.select([dbapi_connection], [], [], self.poll_interval)
+                if not readable:
+                    continue
+
+                dbapi_connection.poll()
+                while dbapi_connection.notifies:
+                    notify = dbapi_connection.notifies.pop(0)
+                    try:
+                        message = json.loads(notify.payload)
+                    except ValueError:
+                        continue
+                    _dispatch(message)
+        finally:
+            try:
+                dbapi_connection.close()
+            except Exception:
+                pass
+
+
+def register_invalidation_handler(handler: InvalidationHandler) -> None:
+    if handler not in _handlers:
+        _handlers.append(handler)
+
+
+def _create_notifier() -> CacheInvalidationNotifier:
+    if CACHE_INVALIDATION_BACKEND == "memory":
+        return InMemoryNotifier()
+    return PostgresNotifier()
+
+
+def get_notifier() -> CacheInvalidationNotifier:
+    global _notifier
+    if _notifier is None:
+        with _notifier_lock:
+            if _notifier is None:
+                notifier = _create_notifier()
+                notifier.start()
+                _notifier = notifier
+    return _notifier
+
+
+def set_notifier(notifier: Optional[CacheInvalidationNotifier]) -> None:
+    """通知バックエンドを差し替える（テスト用）"""
+    global _notifier
+    with _notifier_lock:
+        if _notifier is not None and _notifier is not notifier:
+            _notifier.close()
+        if notifier is not None:
+            notifier.start()
+        _notifier = notifier
+
+
+def _after_fork_in_child() -> None:
+    """
+    fork後の子プロセスでは親プロセスの通知バックエンドを使わない
+
+    親の受信スレッドは子プロセスに存在せず、受信用の接続は親と共有されているため、
+    接続を閉じずに参照だけを破棄する。次のstart_invalidation_listenerで子プロセス用の接続を開く。
+    """
+    global _notifier, _notifier_lock
+    _notifier_lock = threading.Lock()
+    _notifier = None
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_after_fork_in_child)
+
+
+def start_invalidation_listener() -> None:
+    try:
+        get_notifier()
+    except Exception as e:
+        print(f"キャッシュ無効化の受信を開始できませんでした: {str(e)}")
+
+
+def publish_invalidation(model: str, key: Optional[Sequence[Any]] = None) -> None:
+    """
+    キャッシュ無効化を全プロセスに通知する
+
+    通知に失敗しても書き込み処理自体は成功として扱い、
+    他プロセスのキャッシュはTTLで失効させる
+    """
+    try:
+        get_notifier().publish({"model": model, "key": list(key) if key is not None else None})
+    except Exception as e:
+        print(f"キャッシュ無効化の通知に失敗しました: {str(e)}")
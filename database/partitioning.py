@@ -0,0 +1,273 @@
+import datetime
+import os
+import re
+from pathlib import Path
+from typing import Any, Dict, Iterable, List, Optional, Tuple
+
+import pyarrow as pa
+import pyarrow.parquet as pq
+import pytz
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+
+from utils.config import SUMMARY_USAGE_PARTITION_MONTHS_AHEAD
+
+JST = pytz.timezone('Asia/Tokyo')
+
+PARENT_TABLE = "summary_usage"
+DEFAULT_PARTITION = "summary_usage_default"
+UNPARTITIONED_TABLE = "summary_usage_unpartitioned"
+_PARTITION_NAME = re.compile(r"^summary_usage_p(\d{4})(\d{2})$")
+
+ARCHIVE_BATCH_SIZE = 5000
+ARCHIVE_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("date", pa.timestamp("us", tz="UTC")),
+    ("app_type", pa.string()),
+    ("document_types", pa.string()),
+    ("model_detail", pa.string()),
+    ("provider", pa.string()),
+    ("department", pa.string()),
+    ("doctor", pa.string()),
+    ("input_tokens", pa.int64()),
+    ("output_tokens", pa.int64()),
+    ("total_tokens", pa.int64()),
+    ("processing_time", pa.int64()),
+])
+
+
+def add_months(month: datetime.date, months: int) -> datetime.date:
+    index = month.year * 12 + month.month - 1 + months
+    return datetime.date(index // 12, index % 12 + 1, 1)
+
+
+def current_month() -> datetime.date:
+    return datetime.datetime.now(JST).date().replace(day=1)
+
+
+def partition_name(month: datetime.date) -> str:
+    return f"{PARENT_TABLE}_p{month.year:04d}{month.month:02d}"
+
+
+def parse_partition_name(name: str) -> Optional[datetime.date]:
+    match = _PARTITION_NAME.match(name)
+    if not match:
+        return None
+    return datetime.date(int(match.group(1)), int(match.group(2)), 1)
+
+
+def partition_bounds(month: datetime.date) -> Tuple[datetime.datetime, datetime.datetime]:
+    """月の初日0時(JST)から翌月初日0時(JST)までの範囲を返す。統計画面の日付(JST)と境界を揃える"""
+    start = JST.localize(datetime.datetime(month.year, month.month, 1))
+    end_month = add_months(month, 1)
+    end = JST.localize(datetime.datetime(end_month.year, end_month.month, 1))
+    return start, end
+
+
+def months_to_archive(months: Iterable[datetime.date], retention_months: int,
+                      today_month: Optional[datetime.date] = None) -> List[datetime.date]:
+    """
+    保持期間を過ぎた月を古い順に返す
+
+    Args:
+        months: パーティションの月のリスト
+        retention_months: 当月を含めて保持する月数
+        today_month: 基準とする当月（未指定の場合はJSTの現在月）
+
+    Returns:
+        アーカイブ対象の月のリスト
+    """
+    if retention_months < 1:
+        raise ValueError("retention_months must be at least 1")
+
+    cutoff = add_months(today_month or current_month(), 1 - retention_months)
+    return sorted(month for month in months if month < cutoff)
+
+
+def is_partitioned(conn: Connection) -> bool:
+    relkind = conn.execute(
+        text("SELECT relkind FROM pg_class WHERE oid = to_regclass(:name)"),
+        {"name": PARENT_TABLE}
+    ).scalar()
+    return relkind == "p"
+
+
+def create_month_partition(conn: Connection, month: datetime.date) -> bool:
+    """
+    月のパーティションを作成する（作成済みの場合は何もしない）
+
+    デフォルトパーティションに同じ月の行がある場合は作成したパーティションへ移してから接続する
+
+    Returns:
+        作成した場合はTrue
+    """
+    name = partition_name(month)
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None:
+        return False
+
+    start, end = partition_bounds(month)
+    bounds = {"start": start, "end": end}
+    conn.execute(text(f"CREATE TABLE {name} (LIKE {PARENT_TABLE} INCLUDING DEFAULTS INCLUDING CONSTRAINTS)"))
+    conn.execute(text(
+        f"WITH moved AS (DELETE FROM {DEFAULT_PARTITION} WHERE date >= :start AND date < :end RETURNING *) "
+        f"INSERT INTO {name} SELECT * FROM moved"
+    ), bounds)
+    conn.execute(text(
+        f"ALTER TABLE {PARENT_TABLE} ATTACH PARTITION {name} "
+        f"FOR VALUES FROM ('{start.isoformat()}') TO ('{end.isoformat()}')"
+    ))
+    return True
+
+
+def partitions_ready(conn: Connection, months_ahead: int = SUMMARY_USAGE_PARTITION_MONTHS_AHEAD) -> bool:
+    """当月のmonths_ahead月先のパーティションが作成済みかを1回のクエリで確認する"""
+    name = partition_name(add_months(current_month(), months_ahead))
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def ensure_partitions(conn: Connection, months_ahead: int = SUMMARY_USAGE_PARTITION_MONTHS_AHEAD,
+                      first_month: Optional[datetime.date] = None) -> None:
+    """first_month（未指定の場合は当月）から当月のmonths_ahead月先までのパーティションを作成する"""
+    # 起動時・マイグレーション・アーカイブのスクリプトが同時に同じ月を作成しないよう1つずつ実行する。
+    # ロックはトランザクション終了時に解放される
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": f"{PARENT_TABLE}_partitions"})
+    month = first_month or current_month()
+    last_month = add_months(current_month(), months_ahead)
+    while month <= last_month:
+        create_month_partition(conn, month)
+        month = add_months(month, 1)
+
+
+def partition_summary_usage(conn: Connection) -> None:
+    """
+    summary_usageをdateの月単位のレンジパーティションテーブルに変換する（マイグレーション手順）
+
+    変換済みの場合は今後の月のパーティションのみ作成する。
+    パーティションキーを主キーに含める必要があるため主キーは(id, date)になり、
+    dateが未設定の行はエポックの日時としてデフォルトパーティションに格納する。
+    """
+    if is_partitioned(conn):
+        ensure_partitions(conn)
+        return
+
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} RENAME TO {UNPARTITIONED_TABLE}"))
+    conn.execute(text(f"ALTER TABLE {UNPARTITIONED_TABLE} RENAME CONSTRAINT {PARENT_TABLE}_pkey "
+                      f"TO {UNPARTITIONED_TABLE}_pkey"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_summary_usage_date"))
+    conn.execute(text("DROP INDEX IF EXISTS ix_summary_usage_provider_document_types_date"))
+    conn.execute(text(f"UPDATE {UNPARTITIONED_TABLE} SET date = 'epoch' WHERE date IS NULL"))
+
+    conn.execute(text(
+        f"CREATE TABLE {PARENT_TABLE} (LIKE {UNPARTITIONED_TABLE} INCLUDING DEFAULTS) PARTITION BY RANGE (date)"
+    ))
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ALTER COLUMN date SET NOT NULL"))
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ALTER COLUMN date SET DEFAULT now()"))
+    conn.execute(text(f"ALTER TABLE {PARENT_TABLE} ADD CONSTRAINT {PARENT_TABLE}_pkey PRIMARY KEY (id, date)"))
+    conn.execute(text(f"CREATE INDEX ix_summary_usage_date ON {PARENT_TABLE} (date)"))
+    conn.execute(text(
+        f"CREATE INDEX ix_summary_usage_provider_document_types_date "
+        f"ON {PARENT_TABLE} (provider, document_types, date)"
+    ))
+    conn.execute(text(f"CREATE TABLE {DEFAULT_PARTITION} PARTITION OF {PARENT_TABLE} DEFAULT"))
+
+    oldest = conn.execute(text(f"SELECT min(date) FROM {UNPARTITIONED_TABLE} WHERE date > 'epoch'")).scalar()
+    first_month = oldest.astimezone(JST).date().replace(day=1) if oldest else None
+    ensure_partitions(conn, first_month=first_month)
+
+    conn.execute(text(f"INSERT INTO {PARENT_TABLE} SELECT * FROM {UNPARTITIONED_TABLE}"))
+    # idの採番を引き継ぐため、旧テーブルの削除前にシーケンスの所有者を変更する
+    conn.execute(text(f"ALTER SEQUENCE IF EXISTS {PARENT_TABLE}_id_seq OWNED BY {PARENT_TABLE}.id"))
+    conn.execute(text(f"DROP TABLE {UNPARTITIONED_TABLE}"))
+
+
+def list_month_partitions(conn: Connection) -> List[Tuple[str, datetime.date, bool]]:
+    """月単位のパーティション（切り離し済みのテーブルを含む）の名前・月・接続状態を返す"""
+    rows = conn.execute(text(
+        "SELECT c.relname, c.relispartition FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace "
+        "WHERE n.nspname = current_schema() AND c.relkind = 'r' AND c.relname LIKE :pattern"
+    ), {"pattern": f"{PARENT_TABLE}_p%"}).all()
+
+    partitions = []
+    for name, attached in rows:
+        month = parse_partition_name(name)
+        if month is not None:
+            partitions.append((name, month, bool(attached)))
+    return sorted(partitions, key=lambda partition: partition[1])
+
+
+def write_partition_parquet(conn: Connection, table_name: str, path: Path,
+                            batch_size: int = ARCHIVE_BATCH_SIZE) -> int:
+    """
+    テーブルの全行をzstd圧縮のParquetファイルに書き出す
+
+    書き込み途中のファイルが残らないよう一時ファイルに書いてから置き換える
+
+    Returns:
+        書き出した行数
+    """
+    temp_path = path.with_name(path.name + ".tmp")
+    result = conn.execution_options(yield_per=batch_size).execute(
+        text(f"SELECT {', '.join(ARCHIVE_SCHEMA.names)} FROM {table_name} ORDER BY date, id")
+    )
+
+    row_count = 0
+    with pq.ParquetWriter(temp_path, ARCHIVE_SCHEMA, compression="zstd") as writer:
+        for partition in result.mappings().partitions():
+            columns: Dict[str, List[Any]] = {name: [row[name] for row in partition] for name in ARCHIVE_SCHEMA.names}
+            writer.write_table(pa.table(columns, schema=ARCHIVE_SCHEMA))
+            row_count += len(partition)
+
+    os.replace(temp_path, path)
+    return row_count
+
+
+def archive_partitions(engine: Engine, retention_months: int, archive_dir: Path,
+                       batch_size: int = ARCHIVE_BATCH_SIZE, dry_run: bool = False) -> List[Dict[str, Any]]:
+    """
+    保持期間を過ぎた月のパーティションを切り離し、Parquetに書き出してから削除する
+
+    日次集計（summary_usage_daily）は残るため、統計画面の集計値は変わらない。
+    途中で失敗した場合も切り離したテーブルは次回の実行で続きから処理する。
+
+    Args:
+        engine: PostgreSQLのエンジン
+        retention_months: 当月を含めて保持する月数
+        archive_dir: Parquetファイルの出力先
+        batch_size: 1回に読み込む行数
+        dry_run: Trueの場合は対象の一覧のみ返す
+
+    Returns:
+        アーカイブしたパーティションごとの名前・出力先・行数の辞書のリスト
+    """
+    with engine.connect() as conn:
+        partitions = list_month_partitions(conn)
+
+    targets = set(months_to_archive([month for _, month, _ in partitions], retention_months))
+    archived = []
+    if not dry_run:
+        archive_dir.mkdir(parents=True, exist_ok=True)
+
+    for name, month, attached in partitions:
+        if month not in targets:
+            continue
+
+        path = archive_dir / f"{name}.parquet"
+        if dry_run:
+            archived.append({"partition": name, "path": path, "rows": None})
+            continue
+
+        if attached:
+            with engine.begin() as conn:
+                conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name}"))
+
+        with engine.connect() as conn:
+            rows = write_partition_parquet(conn, name, path, batch_size)
+
+        with engine.begin() as conn:
+            conn.execute(text(f"DROP TABLE {name}"))
+
+        archived.append({"partition": name, "path": path, "rows": rows})
+        print(f"{name}を{path}にアーカイブしました（{rows}行）")
+
+    return archived
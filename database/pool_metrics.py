@@ -0,0 +1,110 @@
+import threading
+import time
+from collections import deque
+from typing import Any, Deque, Dict, List, Optional
+
+from sqlalchemy import event, exc
+from sqlalchemy.engine import Engine
+from sqlalchemy.pool import QueuePool
+
+# 待ち時間のパーセンタイル計算に保持する直近のチェックアウト件数
+WAIT_SAMPLE_SIZE = 1000
+
+
+class PoolMetrics:
+    """コネクションプールのチェックアウト待ち時間とイベント件数を集計する"""
+
+    def __init__(self, sample_size: int = WAIT_SAMPLE_SIZE):
+        self._lock = threading.Lock()
+        self._wait_seconds: Deque[float] = deque(maxlen=sample_size)
+        self._counters = {
+            "checkouts": 0,
+            "checkins": 0,
+            "connects": 0,
+            "invalidations": 0,
+            "timeouts": 0,
+        }
+
+    def record_wait(self, seconds: float) -> None:
+        with self._lock:
+            self._wait_seconds.append(seconds)
+
+    def increment(self, name: str) -> None:
+        with self._lock:
+            self._counters[name] += 1
+
+    def reset(self) -> None:
+        with self._lock:
+            self._wait_seconds.clear()
+            for name in self._counters:
+                self._counters[name] = 0
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            waits = sorted(self._wait_seconds)
+            counters = dict(self._counters)
+
+        return {
+            **counters,
+            "wait_p50_ms": _percentile_ms(waits, 0.50),
+            "wait_p95_ms": _percentile_ms(waits, 0.95),
+            "wait_p99_ms": _percentile_ms(waits, 0.99),
+            "wait_max_ms": waits[-1] * 1000 if waits else None,
+        }
+
+
+def _percentile_ms(sorted_values: List[float], fraction: float) -> Optional[float]:
+    if not sorted_values:
+        return None
+    index = min(int(fraction * len(sorted_values)), len(sorted_values) - 1)
+    return sorted_values[index] * 1000
+
+
+pool_metrics = PoolMetrics()
+
+
+class InstrumentedQueuePool(QueuePool):
+    """チェックアウトの待ち時間とタイムアウトをpool_metricsに記録するQueuePool"""
+
+    def connect(self):
+        # Engineが接続を取得する公開の入口。待ち時間にはpool_pre_pingによる確認も含まれる
+        started = time.perf_counter()
+        try:
+            return super().connect()
+        except exc.TimeoutError:
+            pool_metrics.increment("timeouts")
+            raise
+        finally:
+            pool_metrics.record_wait(time.perf_counter() - started)
+
+
+# InstrumentedQueuePoolを使う全エンジン（dispose後に再作成されたプールを含む）に適用される
+event.listen(InstrumentedQueuePool, "connect", lambda *args: pool_metrics.increment("connects"))
+event.listen(InstrumentedQueuePool, "checkout", lambda *args: pool_metrics.increment("checkouts"))
+event.listen(InstrumentedQueuePool, "checkin", lambda *args: pool_metrics.increment("checkins"))
+event.listen(InstrumentedQueuePool, "invalidate", lambda *args: pool_metrics.increment("invalidations"))
+
+
+def get_pool_stats(engine: Optional[Engine]) -> Dict[str, Any]:
+    """
+    コネクションプールの現在の使用状況と累計の計測値を返す
+
+    Args:
+        engine: 対象のエンジン（未初期化の場合はNone）
+
+    Returns:
+        プールサイズ・使用中の接続数・オーバーフロー数・待ち時間のパーセンタイル・
+        タイムアウト件数を含む辞書
+    """
+    stats = pool_metrics.snapshot()
+    pool = engine.pool if engine is not None else None
+
+    if isinstance(pool, QueuePool):
+        stats.update({
+            "pool_size": pool.size(),
+            "checked_out": pool.checkedout(),
+            "checked_in": pool.checkedin(),
+            "overflow": max(pool.overflow(), 0),
+            "timeout": pool.timeout(),
+        })
+    return stats
@@ -0,0 +1,173 @@
+import functools
+import logging
+import re
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Dict, Iterator, List, Optional
+
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+from utils.config import QUERY_BUDGET_COUNT, QUERY_BUDGET_MS
+
+logger = logging.getLogger(__name__)
+
+_current_scope: ContextVar[Optional["QueryScope"]] = ContextVar("query_scope", default=None)
+
+_WHITESPACE = re.compile(r"\s+")
+_STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+_NUMBER_LITERAL = re.compile(r"\b\d+(?:\.\d+)?\b")
+_PLACEHOLDER = re.compile(r"%\(\w+\)s|%s|\?")
+_PLACEHOLDER_LIST = re.compile(r"\?(?:\s*,\s*\?)+")
+
+
+def fingerprint(statement: str) -> str:
+    """
+    SQL文からリテラルとパラメータを取り除き、同じ形のクエリを同一視できる文字列にする
+
+    IN句などで展開されたパラメータの並びは1つにまとめる
+    """
+    statement = _STRING_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER.sub("?", statement)
+    statement = _NUMBER_LITERAL.sub("?", statement)
+    statement = _PLACEHOLDER_LIST.sub("?", statement)
+    return _WHITESPACE.sub(" ", statement).strip()
+
+
+class QueryScope:
+    """1回のスクリプト実行またはサービス呼び出しで発行されたクエリを集計する"""
+
+    def __init__(self, name: str, parent: Optional["QueryScope"] = None):
+        self.name = name
+        self.parent = parent
+        self.started = time.perf_counter()
+        self.elapsed_seconds: Optional[float] = None
+        self._lock = threading.Lock()
+        self._queries: List[Dict[str, Any]] = []
+        self._children: Dict[str, Dict[str, Any]] = {}
+
+    def record(self, statement_fingerprint: str, seconds: float, rows: int) -> None:
+        with self._lock:
+            self._queries.append({"fingerprint": statement_fingerprint, "seconds": seconds, "rows": rows})
+
+    def add_child(self, child: "QueryScope") -> None:
+        summary = child.summary()
+        with self._lock:
+            totals = self._children.setdefault(child.name, {"calls": 0, "count": 0, "total_ms": 0.0})
+            totals["calls"] += 1
+            totals["count"] += summary["count"]
+            totals["total_ms"] += summary["total_ms"]
+
+    def summary(self) -> Dict[str, Any]:
+        """
+        集計結果を返す
+
+        Returns:
+            件数・合計/最大時間(ms)・行数と、SQLの形ごとの件数を多い順に並べたby_fingerprint、
+            内側のスコープごとの集計childrenを含む辞書
+        """
+        with self._lock:
+            queries = list(self._queries)
+            children = {name: dict(totals) for name, totals in self._children.items()}
+
+        by_fingerprint: Dict[str, Dict[str, Any]] = {}
+        for query in queries:
+            totals = by_fingerprint.setdefault(
+                query["fingerprint"], {"fingerprint": query["fingerprint"], "count": 0, "total_ms": 0.0, "rows": 0}
+            )
+            totals["count"] += 1
+            totals["total_ms"] += query["seconds"] * 1000
+            totals["rows"] += max(query["rows"], 0)
+
+        return {
+            "name": self.name,
+            "count": len(queries),
+            "total_ms": sum(query["seconds"] for query in queries) * 1000,
+            "max_ms": max((query["seconds"] for query in queries), default=0.0) * 1000,
+            "rows": sum(max(query["rows"], 0) for query in queries),
+            "elapsed_ms": self.elapsed_seconds * 1000 if self.elapsed_seconds is not None else None,
+            "by_fingerprint": sorted(by_fingerprint.values(), key=lambda item: (-item["count"], -item["total_ms"])),
+            "children": children,
+        }
+
+    def over_budget(self, max_count: Optional[int] = None, max_ms: Optional[float] = None) -> bool:
+        """クエリ件数または合計時間が予算（未指定の場合は設定値）を超えているかを返す"""
+        max_count = QUERY_BUDGET_COUNT if max_count is None else max_count
+        max_ms = QUERY_BUDGET_MS if max_ms is None else max_ms
+        summary = self.summary()
+        return summary["count"] > max_count or summary["total_ms"] > max_ms
+
+
+@contextmanager
+def track_queries(name: str) -> Iterator[QueryScope]:
+    """
+    ブロック内で発行されたクエリを集計する
+
+    スコープは入れ子にでき、内側のクエリは外側のスコープにも計上される。
+    最も外側のスコープが予算（件数・合計時間）を超えた場合はログに出力する。
+    """
+    parent = _current_scope.get()
+    scope = QueryScope(name, parent)
+    token = _current_scope.set(scope)
+    try:
+        yield scope
+    finally:
+        _current_scope.reset(token)
+        scope.elapsed_seconds = time.perf_counter() - scope.started
+        if parent is not None:
+            parent.add_child(scope)
+        elif scope.over_budget():
+            _log_over_budget(scope)
+
+
+def instrument_queries(name: str) -> Callable:
+    """関数の呼び出し中に発行されたクエリをnameのスコープで集計するデコレータ"""
+    def decorator(func: Callable) -> Callable:
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with track_queries(name):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def current_scope() -> Optional[QueryScope]:
+    return _current_scope.get()
+
+
+def _log_over_budget(scope: QueryScope) -> None:
+    summary = scope.summary()
+    top = summary["by_fingerprint"][0] if summary["by_fingerprint"] else None
+    logger.warning(
+        "クエリ予算超過: %s %d件 %.1fms（予算 %d件 / %dms） 最多: %d回 %s",
+        summary["name"], summary["count"], summary["total_ms"], QUERY_BUDGET_COUNT, QUERY_BUDGET_MS,
+        top["count"] if top else 0, top["fingerprint"][:200] if top else "-"
+    )
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    if context is not None and _current_scope.get() is not None:
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany) -> None:
+    scope = _current_scope.get()
+    started = getattr(context, "_query_started", None)
+    if scope is None or started is None:
+        return
+
+    seconds = time.perf_counter() - started
+    statement_fingerprint = fingerprint(statement)
+    rows = cursor.rowcount if cursor.rowcount is not None else -1
+
+    # 内側のクエリは外側のスコープにも計上する
+    while scope is not None:
+        scope.record(statement_fingerprint, seconds, rows)
+        scope = scope.parent
+
+
+# 全エンジンのクエリを対象にする。スコープ外ではほぼ処理を行わない
+event.listen(Engine, "before_cursor_execute", _before_cursor_execute)
+event.listen(Engine, "after_cursor_execute", _after_cursor_execute)
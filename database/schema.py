@@ -1,64 +1,114 @@
-import os
-import time
-from subprocess import PIPE, run
+from typing import Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import Connection, Engine
+from sqlalchemy.exc import ProgrammingError
 
 from database.db import DatabaseManager
+from database.migrations import SCHEMA_VERSION, run_migrations
 from database.models import Base
+from database.partitioning import ensure_partitions, is_partitioned, partitions_ready
 from utils.constants import MESSAGES
 from utils.exceptions import DatabaseError
 
+SCHEMA_VERSION_TABLE = "schema_version"
+
 
-def run_alembic_migrations():
-    """Alembicマイグレーションを実行する"""
+def get_schema_version(engine: Engine) -> Optional[int]:
+    """
+    適用済みのスキーマバージョンを1回のクエリで取得する
+
+    Returns:
+        スキーマバージョン（バージョン管理テーブルが未作成の場合はNone）
+    """
     try:
-        root_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
-
-        result = run(
-            ["alembic", "upgrade", "head"],
-            cwd=root_dir,
-            stdout=PIPE,
-            stderr=PIPE,
-            text=True
-        )
-
-        if result.returncode != 0:
-            print(f"警告: マイグレーション実行中にエラーが発生しました: {result.stderr}")
-            return False
+        with engine.connect() as conn:
+            return conn.execute(text(f"SELECT max(version) FROM {SCHEMA_VERSION_TABLE}")).scalar()
+    except ProgrammingError:
+        return None
 
-        print("データベースマイグレーションが正常に完了しました。")
-        return True
-    except Exception as e:
-        print(f"マイグレーション実行中にエラーが発生しました: {str(e)}")
+
+def _upgrade_schema(conn: Connection) -> bool:
+    """
+    アドバイザリロックを取得してからテーブル作成と未適用のマイグレーションを行う
+
+    Returns:
+        スキーマを更新した場合はTrue
+    """
+    # 複数のプロセスが同時に起動しても1つずつ適用する。ロックはトランザクション終了時に解放される
+    conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:key))"), {"key": SCHEMA_VERSION_TABLE})
+
+    # ロック待ちの間に他のプロセスが適用した場合は何もしない
+    if conn.execute(text("SELECT to_regclass(:name)"), {"name": SCHEMA_VERSION_TABLE}).scalar() is not None:
+        current_version = conn.execute(text(f"SELECT max(version) FROM {SCHEMA_VERSION_TABLE}")).scalar()
+    else:
+        conn.execute(text(f"CREATE TABLE {SCHEMA_VERSION_TABLE} (version integer NOT NULL)"))
+        current_version = None
+
+    if current_version is not None and current_version >= SCHEMA_VERSION:
         return False
 
+    Base.metadata.create_all(conn)
+    version = run_migrations(conn, current_version or 0)
+
+    conn.execute(text(f"DELETE FROM {SCHEMA_VERSION_TABLE}"))
+    conn.execute(text(f"INSERT INTO {SCHEMA_VERSION_TABLE} (version) VALUES (:version)"), {"version": version})
+    print(f"データベーススキーマをバージョン{version}に更新しました。")
+    return True
+
+
+def _ensure_future_partitions(engine: Engine) -> bool:
+    """
+    summary_usageの今後の月のパーティションが不足している場合のみ作成する
+
+    Returns:
+        パーティションを作成した場合はTrue
+    """
+    with engine.connect() as conn:
+        if partitions_ready(conn):
+            return False
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            return False
+        ensure_partitions(conn)
+    return True
+
 
-def create_tables():
-    """ORMモデルからテーブルを作成する"""
+def create_tables() -> bool:
+    """
+    スキーマバージョンが最新でない場合のみテーブル作成とマイグレーションを行う
+
+    PostgreSQLでは続けてsummary_usageの今後の月のパーティションが揃っているかを確認し、不足分を作成する
+
+    Returns:
+        スキーマを更新した場合はTrue
+    """
     try:
         db_manager = DatabaseManager.get_instance()
         engine = db_manager.get_engine()
-        Base.metadata.create_all(engine)
-        return True
+
+        if engine.dialect.name != "postgresql":
+            Base.metadata.create_all(engine)
+            return False
+
+        current_version = get_schema_version(engine)
+        upgraded = False
+        if current_version is None or current_version < SCHEMA_VERSION:
+            with engine.begin() as conn:
+                upgraded = _upgrade_schema(conn)
+
+        # マイグレーションが不要な場合も、起動のたびに今後の月のパーティションを用意する
+        _ensure_future_partitions(engine)
+        return upgraded
     except Exception as e:
         raise DatabaseError(MESSAGES["DATABASE_TABLE_CREATE_ERROR"].format(error=str(e)))
 
 
-def initialize_database():
-    """データベースを初期化する（リトライロジック付き）"""
-    max_retries = 5
-    retry_count = 0
-    last_error = None
-
-    while retry_count < max_retries:
-        try:
-            create_tables()
-            return True
-        except Exception as e:
-            last_error = e
-            retry_count += 1
-            wait_time = 2 ** retry_count  # 指数バックオフ
-            print(f"データベース初期化に失敗しました（試行 {retry_count}/{max_retries}）: {str(e)}")
-            print(f"{wait_time}秒後に再試行します...")
-            time.sleep(wait_time)
-
-    raise DatabaseError(MESSAGES["DATABASE_INIT_FAILED"].format(error=str(last_error)))
+def initialize_database() -> bool:
+    """データベースを初期化する（スキーマが最新の場合はバージョンの確認のみ）"""
+    try:
+        create_tables()
+        return True
+    except Exception as e:
+        raise DatabaseError(MESSAGES["DATABASE_INIT_FAILED"].format(error=str(e)))
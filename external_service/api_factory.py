@@ -1,5 +1,5 @@
 from enum import Enum
-from typing import Union
+from typing import Any, Dict, Optional, Union
 
 from external_service.base_api import BaseAPIClient
 from external_service.claude_api import ClaudeAPIClient
@@ -40,11 +40,13 @@ class APIFactory:
                                      document_type: str = DEFAULT_DOCUMENT_TYPE,
                                      doctor: str = "default",
                                      model_name: str = None,
-                                     current_prescription: str = ""):
+                                     current_prescription: str = "",
+                                     resolved_prompt: Optional[Dict[str, Any]] = None):
         client = APIFactory.create_client(provider)
         return client.generate_summary(
             medical_text, additional_info, department,
-            document_type, doctor, model_name, current_prescription
+            document_type, doctor, model_name, current_prescription,
+            resolved_prompt
         )
 
 
@@ -1,10 +1,9 @@
 from abc import ABC, abstractmethod
-from typing import Tuple, Optional
+from typing import Any, Dict, Optional, Tuple
 
-from utils.config import get_config
 from utils.constants import DEFAULT_DOCUMENT_TYPE
 from utils.exceptions import APIError
-from utils.prompt_manager import get_prompt
+from utils.prompt_manager import resolve_prompt
 
 
 class BaseAPIClient(ABC):
@@ -22,14 +21,12 @@ class BaseAPIClient(ABC):
     
     def create_summary_prompt(self, medical_text: str, additional_info: str = "",
                             department: str = "default", document_type: str = DEFAULT_DOCUMENT_TYPE,
-                            doctor: str = "default", current_prescription: str = "") -> str:
-        prompt_data = get_prompt(department, document_type, doctor)
+                            doctor: str = "default", current_prescription: str = "",
+                            resolved_prompt: Optional[Dict[str, Any]] = None) -> str:
+        if resolved_prompt is None:
+            resolved_prompt = resolve_prompt(department, document_type, doctor)
 
-        if not prompt_data:
-            config = get_config()
-            prompt_template = config['PROMPTS']['summary']
-        else:
-            prompt_template = prompt_data['content']
+        prompt_template = resolved_prompt["content"]
 
         prompt = f"{prompt_template}\n【カルテ情報】\n{medical_text}"
 
@@ -40,10 +37,11 @@ class BaseAPIClient(ABC):
 
         return prompt
     
-    def get_model_name(self, department: str, document_type: str, doctor: str) -> str:
-        prompt_data = get_prompt(department, document_type, doctor)
-        return prompt_data.get("selected_model") if prompt_data and prompt_data.get(
-            "selected_model") else self.default_model
+    def get_model_name(self, department: str, document_type: str, doctor: str,
+                       resolved_prompt: Optional[Dict[str, Any]] = None) -> str:
+        if resolved_prompt is None:
+            resolved_prompt = resolve_prompt(department, document_type, doctor)
+        return resolved_prompt.get("selected_model") or self.default_model
     
     def generate_summary(
             self, medical_text: str,
@@ -52,15 +50,20 @@ class BaseAPIClient(ABC):
             document_type: str = DEFAULT_DOCUMENT_TYPE,
             doctor: str = "default",
             model_name: Optional[str] = None,
-            current_prescription: str = ""
+            current_prescription: str = "",
+            resolved_prompt: Optional[Dict[str, Any]] = None
     ) -> Tuple[str, int, int]:
         try:
             self.initialize()
 
+            if resolved_prompt is None:
+                resolved_prompt = resolve_prompt(department, document_type, doctor)
+
             if not model_name:
-                model_name = self.get_model_name(department, document_type, doctor)
+                model_name = self.get_model_name(department, document_type, doctor, resolved_prompt)
 
-            prompt = self.create_summary_prompt(medical_text, additional_info, department, document_type, doctor, current_prescription)
+            prompt = self.create_summary_prompt(medical_text, additional_info, department, document_type, doctor,
+                                                current_prescription, resolved_prompt)
 
             return self._generate_content(prompt, model_name)
 
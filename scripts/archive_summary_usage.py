@@ -0,0 +1,67 @@
+"""
+保持期間を過ぎたsummary_usageの月パーティションをParquetにアーカイブする
+
+今後の月のパーティションを作成したうえで、保持期間より古い月のパーティションを切り離し、
+zstd圧縮のParquetファイルに書き出してから削除する。cronなどで月に1回以上実行する。
+
+使用例:
+    python scripts/archive_summary_usage.py --retention-months 24 --archive-dir archive/summary_usage
+    python scripts/archive_summary_usage.py --dry-run
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.env_loader import load_environment_variables  # noqa: E402
+
+load_environment_variables()
+
+from database.db import DatabaseManager  # noqa: E402
+from database.partitioning import (  # noqa: E402
+    ARCHIVE_BATCH_SIZE,
+    archive_partitions,
+    ensure_partitions,
+    is_partitioned,
+)
+from utils.config import (  # noqa: E402
+    SUMMARY_USAGE_ARCHIVE_DIR,
+    SUMMARY_USAGE_PARTITION_MONTHS_AHEAD,
+    SUMMARY_USAGE_RETENTION_MONTHS,
+)
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="summary_usageの古い月パーティションのアーカイブ")
+    parser.add_argument("--retention-months", type=int, default=SUMMARY_USAGE_RETENTION_MONTHS,
+                        help="当月を含めて保持する月数")
+    parser.add_argument("--archive-dir", type=Path, default=Path(SUMMARY_USAGE_ARCHIVE_DIR),
+                        help="Parquetファイルの出力先")
+    parser.add_argument("--months-ahead", type=int, default=SUMMARY_USAGE_PARTITION_MONTHS_AHEAD,
+                        help="事前に作成するパーティションの月数")
+    parser.add_argument("--batch-size", type=int, default=ARCHIVE_BATCH_SIZE, help="1回に読み込む行数")
+    parser.add_argument("--dry-run", action="store_true", help="アーカイブ対象の表示のみ行う")
+    args = parser.parse_args()
+
+    engine = DatabaseManager.get_instance().get_engine()
+
+    with engine.begin() as conn:
+        if not is_partitioned(conn):
+            print("summary_usageがパーティションテーブルではありません。アプリを起動してマイグレーションを適用してください。")
+            sys.exit(1)
+        if not args.dry_run:
+            ensure_partitions(conn, months_ahead=args.months_ahead)
+
+    archived = archive_partitions(engine, args.retention_months, args.archive_dir,
+                                  batch_size=args.batch_size, dry_run=args.dry_run)
+
+    if not archived:
+        print("アーカイブ対象のパーティションはありません")
+    elif args.dry_run:
+        for item in archived:
+            print(f"アーカイブ対象: {item['partition']} -> {item['path']}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,163 @@
+"""
+統計画面の整形処理（format_detail_data・format_department_data）のベンチマーク
+
+旧実装と現実装で結果が一致することを確認し、実際の表示件数（1ページ50〜200行）と
+大量データ（10万行）のそれぞれで処理時間を比較する。
+日時はタイムゾーンなし・あり・混在の3種類で計測する。
+
+使用例:
+    python scripts/benchmark_statistics_formatting.py
+    python scripts/benchmark_statistics_formatting.py --rows 50 200 100000
+"""
+import argparse
+import datetime
+import random
+import sys
+import time
+from pathlib import Path
+from typing import Any, Callable, Dict, List
+from unittest.mock import MagicMock
+
+import pandas as pd
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+# streamlitのUIは使わないため、サーバーを起動せずにviewsを読み込む
+sys.modules.setdefault("streamlit", MagicMock())
+
+from views.statistics_page import JST, MODEL_MAPPING, format_department_data, format_detail_data  # noqa: E402
+
+DEPARTMENTS = ["default", "内科", "外科", "整形外科", None]
+DOCTORS = ["default", "田中医師", "佐藤医師", None]
+DOCUMENT_TYPES = ["退院時サマリ", "他院への紹介", "主治医意見書", "", None]
+MODEL_DETAILS = ["gemini-2.5-pro", "Claude", "claude-3-sonnet", "unknown", None]
+
+
+def legacy_format_detail_data(records: List[Dict[str, Any]]) -> pd.DataFrame:
+    detail_data = []
+    for record in records:
+        model_detail = str(record.get("model_detail", "")).lower()
+        model_info = "Gemini_Pro"
+
+        for model_name, pattern in MODEL_MAPPING.items():
+            if pattern in model_detail:
+                model_info = model_name
+                break
+
+        record_date = record["date"]
+        if record_date.tzinfo:
+            jst_date = record_date.astimezone(JST)
+        else:
+            jst_date = JST.localize(record_date)
+
+        detail_data.append({
+            "作成日": jst_date.strftime("%Y/%m/%d"),
+            "文書名": record.get("document_types") or "不明",
+            "診療科": "全科共通" if record.get("department") == "default" else record.get("department"),
+            "医師名": "医師共通" if record.get("doctor") == "default" else record.get("doctor"),
+            "AIモデル": model_info,
+            "入力トークン": record["input_tokens"],
+            "出力トークン": record["output_tokens"],
+            "処理時間(秒)": round(record["processing_time"]) if record["processing_time"] else 0,
+        })
+    return pd.DataFrame(detail_data)
+
+
+def legacy_format_department_data(dept_stats: List[Dict[str, Any]]) -> pd.DataFrame:
+    data = []
+    for stat in dept_stats:
+        dept_name = "全科共通" if stat["department"] == "default" else stat["department"]
+        doctor_name = "医師共通" if stat["doctor"] == "default" else stat["doctor"]
+        document_types = stat["document_types"] or "不明"
+        data.append({
+            "文書名": document_types,
+            "診療科": dept_name,
+            "医師名": doctor_name,
+            "作成件数": stat["count"],
+            "入力トークン": stat["input_tokens"],
+            "出力トークン": stat["output_tokens"],
+            "合計トークン": stat["total_tokens"],
+        })
+    return pd.DataFrame(data)
+
+
+def generate_records(rows: int, timezone: str, rng: random.Random) -> List[Dict[str, Any]]:
+    """timezoneは"naive"・"aware"・"mixed"（1行ごとに交互）のいずれか"""
+    start = datetime.datetime(2025, 1, 1)
+    records = []
+    for record_id in range(rows):
+        date = start + datetime.timedelta(seconds=rng.randrange(365 * 24 * 3600))
+        if timezone == "aware" or (timezone == "mixed" and record_id % 2):
+            date = date.replace(tzinfo=datetime.timezone.utc)
+        records.append({
+            "id": record_id,
+            "date": date,
+            "document_types": rng.choice(DOCUMENT_TYPES),
+            "model_detail": rng.choice(MODEL_DETAILS),
+            "department": rng.choice(DEPARTMENTS),
+            "doctor": rng.choice(DOCTORS),
+            "input_tokens": rng.randrange(100, 20000),
+            "output_tokens": rng.randrange(100, 4000),
+            "processing_time": rng.choice([None, 0, rng.randrange(1, 120)]),
+        })
+    return records
+
+
+def generate_dept_stats(rows: int, rng: random.Random) -> List[Dict[str, Any]]:
+    stats = []
+    for _ in range(rows):
+        input_tokens = rng.randrange(100, 20000)
+        output_tokens = rng.randrange(100, 4000)
+        stats.append({
+            "department": rng.choice(DEPARTMENTS[:-1]),
+            "doctor": rng.choice(DOCTORS[:-1]),
+            "document_types": rng.choice(DOCUMENT_TYPES),
+            "count": rng.randrange(1, 500),
+            "input_tokens": input_tokens,
+            "output_tokens": output_tokens,
+            "total_tokens": input_tokens + output_tokens,
+            "processing_time": rng.randrange(1, 5000),
+        })
+    return stats
+
+
+def measure(func: Callable[[List[Dict[str, Any]]], pd.DataFrame], data: List[Dict[str, Any]],
+            repeat: int) -> tuple:
+    best = float("inf")
+    result = pd.DataFrame()
+    for _ in range(repeat):
+        started = time.perf_counter()
+        result = func(data)
+        best = min(best, time.perf_counter() - started)
+    return best, result
+
+
+def run(name: str, legacy: Callable, current: Callable, data: List[Dict[str, Any]], repeat: int) -> None:
+    # 1ページ分の行数では1回あたりの時間が短いため、計測回数を増やしてばらつきを抑える
+    repeat = repeat if len(data) >= 10_000 else repeat * 100
+    legacy_time, expected = measure(legacy, data, repeat)
+    current_time, actual = measure(current, data, repeat)
+
+    pd.testing.assert_frame_equal(actual, expected, check_dtype=False)
+
+    print(f"{name:<32} {len(data):>8}行  旧実装 {legacy_time * 1000:>9.2f}ms  "
+          f"現実装 {current_time * 1000:>8.2f}ms  ({legacy_time / current_time:.1f}倍)")
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="統計画面の整形処理のベンチマーク")
+    parser.add_argument("--rows", type=int, nargs="+", default=[50, 200, 100_000], help="計測する行数")
+    parser.add_argument("--repeat", type=int, default=3, help="計測回数（最速値を表示）")
+    parser.add_argument("--seed", type=int, default=0, help="乱数シード")
+    args = parser.parse_args()
+
+    rng = random.Random(args.seed)
+
+    for rows in args.rows:
+        for timezone in ("naive", "aware", "mixed"):
+            run(f"format_detail_data ({timezone})", legacy_format_detail_data, format_detail_data,
+                generate_records(rows, timezone, rng), args.repeat)
+        run("format_department_data", legacy_format_department_data, format_department_data,
+            generate_dept_stats(rows, rng), args.repeat)
+
+if __name__ == "__main__":
+    main()
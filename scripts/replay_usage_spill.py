@@ -0,0 +1,32 @@
+"""
+UsageWriterが保存に失敗して退避した利用記録をデータベースに保存し直す
+
+使用例:
+    python scripts/replay_usage_spill.py
+    python scripts/replay_usage_spill.py --path spill/usage_records.jsonl
+"""
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from utils.env_loader import load_environment_variables  # noqa: E402
+
+load_environment_variables()
+
+from services.usage_service import replay_spilled_usage  # noqa: E402
+from utils.config import USAGE_WRITER_SPILL_PATH  # noqa: E402
+
+
+def main() -> None:
+    parser = argparse.ArgumentParser(description="退避した利用記録の再保存")
+    parser.add_argument("--path", default=USAGE_WRITER_SPILL_PATH, help="退避ファイルのパス")
+    args = parser.parse_args()
+
+    count = replay_spilled_usage(args.path)
+    print(f"退避していた利用記録{count}件を保存しました")
+
+
+if __name__ == "__main__":
+    main()
@@ -9,16 +9,45 @@ from streamlit.delta_generator import DeltaGenerator
 
 from database.db import DatabaseManager
 from database.models import EvaluationPrompt
+from database.notifier import publish_invalidation, register_invalidation_handler, start_invalidation_listener
 from external_service.gemini_evaluation import GeminiAPIClient
-from utils.config import GEMINI_EVALUATION_MODEL, GOOGLE_CREDENTIALS_JSON
+from utils.cache import LRUTTLCache
+from utils.config import GEMINI_EVALUATION_MODEL, GOOGLE_CREDENTIALS_JSON, PROMPT_CACHE_MAXSIZE, PROMPT_CACHE_TTL
 from utils.error_handlers import handle_error
 from utils.exceptions import APIError, DatabaseError
 
+_evaluation_prompt_cache = LRUTTLCache(maxsize=PROMPT_CACHE_MAXSIZE, ttl=PROMPT_CACHE_TTL)
+
+
+def clear_evaluation_prompt_cache() -> None:
+    _evaluation_prompt_cache.clear()
+
+
+def _handle_cache_invalidation(message: Dict[str, Any]) -> None:
+    if message.get("model") not in (None, EvaluationPrompt.__name__):
+        return
+
+    key = message.get("key")
+    if key is None:
+        _evaluation_prompt_cache.clear()
+    else:
+        _evaluation_prompt_cache.invalidate(key[0])
+
+
+register_invalidation_handler(_handle_cache_invalidation)
+
 
 def get_evaluation_prompt(document_type: str) -> Optional[Dict[str, Any]]:
+    start_invalidation_listener()
+    prompt = _evaluation_prompt_cache.get_or_load(document_type, lambda: _load_evaluation_prompt(document_type))
+    return dict(prompt) if prompt else prompt
+
+
+def _load_evaluation_prompt(document_type: str) -> Optional[Dict[str, Any]]:
     try:
         db_manager = DatabaseManager.get_instance()
-        return db_manager.query_one(EvaluationPrompt, {"document_type": document_type})
+        return db_manager.query_one(EvaluationPrompt, {"document_type": document_type},
+                                   columns=["document_type", "content"])
     except Exception as e:
         raise DatabaseError(f"評価プロンプトの取得に失敗しました: {str(e)}")
 
@@ -29,18 +58,22 @@ def create_or_update_evaluation_prompt(document_type: str, content: str) -> Tupl
             return False, "評価プロンプトを作成してください"
 
         db_manager = DatabaseManager.get_instance()
-        existing = db_manager.query_one(EvaluationPrompt, {"document_type": document_type})
-
-        db_manager.upsert(
-            EvaluationPrompt,
-            {"document_type": document_type},
-            {
-                "content": content,
-                "is_active": True,
-                "created_at": datetime.datetime.now(),
-                "updated_at": datetime.datetime.now()
-            }
-        )
+        with db_manager.unit_of_work() as uow:
+            existing = uow.query_one(EvaluationPrompt, {"document_type": document_type}, columns=["id"])
+
+            uow.upsert(
+                EvaluationPrompt,
+                {"document_type": document_type},
+                {
+                    "content": content,
+                    "is_active": True,
+                    "created_at": datetime.datetime.now(),
+                    "updated_at": datetime.datetime.now()
+                }
+            )
+
+        _evaluation_prompt_cache.invalidate(document_type)
+        publish_invalidation(EvaluationPrompt.__name__, (document_type,))
 
         if existing:
             return True, "評価プロンプトを更新しました"
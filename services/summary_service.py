@@ -1,16 +1,17 @@
+import contextvars
 import datetime
 import queue
 import threading
 import time
-from typing import Any, Dict, Tuple
+from typing import Any, Dict, Optional, Tuple
 
 import pytz
 import streamlit as st
 from streamlit.delta_generator import DeltaGenerator
 
-from database.db import DatabaseManager
-from database.models import SummaryUsage
+from database.query_metrics import instrument_queries
 from external_service.api_factory import generate_summary
+from services.usage_service import enqueue_usage
 from utils.config import (
     ANTHROPIC_MODEL,
     APP_TYPE,
@@ -24,7 +25,7 @@ from utils.config import (
 from utils.constants import DEFAULT_DEPARTMENT, DEFAULT_DOCUMENT_TYPE, DOCUMENT_TYPES, MESSAGES
 from utils.error_handlers import handle_error
 from utils.exceptions import APIError
-from utils.prompt_manager import get_prompt
+from utils.prompt_manager import get_prompt, resolve_prompt
 from utils.text_processor import format_output_summary, parse_output_summary
 
 JST = pytz.timezone('Asia/Tokyo')
@@ -46,9 +47,12 @@ def generate_summary_task(
             selected_department, selected_document_type
         )
 
+        resolved_prompt = resolve_prompt(normalized_dept, normalized_doc_type, selected_doctor)
+
         final_model, model_switched, original_model = determine_final_model(
             normalized_dept, normalized_doc_type, selected_doctor,
-            selected_model, model_explicitly_selected, input_text, additional_info
+            selected_model, model_explicitly_selected, input_text, additional_info,
+            resolved_prompt
         )
 
         provider, model_name = get_provider_and_model(final_model)
@@ -62,7 +66,8 @@ def generate_summary_task(
             document_type=normalized_doc_type,
             doctor=selected_doctor,
             model_name=model_name,
-            current_prescription=current_prescription
+            current_prescription=current_prescription,
+            resolved_prompt=resolved_prompt
         )
 
         model_detail = model_name if provider == "gemini" else final_model
@@ -76,6 +81,7 @@ def generate_summary_task(
             "input_tokens": input_tokens,
             "output_tokens": output_tokens,
             "model_detail": model_detail,
+            "provider": provider,
             "model_switched": model_switched,
             "original_model": original_model if model_switched else None
         })
@@ -89,6 +95,7 @@ def generate_summary_task(
 
 
 @handle_error
+@instrument_queries("process_summary")
 def process_summary(input_text: str, additional_info: str = "", current_prescription: str = "") -> None:
     validate_api_credentials()
     validate_input_text(input_text)
@@ -150,9 +157,11 @@ def execute_summary_generation_with_ui(
     status_placeholder = st.empty()
     result_queue = queue.Queue()
 
+    # クエリ計測のスコープを作成スレッドに引き継ぐ
     summary_thread = threading.Thread(
-        target=generate_summary_task,
+        target=contextvars.copy_context().run,
         args=(
+            generate_summary_task,
             input_text,
             session_params["selected_department"],
             session_params["selected_model"],
@@ -206,7 +215,6 @@ def handle_success_result(result: Dict[str, Any], session_params: Dict[str, Any]
 
 def save_usage_to_database(result: Dict[str, Any], session_params: Dict[str, Any]) -> None:
     try:
-        db_manager = DatabaseManager.get_instance()
         now_jst = datetime.datetime.now().astimezone(JST)
 
         usage_data = {
@@ -214,6 +222,7 @@ def save_usage_to_database(result: Dict[str, Any], session_params: Dict[str, Any
             "app_type": APP_TYPE,
             "document_types": session_params["selected_document_type"],
             "model_detail": result["model_detail"],
+            "provider": result.get("provider"),
             "department": session_params["selected_department"],
             "doctor": session_params["selected_doctor"],
             "input_tokens": result["input_tokens"],
@@ -222,7 +231,7 @@ def save_usage_to_database(result: Dict[str, Any], session_params: Dict[str, Any
             "processing_time": round(result["processing_time"])
         }
 
-        db_manager.insert(SummaryUsage, usage_data)
+        enqueue_usage(usage_data)
 
     except Exception as db_error:
         st.warning(f"データベース保存中にエラーが発生しました: {str(db_error)}")
@@ -241,9 +250,10 @@ def determine_final_model(
         selected_model: str,
         model_explicitly_selected: bool,
         input_text: str,
-        additional_info: str
+        additional_info: str,
+        resolved_prompt: Optional[Dict[str, Any]] = None
 ) -> Tuple[str, bool, str]:
-    prompt_data = get_prompt(department, document_type, doctor)
+    prompt_data = resolved_prompt if resolved_prompt is not None else get_prompt(department, document_type, doctor)
     prompt_selected_model = prompt_data.get("selected_model") if prompt_data else None
 
     if prompt_selected_model and not model_explicitly_selected:
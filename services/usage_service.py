@@ -0,0 +1,367 @@
+import atexit
+import datetime
+import json
+import logging
+import os
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, List, Optional, Tuple
+
+import pytz
+
+from database.db import DatabaseManager
+from database.models import SummaryUsage, SummaryUsageDaily
+from database.notifier import publish_invalidation
+from utils.config import (
+    USAGE_WRITER_BATCH_SIZE,
+    USAGE_WRITER_FLUSH_INTERVAL,
+    USAGE_WRITER_MAX_QUEUE_SIZE,
+    USAGE_WRITER_MAX_RETRIES,
+    USAGE_WRITER_RETRY_BACKOFF,
+    USAGE_WRITER_SPILL_PATH,
+    USAGE_WRITER_STATS_INTERVAL,
+)
+from views.statistics_page import invalidate_statistics_cache
+
+logger = logging.getLogger(__name__)
+
+JST = pytz.timezone('Asia/Tokyo')
+
+DAILY_KEY_COLUMNS = ["day", "provider", "department", "doctor", "document_types"]
+DAILY_SUM_COLUMNS = ["count", "input_tokens", "output_tokens", "total_tokens", "processing_time"]
+
+
+def to_jst_date(value: datetime.datetime) -> datetime.date:
+    if value.tzinfo:
+        return value.astimezone(JST).date()
+    return value.date()
+
+
+def build_daily_rows(usage_rows: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    利用記録をsummary_usage_dailyの加算用の行にまとめる
+
+    Args:
+        usage_rows: summary_usageに挿入するデータの辞書のリスト
+
+    Returns:
+        集計キーごとに件数・トークン数・処理時間を合計した辞書のリスト
+    """
+    daily: Dict[tuple, Dict[str, Any]] = {}
+    for usage in usage_rows:
+        row = {
+            "day": to_jst_date(usage["date"]),
+            "provider": usage.get("provider") or "",
+            "department": usage.get("department") or "default",
+            "doctor": usage.get("doctor") or "default",
+            "document_types": usage.get("document_types") or "",
+        }
+        key = tuple(row[column] for column in DAILY_KEY_COLUMNS)
+        if key not in daily:
+            daily[key] = {**row, **{column: 0 for column in DAILY_SUM_COLUMNS}}
+
+        totals = daily[key]
+        totals["count"] += 1
+        totals["input_tokens"] += usage.get("input_tokens") or 0
+        totals["output_tokens"] += usage.get("output_tokens") or 0
+        totals["total_tokens"] += usage.get("total_tokens") or 0
+        totals["processing_time"] += usage.get("processing_time") or 0
+
+    return list(daily.values())
+
+
+def save_usage_records(usage_rows: List[Dict[str, Any]]) -> None:
+    """利用記録の挿入と日次集計の加算を1トランザクションで行う"""
+    if not usage_rows:
+        return
+
+    daily_rows = build_daily_rows(usage_rows)
+
+    db_manager = DatabaseManager.get_instance()
+    with db_manager.unit_of_work() as uow:
+        uow.insert_many(SummaryUsage, usage_rows)
+        uow.upsert_many(
+            SummaryUsageDaily,
+            daily_rows,
+            DAILY_KEY_COLUMNS,
+            accumulate_columns=DAILY_SUM_COLUMNS
+        )
+
+    # 書き込んだ日を期間に含む統計キャッシュを無効化する。
+    # 通知に失敗しても自プロセスのキャッシュは確実に無効化されるよう、通知の前に直接無効化する
+    days = sorted({row["day"] for row in daily_rows})
+    invalidate_statistics_cache(days)
+    publish_invalidation(SummaryUsage.__name__, [day.isoformat() for day in days])
+
+
+def _json_default(value: Any) -> Any:
+    if isinstance(value, (datetime.datetime, datetime.date)):
+        return value.isoformat()
+    return str(value)
+
+
+class UsageWriter:
+    """
+    利用記録をキューに溜め、バックグラウンドスレッドでまとめて保存する
+
+    batch_size件溜まるか、最初の1件からflush_interval秒経過した時点で1トランザクションで保存する。
+    キューが満杯の場合は呼び出し元のスレッドで直接保存する。
+    保存に失敗したバッチはretry_backoff秒から倍々に間隔を空けて最大max_retries回再試行し、
+    それでも失敗した場合はspill_pathのJSON Linesファイルに退避する（replay_spilled_usageで保存し直せる）。
+    stats_interval秒ごとに保存状況をログに出力し、再試行待ち・退避・消失がある場合は警告とする。
+    """
+
+    def __init__(self, batch_size: int = USAGE_WRITER_BATCH_SIZE,
+                 flush_interval: float = USAGE_WRITER_FLUSH_INTERVAL,
+                 max_queue_size: int = USAGE_WRITER_MAX_QUEUE_SIZE,
+                 max_retries: int = USAGE_WRITER_MAX_RETRIES,
+                 retry_backoff: float = USAGE_WRITER_RETRY_BACKOFF,
+                 spill_path: str = USAGE_WRITER_SPILL_PATH,
+                 stats_interval: float = USAGE_WRITER_STATS_INTERVAL):
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.spill_path = Path(spill_path)
+        self.stats_interval = stats_interval
+        self._queue: queue.Queue = queue.Queue(maxsize=max_queue_size)
+        self._stop_event = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._lock = threading.Lock()
+        # (再試行する時刻, 失敗回数, 利用記録) のリスト
+        self._retries: List[Tuple[float, int, List[Dict[str, Any]]]] = []
+        self._flushes = 0
+        self._written = 0
+        self._failed = 0
+        self._retried = 0
+        self._spilled = 0
+        self._lost = 0
+        self._last_flush_seconds: Optional[float] = None
+        self._max_flush_seconds = 0.0
+        self._total_flush_seconds = 0.0
+        self._logged_spilled = 0
+        self._logged_lost = 0
+
+    def start(self) -> None:
+        with self._lock:
+            if self._thread is not None and self._thread.is_alive():
+                return
+            self._stop_event.clear()
+            self._thread = threading.Thread(target=self._run, name="usage-writer", daemon=True)
+            self._thread.start()
+
+    def enqueue(self, usage: Dict[str, Any]) -> None:
+        """利用記録を保存キューに追加する"""
+        self.start()
+        try:
+            self._queue.put_nowait(usage)
+        except queue.Full:
+            self._flush([usage])
+
+    def close(self, timeout: Optional[float] = None) -> None:
+        """
+        キューに残っている利用記録を保存してからスレッドを停止する
+
+        再試行待ちの記録は待たずに1回だけ再試行し、失敗した場合は退避する
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout=timeout)
+        # スレッド停止後に追加された分も保存する
+        self._flush(self._drain(), final=True)
+        self._retry_due(final=True)
+
+    def stats(self) -> Dict[str, Any]:
+        """キューの滞留件数と保存の所要時間・失敗件数を返す"""
+        with self._lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "pending_retry": sum(len(records) for _, _, records in self._retries),
+                "flushes": self._flushes,
+                "written": self._written,
+                "failed": self._failed,
+                "retried": self._retried,
+                "spilled": self._spilled,
+                "lost": self._lost,
+                "last_flush_seconds": self._last_flush_seconds,
+                "avg_flush_seconds": self._total_flush_seconds / self._flushes if self._flushes else None,
+                "max_flush_seconds": self._max_flush_seconds,
+            }
+
+    def _run(self) -> None:
+        next_stats_log = time.monotonic() + self.stats_interval
+        while not self._stop_event.is_set():
+            self._retry_due()
+            batch = self._collect_batch()
+            if batch:
+                self._flush(batch)
+            if self.stats_interval > 0 and time.monotonic() >= next_stats_log:
+                self._log_stats()
+                next_stats_log = time.monotonic() + self.stats_interval
+        self._flush(self._drain())
+
+    def _log_stats(self) -> None:
+        """保存状況をログに出力する（前回から退避・消失が増えた場合や再試行待ちがある場合は警告）"""
+        stats = self.stats()
+        problem = (stats["pending_retry"] > 0 or stats["spilled"] > self._logged_spilled
+                   or stats["lost"] > self._logged_lost)
+        self._logged_spilled = stats["spilled"]
+        self._logged_lost = stats["lost"]
+        logger.log(
+            logging.WARNING if problem else logging.INFO,
+            "利用記録の保存状況: 滞留 %d件 再試行待ち %d件 保存 %d件 失敗 %d件 退避 %d件 消失 %d件 "
+            "保存時間 平均 %s 最大 %.3f秒",
+            stats["queue_depth"], stats["pending_retry"], stats["written"], stats["failed"],
+            stats["spilled"], stats["lost"],
+            "-" if stats["avg_flush_seconds"] is None else f"{stats['avg_flush_seconds']:.3f}秒",
+            stats["max_flush_seconds"]
+        )
+
+    def _collect_batch(self) -> List[Dict[str, Any]]:
+        try:
+            batch = [self._queue.get(timeout=self.flush_interval)]
+        except queue.Empty:
+            return []
+
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size and not self._stop_event.is_set():
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=remaining))
+            except queue.Empty:
+                break
+        return batch
+
+    def _drain(self) -> List[Dict[str, Any]]:
+        batch = []
+        while True:
+            try:
+                batch.append(self._queue.get_nowait())
+            except queue.Empty:
+                return batch
+
+    def _flush(self, batch: List[Dict[str, Any]], final: bool = False) -> None:
+        for offset in range(0, len(batch), self.batch_size):
+            chunk = batch[offset:offset + self.batch_size]
+            if not self._save(chunk):
+                self._handle_failure(chunk, 1, final)
+
+    def _retry_due(self, final: bool = False) -> None:
+        """再試行の時刻を過ぎた記録（finalの場合は全件）を保存し直す"""
+        now = time.monotonic()
+        with self._lock:
+            due = [retry for retry in self._retries if final or retry[0] <= now]
+            self._retries = [retry for retry in self._retries if not (final or retry[0] <= now)]
+
+        for _, failures, records in due:
+            with self._lock:
+                self._retried += len(records)
+            if not self._save(records):
+                self._handle_failure(records, failures + 1, final)
+
+    def _save(self, records: List[Dict[str, Any]]) -> bool:
+        started = time.perf_counter()
+        try:
+            save_usage_records(records)
+            succeeded = True
+        except Exception as e:
+            succeeded = False
+            logger.warning("利用記録%d件の保存に失敗しました: %s", len(records), e)
+        elapsed = time.perf_counter() - started
+
+        with self._lock:
+            self._flushes += 1
+            self._last_flush_seconds = elapsed
+            self._max_flush_seconds = max(self._max_flush_seconds, elapsed)
+            self._total_flush_seconds += elapsed
+            if succeeded:
+                self._written += len(records)
+            else:
+                self._failed += len(records)
+        return succeeded
+
+    def _handle_failure(self, records: List[Dict[str, Any]], failures: int, final: bool) -> None:
+        if final or failures > self.max_retries:
+            self._spill(records)
+            return
+
+        delay = self.retry_backoff * 2 ** (failures - 1)
+        with self._lock:
+            self._retries.append((time.monotonic() + delay, failures, records))
+        logger.warning("%.1f秒後に再試行します（%d/%d回目）", delay, failures, self.max_retries)
+
+    def _spill(self, records: List[Dict[str, Any]]) -> None:
+        """保存できなかった利用記録をファイルに追記し、失われないようにする"""
+        lines = "".join(json.dumps(usage, ensure_ascii=False, default=_json_default) + "\n" for usage in records)
+        try:
+            with self._lock:
+                self.spill_path.parent.mkdir(parents=True, exist_ok=True)
+                with open(self.spill_path, "a", encoding="utf-8") as f:
+                    f.write(lines)
+                    f.flush()
+                    os.fsync(f.fileno())
+                self._spilled += len(records)
+            logger.error("保存できなかった利用記録%d件を%sに退避しました。replay_spilled_usageで保存し直してください",
+                         len(records), self.spill_path)
+        except Exception as e:
+            with self._lock:
+                self._lost += len(records)
+            # 退避もできない場合は記録の内容をログに残す
+            logger.error("利用記録%d件を保存・退避できませんでした: %s\n%s", len(records), e, lines)
+
+
+def replay_spilled_usage(path: str = USAGE_WRITER_SPILL_PATH) -> int:
+    """
+    UsageWriterが退避した利用記録を1トランザクションで保存し直す
+
+    保存中に新たに退避された記録と混ざらないよう、退避ファイルを切り替えてから読み込む。
+    保存に失敗した場合は切り替えたファイルを残し、次回の呼び出しで再度保存する。
+
+    Args:
+        path: 退避ファイルのパス
+
+    Returns:
+        保存した件数
+    """
+    spill_path = Path(path)
+    replaying_path = spill_path.with_name(spill_path.name + ".replaying")
+    if not replaying_path.exists():
+        if not spill_path.exists():
+            return 0
+        os.replace(spill_path, replaying_path)
+
+    with open(replaying_path, encoding="utf-8") as f:
+        usage_rows = [json.loads(line) for line in f if line.strip()]
+    for usage in usage_rows:
+        usage["date"] = datetime.datetime.fromisoformat(usage["date"])
+
+    save_usage_records(usage_rows)
+    replaying_path.unlink()
+    return len(usage_rows)
+
+
+_usage_writer: Optional[UsageWriter] = None
+_usage_writer_lock = threading.Lock()
+
+
+def get_usage_writer() -> UsageWriter:
+    global _usage_writer
+    if _usage_writer is None:
+        with _usage_writer_lock:
+            if _usage_writer is None:
+                _usage_writer = UsageWriter()
+                atexit.register(_usage_writer.close, USAGE_WRITER_FLUSH_INTERVAL + 5)
+    return _usage_writer
+
+
+def enqueue_usage(usage: Dict[str, Any]) -> None:
+    """利用記録をバックグラウンドで保存する"""
+    get_usage_writer().enqueue(usage)
+
+
+def get_usage_writer_stats() -> Dict[str, Any]:
+    return get_usage_writer().stats()
@@ -93,6 +93,10 @@ def mock_database_manager():
     mock = Mock()
     mock.execute_query.return_value = []
     mock.get_session.return_value = Mock()
+    # unit_of_work()のブロック内でもマネージャーと同じモックで操作を検証できるようにする
+    mock.unit_of_work.return_value = MagicMock()
+    mock.unit_of_work.return_value.__enter__.return_value = mock
+    mock.unit_of_work.return_value.__exit__.return_value = False
     return mock
 
 
@@ -109,6 +113,44 @@ def sample_prompt_data():
     }
 
 
+@pytest.fixture
+def db_manager():
+    """SQLiteのインメモリDBを設定したDatabaseManager"""
+    from sqlalchemy import create_engine
+    from sqlalchemy.orm import sessionmaker
+    from sqlalchemy.pool import StaticPool
+
+    from database.db import DatabaseManager
+    from database.models import Base
+
+    # バックグラウンドスレッドからも同じインメモリDBを使えるよう接続を1つに固定する
+    engine = create_engine("sqlite://", connect_args={"check_same_thread": False}, poolclass=StaticPool)
+    Base.metadata.create_all(engine)
+
+    DatabaseManager._engine = engine
+    DatabaseManager._session_factory = sessionmaker(bind=engine)
+    # fork検知でプールが作り直されないよう現在のプロセスのエンジンとして登録する
+    DatabaseManager._pid = os.getpid()
+    DatabaseManager._instance = DatabaseManager()
+    yield DatabaseManager._instance
+
+    DatabaseManager._instance = None
+    DatabaseManager._engine = None
+    DatabaseManager._session_factory = None
+    DatabaseManager._pid = None
+    engine.dispose()
+
+
+@pytest.fixture(autouse=True)
+def in_memory_cache_notifier():
+    """キャッシュ無効化の通知をプロセス内で完結させる"""
+    from database.notifier import InMemoryNotifier, set_notifier
+
+    set_notifier(InMemoryNotifier())
+    yield
+    set_notifier(None)
+
+
 @pytest.fixture(autouse=True)
 def reset_environment():
     """各テスト前後で環境変数をリセット"""
@@ -0,0 +1,114 @@
+import threading
+from unittest.mock import Mock
+
+from utils.cache import LRUTTLCache
+
+
+class TestLRUTTLCache:
+    """LRUTTLCacheクラスのテスト"""
+
+    def test_get_or_load_miss_then_hit(self):
+        """キャッシュミス後にヒットするテスト"""
+        cache = LRUTTLCache(maxsize=10, ttl=60)
+        loader = Mock(return_value="値")
+
+        assert cache.get_or_load("key", loader) == "値"
+        assert cache.get_or_load("key", loader) == "値"
+
+        loader.assert_called_once()
+        stats = cache.stats()
+        assert stats["hits"] == 1
+        assert stats["misses"] == 1
+        assert stats["size"] == 1
+
+    def test_none_value_is_cached(self):
+        """Noneも値としてキャッシュされるテスト"""
+        cache = LRUTTLCache(maxsize=10, ttl=60)
+        loader = Mock(return_value=None)
+
+        assert cache.get_or_load("key", loader) is None
+        assert cache.get_or_load("key", loader) is None
+
+        loader.assert_called_once()
+
+    def test_lru_eviction(self):
+        """容量超過時に最も古いエントリが追い出されるテスト"""
+        cache = LRUTTLCache(maxsize=2, ttl=60)
+
+        cache.get_or_load("a", lambda: 1)
+        cache.get_or_load("b", lambda: 2)
+        cache.get_or_load("a", lambda: 1)
+        cache.get_or_load("c", lambda: 3)
+
+        loader = Mock(return_value=2)
+        cache.get_or_load("b", loader)
+
+        loader.assert_called_once()
+        assert cache.stats()["evictions"] >= 1
+
+    def test_ttl_expiration(self):
+        """TTL経過後に再読み込みされるテスト"""
+        cache = LRUTTLCache(maxsize=10, ttl=0)
+        loader = Mock(return_value="値")
+
+        cache.get_or_load("key", loader)
+        cache.get_or_load("key", loader)
+
+        assert loader.call_count == 2
+
+    def test_invalidate(self):
+        """キー指定の無効化テスト"""
+        cache = LRUTTLCache(maxsize=10, ttl=60)
+        cache.get_or_load("a", lambda: 1)
+        cache.get_or_load("b", lambda: 2)
+
+        cache.invalidate("a")
+
+        loader = Mock(return_value=10)
+        assert cache.get_or_load("a", loader) == 10
+        loader.assert_called_once()
+        assert cache.stats()["invalidations"] == 1
+
+    def test_invalidate_where(self):
+        """条件指定の無効化テスト"""
+        cache = LRUTTLCache(maxsize=10, ttl=60)
+        cache.get_or_load(("内科", 1), lambda: 1)
+        cache.get_or_load(("内科", 2), lambda: 2)
+        cache.get_or_load(("外科", 1), lambda: 3)
+
+        removed = cache.invalidate_where(lambda key: key[0] == "内科")
+
+        assert removed == 2
+        assert cache.stats()["size"] == 1
+
+    def test_clear(self):
+        """全エントリの無効化テスト"""
+        cache = LRUTTLCache(maxsize=10, ttl=60)
+        cache.get_or_load("a", lambda: 1)
+        cache.get_or_load("b", lambda: 2)
+
+        cache.clear()
+
+        assert cache.stats()["size"] == 0
+
+    def test_load_racing_with_invalidation_is_not_stored(self):
+        """読み込み中に無効化された場合は古い値を保存しないテスト"""
+        cache = LRUTTLCache(maxsize=10, ttl=60)
+        loading = threading.Event()
+        release = threading.Event()
+
+        def slow_loader():
+            loading.set()
+            release.wait(timeout=5)
+            return "古い値"
+
+        thread = threading.Thread(target=cache.get_or_load, args=("key", slow_loader))
+        thread.start()
+        loading.wait(timeout=5)
+        cache.invalidate("key")
+        release.set()
+        thread.join()
+
+        loader = Mock(return_value="新しい値")
+        assert cache.get_or_load("key", loader) == "新しい値"
+        loader.assert_called_once()
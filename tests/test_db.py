@@ -1,9 +1,13 @@
 import pytest
 import os
+import threading
 from unittest.mock import Mock, patch, MagicMock
+from sqlalchemy.dialects import postgresql
 from sqlalchemy.exc import SQLAlchemyError
 
+from database import notifier
 from database.db import DatabaseManager
+from database.models import AppSetting, EvaluationPrompt, Prompt, SummaryUsage
 from utils.exceptions import DatabaseError
 
 
@@ -16,11 +20,13 @@ class TestDatabaseManager:
         DatabaseManager._instance = None
         DatabaseManager._engine = None
         DatabaseManager._session_factory = None
+        DatabaseManager._pid = None
         yield
         # テスト後もクリーンアップ
         DatabaseManager._instance = None
         DatabaseManager._engine = None
         DatabaseManager._session_factory = None
+        DatabaseManager._pid = None
 
     @pytest.fixture
     def mock_config(self):
@@ -104,6 +110,117 @@ class TestDatabaseManager:
             args, _ = mock_sqlalchemy['engine'].call_args
             assert args[0] == expected_url
 
+    def test_init_uses_pool_settings(self, mock_config, mock_sqlalchemy):
+        """接続プールの設定値が環境設定から渡されるテスト"""
+        with patch.multiple('database.db', DB_POOL_SIZE=20, DB_MAX_OVERFLOW=5,
+                            DB_POOL_TIMEOUT=10, DB_POOL_RECYCLE=600):
+            DatabaseManager.get_instance()
+
+        _, kwargs = mock_sqlalchemy['engine'].call_args
+        assert kwargs['pool_size'] == 20
+        assert kwargs['max_overflow'] == 5
+        assert kwargs['pool_timeout'] == 10
+        assert kwargs['pool_recycle'] == 600
+
+    def test_init_does_not_wait_for_connection(self, mock_config, mock_sqlalchemy):
+        """接続確認を待たずに初期化が完了し、確認後にreadyになるテスト"""
+        release = threading.Event()
+        connect = mock_sqlalchemy['engine_instance'].connect
+        default_connection = connect.return_value
+
+        def blocking_connect():
+            release.wait(5)
+            return default_connection
+
+        connect.side_effect = blocking_connect
+
+        DatabaseManager.get_instance()
+        assert DatabaseManager.is_ready() is False
+
+        release.set()
+        assert DatabaseManager.wait_until_ready(5) is True
+        mock_sqlalchemy['connection'].execute.assert_called()
+
+    def test_probe_retries_until_connected(self, mock_config, mock_sqlalchemy):
+        """接続に失敗した場合は再試行し、エラー内容を保持するテスト"""
+        connect = mock_sqlalchemy['engine_instance'].connect
+        connect.side_effect = [SQLAlchemyError("Connection refused"), connect.return_value] + \
+            [connect.return_value] * 10
+        sleeps = []
+
+        with patch('database.db.time.sleep', side_effect=sleeps.append), \
+                patch('database.db.DB_POOL_SIZE', 3):
+            DatabaseManager.get_instance()
+            assert DatabaseManager.wait_until_ready(5) is True
+
+            # 失敗1回 + 接続確認の1回 + ウォームアップのpool_size回
+            for _ in range(100):
+                if connect.call_count >= 5:
+                    break
+                threading.Event().wait(0.01)
+
+        assert sleeps == [1.0]
+        assert DatabaseManager.readiness_error() is None
+        assert connect.call_count == 5
+
+    def test_get_instance_is_thread_safe(self, mock_config, mock_sqlalchemy):
+        """多数のスレッドから同時に呼び出してもエンジンが1つだけ作成されるテスト"""
+        barrier = threading.Barrier(32)
+        instances = []
+
+        def create_slowly(*args, **kwargs):
+            threading.Event().wait(0.05)
+            return mock_sqlalchemy['engine_instance']
+
+        mock_sqlalchemy['engine'].side_effect = create_slowly
+
+        def worker():
+            barrier.wait()
+            instances.append(DatabaseManager.get_instance())
+
+        threads = [threading.Thread(target=worker) for _ in range(32)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        mock_sqlalchemy['engine'].assert_called_once()
+        assert len(instances) == 32
+        assert all(instance is instances[0] for instance in instances)
+
+    def test_pool_recreated_after_fork(self, mock_config, mock_sqlalchemy):
+        """プロセスIDが変わった場合に親の接続を閉じずにプールを作り直すテスト"""
+        DatabaseManager.get_instance()
+        engine = mock_sqlalchemy['engine_instance']
+        engine.dispose.assert_not_called()
+
+        DatabaseManager._pid = -1
+        assert DatabaseManager.get_engine() is engine
+
+        engine.dispose.assert_called_once_with(close=False)
+        assert DatabaseManager._pid == os.getpid()
+
+        DatabaseManager.get_engine()
+        engine.dispose.assert_called_once()
+
+    @pytest.mark.skipif(not hasattr(os, "fork"), reason="forkが使えない環境")
+    def test_notifier_reset_after_fork(self):
+        """fork後の子プロセスでは親のキャッシュ無効化の受信を引き継がず作り直すテスト"""
+        parent_notifier = Mock()
+        notifier.set_notifier(parent_notifier)
+
+        # 親の別スレッドがロックを保持した状態でforkされても子プロセスで取得できること
+        with notifier._notifier_lock:
+            pid = os.fork()
+            if pid == 0:
+                ok = notifier._notifier is None and notifier._notifier_lock.acquire(timeout=1)
+                os._exit(0 if ok else 1)
+
+        _, status = os.waitpid(pid, 0)
+        assert os.WEXITSTATUS(status) == 0
+        assert notifier._notifier is parent_notifier
+        parent_notifier.close.assert_not_called()
+
     def test_init_missing_config_raises_error(self):
         """設定値が不足している場合のエラーテスト"""
         with patch.dict(os.environ, {}, clear=True), \
@@ -131,6 +248,11 @@ class TestDatabaseManager:
         with pytest.raises(DatabaseError, match="データベース接続が初期化されていません"):
             DatabaseManager.get_session()
 
+    def test_get_engine_before_init_raises_error(self):
+        """初期化前のget_engine呼び出しエラーテスト"""
+        with pytest.raises(DatabaseError, match="データベース接続が初期化されていません"):
+            DatabaseManager.get_engine()
+
     def test_get_session(self, mock_config, mock_sqlalchemy):
         """get_sessionメソッドのテスト"""
         DatabaseManager.get_instance()
@@ -140,6 +262,318 @@ class TestDatabaseManager:
         assert session == mock_sqlalchemy['session_factory'].return_value
 
 
+class TestDatabaseManagerQueries:
+    """SQLiteのインメモリDBを使ったDatabaseManagerのクエリテスト"""
+
+    @staticmethod
+    def _insert_prompt(db_manager, department, document_type, doctor, is_default=False):
+        return db_manager.insert(Prompt, {
+            "department": department,
+            "document_type": document_type,
+            "doctor": doctor,
+            "content": f"{department}/{document_type}/{doctor}",
+            "is_default": is_default
+        })
+
+    def test_query_first_match_prefers_first_candidate(self, db_manager):
+        """先頭の条件に一致するレコードが優先されるテスト"""
+        self._insert_prompt(db_manager, "default", "退院時サマリ", "default", is_default=True)
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "田中医師")
+
+        result = db_manager.query_first_match(Prompt, [
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": "田中医師"},
+            {"department": "default", "document_type": "退院時サマリ", "doctor": "default", "is_default": True}
+        ])
+
+        assert result["content"] == "内科/退院時サマリ/田中医師"
+
+    def test_query_first_match_falls_back(self, db_manager):
+        """先頭の条件に一致しない場合に次の条件で取得されるテスト"""
+        self._insert_prompt(db_manager, "default", "退院時サマリ", "default", is_default=True)
+        self._insert_prompt(db_manager, "外科", "退院時サマリ", "default")
+
+        result = db_manager.query_first_match(Prompt, [
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": "田中医師"},
+            {"department": "default", "document_type": "退院時サマリ", "doctor": "default", "is_default": True}
+        ])
+
+        assert result["content"] == "default/退院時サマリ/default"
+
+    def test_query_with_columns_returns_only_requested(self, db_manager):
+        """列を指定した場合は指定した列のみ取得されるテスト"""
+        inserted = self._insert_prompt(db_manager, "内科", "退院時サマリ", "田中医師")
+
+        one = db_manager.query_one(Prompt, {"doctor": "田中医師"}, columns=["content", "selected_model"])
+        rows = db_manager.query_all(Prompt, columns=["id"])
+        by_id = db_manager.get_by_id(Prompt, inserted["id"], columns=["department"])
+        first = db_manager.query_first_match(Prompt, [{"doctor": "田中医師"}], columns=["doctor"])
+
+        assert one == {"content": "内科/退院時サマリ/田中医師", "selected_model": None}
+        assert rows == [{"id": inserted["id"]}]
+        assert by_id == {"department": "内科"}
+        assert first == {"doctor": "田中医師"}
+
+    def test_query_without_columns_returns_all_columns(self, db_manager):
+        """列を指定しない場合は全列が取得されるテスト"""
+        inserted = self._insert_prompt(db_manager, "内科", "退院時サマリ", "田中医師")
+
+        result = db_manager.get_by_id(Prompt, inserted["id"])
+
+        assert set(result) == {column.name for column in Prompt.__table__.columns}
+        assert db_manager.get_by_id(Prompt, inserted["id"] + 1) is None
+
+    def test_query_does_not_load_orm_instances(self, db_manager):
+        """読み取りでORMインスタンスがセッションに読み込まれないテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "田中医師")
+
+        with db_manager.unit_of_work() as uow:
+            uow.query_all(Prompt)
+            uow.query_one(Prompt, {"doctor": "田中医師"})
+            assert len(uow.session.identity_map) == 0
+
+    def test_query_with_unknown_column_raises_error(self, db_manager):
+        """存在しない列を指定した場合のエラーテスト"""
+        with pytest.raises(DatabaseError, match="クエリ実行中にエラーが発生しました"):
+            db_manager.query_one(Prompt, {"doctor": "田中医師"}, columns=["unknown"])
+
+    def test_update_where_updates_all_matches(self, db_manager):
+        """条件に一致する全レコードが更新され、件数が返されるテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "医師A")
+        self._insert_prompt(db_manager, "内科", "他院への紹介", "医師A")
+        self._insert_prompt(db_manager, "外科", "退院時サマリ", "医師B")
+
+        updated = db_manager.update_where(Prompt, {"department": "内科"}, {"selected_model": "Claude"})
+
+        assert updated == 2
+        models = {row["doctor"]: row["selected_model"] for row in db_manager.query_all(Prompt)}
+        assert models == {"医師A": "Claude", "医師B": None}
+        assert db_manager.update_where(Prompt, {"department": "眼科"}, {"selected_model": "Claude"}) == 0
+
+    def test_delete_where_returns_count(self, db_manager):
+        """条件に一致する全レコードが削除され、件数が返されるテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "医師A")
+        self._insert_prompt(db_manager, "内科", "他院への紹介", "医師A")
+        self._insert_prompt(db_manager, "外科", "退院時サマリ", "医師B")
+
+        assert db_manager.delete_where(Prompt, {"doctor": "医師A"}) == 2
+        assert db_manager.delete_where(Prompt, {"doctor": "医師A"}) == 0
+        assert db_manager.count(Prompt) == 1
+
+    def test_update_and_delete_where_require_filters(self, db_manager):
+        """条件なしの一括更新・削除がエラーになるテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "医師A")
+
+        with pytest.raises(DatabaseError, match="条件を指定せずに"):
+            db_manager.update_where(Prompt, {}, {"content": "全件更新"})
+        with pytest.raises(DatabaseError, match="条件を指定せずに"):
+            db_manager.delete_where(Prompt, {"unknown": "値"})
+
+        assert db_manager.count(Prompt) == 1
+
+    def test_update_where_in_unit_of_work(self, db_manager):
+        """unit_of_work内の一括更新がコミット時に反映されるテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "医師A")
+
+        with db_manager.unit_of_work() as uow:
+            assert uow.update_where(Prompt, {"doctor": "医師A"}, {"content": "更新後"}) == 1
+            assert uow.query_one(Prompt, {"doctor": "医師A"}, columns=["content"]) == {"content": "更新後"}
+
+        assert db_manager.query_one(Prompt, {"doctor": "医師A"})["content"] == "更新後"
+
+    def test_query_first_match_not_found(self, db_manager):
+        """どの条件にも一致しない場合のテスト"""
+        result = db_manager.query_first_match(Prompt, [
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": "田中医師"}
+        ])
+
+        assert result is None
+
+
+    def test_duplicate_prompt_is_rejected(self, db_manager):
+        """同じ診療科・文書タイプ・医師のプロンプトを重複登録できないテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "田中医師")
+
+        with pytest.raises(DatabaseError):
+            self._insert_prompt(db_manager, "内科", "退院時サマリ", "田中医師")
+
+    def test_upsert_inserts_then_updates(self, db_manager):
+        """upsertで新規作成後に同じキーで更新されるテスト"""
+        filters = {"setting_id": "user_preferences_default", "app_type": "default"}
+
+        created = db_manager.upsert(AppSetting, filters, {"selected_model": "Claude"})
+        updated = db_manager.upsert(AppSetting, filters, {"selected_model": "Gemini_Pro"})
+
+        assert created["id"] == updated["id"]
+        assert updated["selected_model"] == "Gemini_Pro"
+        assert db_manager.count(AppSetting) == 1
+
+
+    def test_insert_many(self, db_manager):
+        """複数レコードの一括挿入テスト"""
+        rows = [
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": doctor, "content": "内容"}
+            for doctor in ["医師A", "医師B", "医師C"]
+        ]
+
+        assert db_manager.insert_many(Prompt, rows) == []
+        assert db_manager.count(Prompt) == 3
+
+    def test_insert_many_returning(self, db_manager):
+        """RETURNINGで挿入されたレコードを取得するテスト"""
+        rows = [
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": doctor, "content": "内容"}
+            for doctor in ["医師A", "医師B"]
+        ]
+
+        records = db_manager.insert_many(Prompt, rows, returning=True)
+
+        assert sorted(record["doctor"] for record in records) == ["医師A", "医師B"]
+        assert all(record["id"] is not None for record in records)
+
+    def test_insert_many_empty(self, db_manager):
+        """空リストの場合は何もしないテスト"""
+        assert db_manager.insert_many(Prompt, []) == []
+
+    def test_insert_many_rolls_back_on_error(self, db_manager):
+        """一部の行でエラーが発生した場合に全体がロールバックされるテスト"""
+        rows = [
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": "医師A", "content": "内容"},
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": "医師A", "content": "重複"},
+        ]
+
+        with pytest.raises(DatabaseError):
+            db_manager.insert_many(Prompt, rows)
+
+        assert db_manager.count(Prompt) == 0
+
+    def test_insert_missing(self, db_manager):
+        """未登録のキーの行だけが挿入されるテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "医師A")
+        rows = [
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": doctor, "content": "新規"}
+            for doctor in ["医師A", "医師B", "医師B", "医師C"]
+        ]
+
+        inserted = db_manager.insert_missing(Prompt, rows, ["department", "document_type", "doctor"])
+
+        assert inserted == 2
+        assert db_manager.count(Prompt) == 3
+        assert db_manager.query_one(Prompt, {"doctor": "医師A"})["content"] == "内科/退院時サマリ/医師A"
+
+    def test_insert_missing_all_existing(self, db_manager):
+        """全キーが登録済みの場合は挿入しないテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "医師A")
+        rows = [{"department": "内科", "document_type": "退院時サマリ", "doctor": "医師A", "content": "新規"}]
+
+        assert db_manager.insert_missing(Prompt, rows, ["department", "document_type", "doctor"]) == 0
+        assert db_manager.count(Prompt) == 1
+
+    def test_upsert_many(self, db_manager):
+        """複数レコードの一括upsertテスト"""
+        self._insert_prompt(db_manager, "内科", "退院時サマリ", "医師A")
+        conflict_columns = ["department", "document_type", "doctor"]
+        rows = [
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": "医師A", "content": "更新後"},
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": "医師B", "content": "新規"},
+            {"department": "内科", "document_type": "退院時サマリ", "doctor": "医師B", "content": "新規(後勝ち)"},
+        ]
+
+        records = db_manager.upsert_many(Prompt, rows, conflict_columns, returning=True)
+
+        assert len(records) == 2
+        assert db_manager.count(Prompt) == 2
+        assert db_manager.query_one(Prompt, {"doctor": "医師A"})["content"] == "更新後"
+        assert db_manager.query_one(Prompt, {"doctor": "医師B"})["content"] == "新規(後勝ち)"
+
+    def test_unit_of_work_commits_on_exit(self, db_manager):
+        """unit_of_work内の読み書きが1トランザクションでコミットされるテスト"""
+        with db_manager.unit_of_work() as uow:
+            inserted = uow.insert(Prompt, {
+                "department": "内科", "document_type": "退院時サマリ", "doctor": "医師A", "content": "新規"
+            })
+            assert uow.query_one(Prompt, {"doctor": "医師A"})["id"] == inserted["id"]
+            uow.update(Prompt, {"doctor": "医師A"}, {"content": "更新後"})
+
+        assert db_manager.query_one(Prompt, {"doctor": "医師A"})["content"] == "更新後"
+
+    def test_unit_of_work_rolls_back_on_error(self, db_manager):
+        """unit_of_work内で例外が発生した場合に全体がロールバックされるテスト"""
+        with pytest.raises(ValueError):
+            with db_manager.unit_of_work() as uow:
+                uow.insert(Prompt, {
+                    "department": "内科", "document_type": "退院時サマリ", "doctor": "医師A", "content": "新規"
+                })
+                raise ValueError("途中で失敗")
+
+        assert db_manager.count(Prompt) == 0
+
+    def test_unit_of_work_database_error(self, db_manager):
+        """unit_of_work内の操作の失敗がDatabaseErrorになりロールバックされるテスト"""
+        with pytest.raises(DatabaseError) as exc_info:
+            with db_manager.unit_of_work() as uow:
+                self._insert_prompt(uow, "内科", "退院時サマリ", "医師A")
+                self._insert_prompt(uow, "内科", "退院時サマリ", "医師A")
+
+        assert "レコード挿入中にエラーが発生しました" in str(exc_info.value)
+        assert db_manager.count(Prompt) == 0
+
+
+class TestDatabaseManagerUpsertStatement:
+    """ON CONFLICTを使ったupsertのテスト"""
+
+    def test_find_conflict_columns_unique_constraint(self):
+        """一意制約と一致する列が見つかるテスト"""
+        columns = DatabaseManager._find_conflict_columns(AppSetting, ["app_type", "setting_id"])
+
+        assert set(columns) == {"setting_id", "app_type"}
+
+    def test_find_conflict_columns_unique_index(self):
+        """一意インデックスと一致する列が見つかるテスト"""
+        columns = DatabaseManager._find_conflict_columns(Prompt, ["department", "document_type", "doctor"])
+
+        assert columns == ["department", "document_type", "doctor"]
+
+    def test_find_conflict_columns_no_constraint(self):
+        """一意制約と一致しない場合のテスト"""
+        assert DatabaseManager._find_conflict_columns(AppSetting, ["setting_id"]) is None
+        assert DatabaseManager._find_conflict_columns(SummaryUsage, ["department"]) is None
+
+    def test_build_upsert_statement(self):
+        """INSERT ... ON CONFLICT DO UPDATE ... RETURNING文の構築テスト"""
+        statement = DatabaseManager._build_upsert_statement(
+            postgresql.insert,
+            AppSetting,
+            ["setting_id", "app_type"],
+            [{"setting_id": "user_preferences_default", "app_type": "default", "selected_model": "Claude"}]
+        )
+
+        sql = str(statement.compile(dialect=postgresql.dialect()))
+
+        assert "ON CONFLICT (setting_id, app_type) DO UPDATE" in sql
+        assert "selected_model = excluded.selected_model" in sql
+        assert "updated_at = now()" in sql
+        assert "RETURNING" in sql
+
+    def test_upsert_uses_on_conflict_for_postgresql(self):
+        """PostgreSQL接続時に1回のSQLでupsertされるテスト"""
+        mock_session = Mock()
+        mock_session.get_bind.return_value.dialect.name = "postgresql"
+        mock_session.execute.return_value.mappings.return_value.one.return_value = {
+            "id": 1, "document_type": "退院時サマリ", "content": "評価プロンプト"
+        }
+
+        with patch.object(DatabaseManager, 'get_session', return_value=mock_session):
+            result = DatabaseManager.__new__(DatabaseManager).upsert(
+                EvaluationPrompt, {"document_type": "退院時サマリ"}, {"content": "評価プロンプト"}
+            )
+
+        assert result["id"] == 1
+        mock_session.execute.assert_called_once()
+        mock_session.query.assert_not_called()
+        mock_session.commit.assert_called_once()
+        mock_session.refresh.assert_not_called()
+
+
 # テスト実行用のconftest.pyファイルに追加する設定例
 """
 # conftest.py
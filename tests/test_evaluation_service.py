@@ -8,6 +8,7 @@ import pytest
 from database.models import EvaluationPrompt
 from services.evaluation_service import (
     build_evaluation_prompt,
+    clear_evaluation_prompt_cache,
     create_or_update_evaluation_prompt,
     display_evaluation_progress,
     evaluate_output_task,
@@ -17,6 +18,23 @@ from services.evaluation_service import (
 from utils.exceptions import APIError, DatabaseError
 
 
+def _mock_db_instance():
+    """unit_of_work()のブロック内でも同じモックを返すデータベースマネージャー"""
+    mock_db_instance = Mock()
+    mock_db_instance.unit_of_work.return_value = MagicMock()
+    mock_db_instance.unit_of_work.return_value.__enter__.return_value = mock_db_instance
+    mock_db_instance.unit_of_work.return_value.__exit__.return_value = False
+    return mock_db_instance
+
+
+@pytest.fixture(autouse=True)
+def reset_evaluation_prompt_cache():
+    """各テスト前後で評価プロンプトキャッシュをクリア"""
+    clear_evaluation_prompt_cache()
+    yield
+    clear_evaluation_prompt_cache()
+
+
 class TestGetEvaluationPrompt:
     """評価プロンプト取得のテストクラス"""
 
@@ -38,7 +56,8 @@ class TestGetEvaluationPrompt:
         assert result['content'] == 'テスト評価プロンプト'
         mock_db_instance.query_one.assert_called_once_with(
             EvaluationPrompt,
-            {'document_type': '診療録'}
+            {'document_type': '診療録'},
+            columns=['document_type', 'content']
         )
 
     @patch('services.evaluation_service.DatabaseManager')
@@ -52,6 +71,34 @@ class TestGetEvaluationPrompt:
 
         assert result is None
 
+    @patch('services.evaluation_service.DatabaseManager')
+    def test_get_evaluation_prompt_uses_cache(self, mock_db_manager):
+        """2回目以降の取得でキャッシュが使われるテスト"""
+        mock_db_instance = Mock()
+        mock_db_manager.get_instance.return_value = mock_db_instance
+        mock_db_instance.query_one.return_value = {'document_type': '診療録', 'content': 'テスト評価プロンプト'}
+
+        get_evaluation_prompt('診療録')
+        result = get_evaluation_prompt('診療録')
+
+        assert result['content'] == 'テスト評価プロンプト'
+        mock_db_instance.query_one.assert_called_once()
+
+    @patch('services.evaluation_service.DatabaseManager')
+    def test_get_evaluation_prompt_cache_invalidated_on_update(self, mock_db_manager):
+        """評価プロンプト更新時にキャッシュが無効化されるテスト"""
+        mock_db_instance = _mock_db_instance()
+        mock_db_manager.get_instance.return_value = mock_db_instance
+        mock_db_instance.query_one.return_value = {'document_type': '診療録', 'content': '古いプロンプト'}
+
+        get_evaluation_prompt('診療録')
+        create_or_update_evaluation_prompt('診療録', '新しいプロンプト')
+
+        mock_db_instance.query_one.return_value = {'document_type': '診療録', 'content': '新しいプロンプト'}
+        result = get_evaluation_prompt('診療録')
+
+        assert result['content'] == '新しいプロンプト'
+
     @patch('services.evaluation_service.DatabaseManager')
     def test_get_evaluation_prompt_database_error(self, mock_db_manager):
         """データベースエラーのテスト"""
@@ -71,7 +118,7 @@ class TestCreateOrUpdateEvaluationPrompt:
     @patch('services.evaluation_service.DatabaseManager')
     def test_create_evaluation_prompt_success(self, mock_db_manager):
         """評価プロンプト新規作成成功のテスト"""
-        mock_db_instance = Mock()
+        mock_db_instance = _mock_db_instance()
         mock_db_manager.get_instance.return_value = mock_db_instance
         mock_db_instance.query_one.return_value = None
         mock_db_instance.upsert.return_value = {'id': 1}
@@ -88,7 +135,7 @@ class TestCreateOrUpdateEvaluationPrompt:
     @patch('services.evaluation_service.DatabaseManager')
     def test_update_evaluation_prompt_success(self, mock_db_manager):
         """評価プロンプト更新成功のテスト"""
-        mock_db_instance = Mock()
+        mock_db_instance = _mock_db_instance()
         mock_db_manager.get_instance.return_value = mock_db_instance
         mock_db_instance.query_one.return_value = {
             'document_type': '診療録',
@@ -115,7 +162,7 @@ class TestCreateOrUpdateEvaluationPrompt:
     @patch('services.evaluation_service.DatabaseManager')
     def test_create_or_update_evaluation_prompt_database_error(self, mock_db_manager):
         """データベースエラーのテスト"""
-        mock_db_instance = Mock()
+        mock_db_instance = _mock_db_instance()
         mock_db_manager.get_instance.return_value = mock_db_instance
         mock_db_instance.query_one.side_effect = Exception("DB接続エラー")
 
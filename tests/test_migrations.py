@@ -0,0 +1,87 @@
+from unittest.mock import Mock, patch
+
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.schema import CreateIndex
+
+from database.migrations import MIGRATIONS, SCHEMA_VERSION, run_migrations
+from database.models import Prompt, SummaryUsage
+
+
+class TestRunMigrations:
+    """run_migrations関数のテスト"""
+
+    def test_run_migrations_executes_all_steps(self):
+        """未適用の全手順を実行し、最新のバージョンを返すテスト"""
+        connection = Mock()
+        step = Mock()
+        migrations = [(1, "SQL", ["SELECT 1", "SELECT 2"]), (2, "関数", [step])]
+
+        with patch("database.migrations.MIGRATIONS", migrations):
+            version = run_migrations(connection)
+
+        assert version == 2
+        assert connection.execute.call_count == 2
+        step.assert_called_once_with(connection)
+
+    def test_run_migrations_skips_applied_versions(self):
+        """適用済みのバージョンの手順を実行しないテスト"""
+        connection = Mock()
+        step = Mock()
+        migrations = [(1, "SQL", ["SELECT 1"]), (2, "関数", [step])]
+
+        with patch("database.migrations.MIGRATIONS", migrations):
+            version = run_migrations(connection, current_version=1)
+
+        assert version == 2
+        connection.execute.assert_not_called()
+        step.assert_called_once_with(connection)
+
+    def test_run_migrations_up_to_date(self):
+        """最新の場合は何も実行しないテスト"""
+        connection = Mock()
+
+        version = run_migrations(connection, current_version=SCHEMA_VERSION)
+
+        assert version == SCHEMA_VERSION
+        connection.execute.assert_not_called()
+
+    def test_migration_versions_are_ordered(self):
+        """バージョン番号が昇順で重複しないテスト"""
+        versions = [version for version, _, _ in MIGRATIONS]
+        assert versions == sorted(set(versions))
+
+
+class TestPromptIndexes:
+    """promptsテーブルのインデックス定義のテスト"""
+
+    def test_prompt_unique_index_matches_migration(self):
+        """モデルの一意インデックスがマイグレーションと同じ定義であるテスト"""
+        indexes = {index.name: index for index in Prompt.__table__.indexes}
+
+        unique_index = indexes["ix_prompts_department_document_type_doctor"]
+        assert unique_index.unique
+        assert [column.name for column in unique_index.columns] == ["department", "document_type", "doctor"]
+
+        default_index_sql = str(CreateIndex(indexes["ix_prompts_default"]).compile(dialect=postgresql.dialect()))
+        assert "WHERE is_default" in default_index_sql
+
+
+class TestSummaryUsageIndexes:
+    """summary_usageテーブルのインデックス定義のテスト"""
+
+    def test_summary_usage_indexes_match_migration(self):
+        """モデルの集計用インデックスがマイグレーションで作成されるテスト"""
+        migration_sql = " ".join(step for _, _, steps in MIGRATIONS for step in steps if isinstance(step, str))
+
+        for index in SummaryUsage.__table__.indexes:
+            columns = ", ".join(column.name for column in index.columns)
+            assert f"CREATE INDEX IF NOT EXISTS {index.name}" in migration_sql
+            assert f"ON summary_usage ({columns})" in migration_sql
+
+    def test_provider_backfill_is_idempotent(self):
+        """providerの補完が未設定の行だけを対象にするテスト"""
+        backfill = next(
+            step for _, _, steps in MIGRATIONS for step in steps
+            if isinstance(step, str) and "SET provider" in step
+        )
+        assert "WHERE provider IS NULL" in backfill
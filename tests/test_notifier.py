@@ -0,0 +1,108 @@
+import json
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+
+from database import notifier
+from database.notifier import (
+    InMemoryNotifier,
+    PostgresNotifier,
+    get_notifier,
+    publish_invalidation,
+    register_invalidation_handler,
+    set_notifier,
+)
+
+
+@pytest.fixture
+def handler():
+    """テスト用の無効化ハンドラーを登録"""
+    mock_handler = Mock()
+    register_invalidation_handler(mock_handler)
+    yield mock_handler
+    notifier._handlers.remove(mock_handler)
+
+
+class TestInMemoryNotifier:
+    """InMemoryNotifierのテスト"""
+
+    def test_publish_dispatches_to_handlers(self, handler):
+        """通知が登録済みハンドラーに配信されるテスト"""
+        publish_invalidation("Prompt", ("内科", "退院時サマリ", "default"))
+
+        handler.assert_called_once_with({"model": "Prompt", "key": ["内科", "退院時サマリ", "default"]})
+
+    def test_publish_without_key(self, handler):
+        """キーなしの通知テスト"""
+        publish_invalidation("Prompt")
+
+        handler.assert_called_once_with({"model": "Prompt", "key": None})
+
+    def test_handler_error_does_not_stop_dispatch(self, handler):
+        """ハンドラーの例外が他のハンドラーへの配信を止めないテスト"""
+        failing_handler = Mock(side_effect=Exception("処理エラー"))
+        notifier._handlers.insert(0, failing_handler)
+        try:
+            publish_invalidation("Prompt")
+        finally:
+            notifier._handlers.remove(failing_handler)
+
+        handler.assert_called_once()
+
+    def test_register_handler_is_idempotent(self, handler):
+        """同じハンドラーを二重登録しないテスト"""
+        register_invalidation_handler(handler)
+        publish_invalidation("Prompt")
+
+        handler.assert_called_once()
+
+
+class TestPublishInvalidation:
+    """publish_invalidation関数のテスト"""
+
+    def test_publish_failure_is_swallowed(self):
+        """通知失敗時に例外を送出しないテスト"""
+        failing_notifier = Mock()
+        failing_notifier.publish.side_effect = Exception("接続エラー")
+        set_notifier(failing_notifier)
+
+        publish_invalidation("Prompt", ("内科",))
+
+        failing_notifier.publish.assert_called_once()
+
+
+class TestGetNotifier:
+    """get_notifier関数のテスト"""
+
+    def test_memory_backend(self):
+        """memoryバックエンドの選択テスト"""
+        set_notifier(None)
+        with patch('database.notifier.CACHE_INVALIDATION_BACKEND', 'memory'):
+            assert isinstance(get_notifier(), InMemoryNotifier)
+
+    def test_postgres_backend(self):
+        """postgresバックエンドの選択テスト"""
+        set_notifier(None)
+        with patch('database.notifier.CACHE_INVALIDATION_BACKEND', 'postgres'), \
+                patch.object(PostgresNotifier, 'start'):
+            assert isinstance(get_notifier(), PostgresNotifier)
+
+
+class TestPostgresNotifier:
+    """PostgresNotifierのテスト"""
+
+    @patch('database.notifier.DatabaseManager')
+    def test_publish_uses_pg_notify(self, mock_db_manager):
+        """pg_notifyで通知するテスト"""
+        mock_connection = Mock()
+        mock_engine = Mock()
+        mock_engine.begin.return_value = MagicMock()
+        mock_engine.begin.return_value.__enter__.return_value = mock_connection
+        mock_db_manager.get_instance.return_value.get_engine.return_value = mock_engine
+
+        PostgresNotifier(channel="test_channel").publish({"model": "Prompt", "key": None})
+
+        statement, params = mock_connection.execute.call_args[0]
+        assert "pg_notify" in str(statement)
+        assert params["channel"] == "test_channel"
+        assert json.loads(params["payload"]) == {"model": "Prompt", "key": None}
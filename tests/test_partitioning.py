@@ -0,0 +1,263 @@
+import datetime
+import os
+import secrets
+import sqlite3
+
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy import create_engine, insert, text
+
+from database.models import Base, SummaryUsage
+from database.partitioning import (
+    DEFAULT_PARTITION,
+    JST,
+    add_months,
+    archive_partitions,
+    create_month_partition,
+    current_month,
+    is_partitioned,
+    list_month_partitions,
+    months_to_archive,
+    parse_partition_name,
+    partition_bounds,
+    partition_name,
+    partition_summary_usage,
+    partitions_ready,
+    write_partition_parquet,
+)
+from database.schema import _ensure_future_partitions
+from utils.config import SUMMARY_USAGE_PARTITION_MONTHS_AHEAD
+
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+
+# マイグレーション前のsummary_usage（主キーはidのみ、dateはNULL可）
+LEGACY_SUMMARY_USAGE_DDL = """
+CREATE TABLE summary_usage (
+    id SERIAL PRIMARY KEY,
+    date TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    app_type VARCHAR(50),
+    document_types VARCHAR(100),
+    model_detail VARCHAR(100),
+    provider VARCHAR(20),
+    department VARCHAR(100),
+    doctor VARCHAR(100),
+    input_tokens INTEGER,
+    output_tokens INTEGER,
+    total_tokens INTEGER,
+    processing_time INTEGER
+)
+"""
+# JSTの月末・月初をまたぐ日時（UTCでは同じ1月31日）とdateが未設定の行
+LEGACY_DATES = [
+    JST.localize(datetime.datetime(2024, 1, 10, 9, 0)),
+    JST.localize(datetime.datetime(2024, 1, 31, 23, 30)),
+    JST.localize(datetime.datetime(2024, 2, 1, 0, 30)),
+    None,
+]
+
+
+class TestPartitionMonths:
+    """月単位のパーティションの名前と範囲のテスト"""
+
+    def test_add_months_crosses_year(self):
+        """年をまたぐ月の加減算のテスト"""
+        assert add_months(datetime.date(2024, 11, 1), 3) == datetime.date(2025, 2, 1)
+        assert add_months(datetime.date(2024, 1, 1), -1) == datetime.date(2023, 12, 1)
+
+    def test_partition_name_round_trip(self):
+        """パーティション名と月の相互変換のテスト"""
+        month = datetime.date(2024, 3, 1)
+
+        assert partition_name(month) == "summary_usage_p202403"
+        assert parse_partition_name("summary_usage_p202403") == month
+        assert parse_partition_name("summary_usage_default") is None
+
+    def test_partition_bounds_use_jst_month(self):
+        """パーティションの範囲がJSTの月初で区切られるテスト"""
+        start, end = partition_bounds(datetime.date(2024, 12, 1))
+
+        assert start == JST.localize(datetime.datetime(2024, 12, 1))
+        assert end == JST.localize(datetime.datetime(2025, 1, 1))
+        assert start.utcoffset() == datetime.timedelta(hours=9)
+
+    def test_months_to_archive_keeps_retention_period(self):
+        """当月を含めて保持期間内の月はアーカイブしないテスト"""
+        months = [datetime.date(2023, month, 1) for month in range(1, 13)] + [datetime.date(2024, 1, 1)]
+
+        result = months_to_archive(reversed(months), retention_months=12, today_month=datetime.date(2024, 1, 1))
+
+        assert result == [datetime.date(2023, 1, 1)]
+
+    def test_months_to_archive_rejects_invalid_retention(self):
+        """保持期間が1か月未満の場合に例外が発生するテスト"""
+        with pytest.raises(ValueError):
+            months_to_archive([datetime.date(2024, 1, 1)], retention_months=0)
+
+
+class TestWritePartitionParquet:
+    """パーティションのParquet書き出しのテスト"""
+
+    @pytest.fixture
+    def engine(self):
+        engine = create_engine("sqlite://", connect_args={"detect_types": sqlite3.PARSE_DECLTYPES})
+        with engine.begin() as conn:
+            conn.execute(text(
+                "CREATE TABLE summary_usage_p202401 (id INTEGER, date TIMESTAMP, app_type TEXT, "
+                "document_types TEXT, model_detail TEXT, provider TEXT, department TEXT, doctor TEXT, "
+                "input_tokens INTEGER, output_tokens INTEGER, total_tokens INTEGER, processing_time INTEGER)"
+            ))
+            conn.execute(
+                text("INSERT INTO summary_usage_p202401 (id, date, provider, input_tokens, total_tokens) "
+                     "VALUES (:id, :date, 'claude', :tokens, :tokens)"),
+                [{"id": i, "date": datetime.datetime(2024, 1, 1 + i), "tokens": i * 10} for i in range(5)]
+            )
+        yield engine
+        engine.dispose()
+
+    def test_writes_all_rows_in_batches(self, engine, tmp_path):
+        """バッチに分けて読み込んだ全行が書き出されるテスト"""
+        path = tmp_path / "summary_usage_p202401.parquet"
+
+        with engine.connect() as conn:
+            rows = write_partition_parquet(conn, "summary_usage_p202401", path, batch_size=2)
+
+        table = pq.read_table(path)
+        assert rows == 5
+        assert table.num_rows == 5
+        assert table.column("id").to_pylist() == [0, 1, 2, 3, 4]
+        assert table.column("total_tokens").to_pylist() == [0, 10, 20, 30, 40]
+        assert pq.ParquetFile(path).metadata.row_group(0).column(0).compression == "ZSTD"
+        assert not (tmp_path / "summary_usage_p202401.parquet.tmp").exists()
+
+
+@pytest.mark.skipif(not TEST_DATABASE_URL, reason="TEST_DATABASE_URLが未設定のためPostgreSQLのテストを省略")
+class TestPartitionSummaryUsagePostgres:
+    """PostgreSQLでのsummary_usageのパーティション化とアーカイブのテスト（TEST_DATABASE_URLを設定した場合のみ実行）"""
+
+    @pytest.fixture
+    def engine(self):
+        """テストごとに作成したスキーマをsearch_pathに設定したエンジン"""
+        assert TEST_DATABASE_URL is not None
+        schema = f"test_partitioning_{secrets.token_hex(4)}"
+        admin_engine = create_engine(TEST_DATABASE_URL)
+        with admin_engine.begin() as conn:
+            conn.execute(text(f"CREATE SCHEMA {schema}"))
+
+        engine = create_engine(TEST_DATABASE_URL, connect_args={"options": f"-csearch_path={schema}"})
+        yield engine
+
+        engine.dispose()
+        with admin_engine.begin() as conn:
+            conn.execute(text(f"DROP SCHEMA {schema} CASCADE"))
+        admin_engine.dispose()
+
+    @pytest.fixture
+    def partitioned_engine(self, engine):
+        """マイグレーション前のsummary_usageに利用記録を入れてからパーティション化したエンジン"""
+        with engine.begin() as conn:
+            conn.execute(text(LEGACY_SUMMARY_USAGE_DDL))
+            conn.execute(
+                text("INSERT INTO summary_usage (date, provider, input_tokens) VALUES (:date, 'claude', 100)"),
+                [{"date": date} for date in LEGACY_DATES]
+            )
+        with engine.begin() as conn:
+            partition_summary_usage(conn)
+        return engine
+
+    @staticmethod
+    def _rows_by_partition(conn):
+        rows = conn.execute(text("SELECT tableoid::regclass::text, count(*) FROM summary_usage GROUP BY 1")).all()
+        return dict(rows)
+
+    @staticmethod
+    def _exists(conn, name):
+        return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+    def test_table_is_renamed_and_partitioned(self, partitioned_engine):
+        """旧テーブルの行がJSTの月のパーティションに移され、旧テーブルが削除されるテスト"""
+        with partitioned_engine.connect() as conn:
+            assert is_partitioned(conn)
+            assert not self._exists(conn, "summary_usage_unpartitioned")
+            assert self._rows_by_partition(conn) == {
+                "summary_usage_p202401": 2,
+                "summary_usage_p202402": 1,
+                DEFAULT_PARTITION: 1,
+            }
+
+    def test_primary_key_includes_date(self, partitioned_engine):
+        """主キーが(id, date)になるテスト"""
+        with partitioned_engine.connect() as conn:
+            definition = conn.execute(text(
+                "SELECT pg_get_constraintdef(oid) FROM pg_constraint "
+                "WHERE conrelid = 'summary_usage'::regclass AND contype = 'p'"
+            )).scalar()
+
+        assert definition == "PRIMARY KEY (id, date)"
+
+    def test_sequence_is_owned_by_new_table(self, partitioned_engine):
+        """idのシーケンスが新しいテーブルに引き継がれ、採番が続くテスト"""
+        with partitioned_engine.begin() as conn:
+            sequence = conn.execute(text("SELECT pg_get_serial_sequence('summary_usage', 'id')")).scalar()
+            new_id = conn.execute(
+                insert(SummaryUsage.__table__).values(provider="gemini").returning(SummaryUsage.__table__.c.id)
+            ).scalar()
+
+        assert sequence is not None
+        assert new_id == len(LEGACY_DATES) + 1
+
+    def test_rows_move_out_of_default_partition(self, partitioned_engine):
+        """デフォルトパーティションの行が後から作成した月のパーティションへ移されるテスト"""
+        month = add_months(current_month(), SUMMARY_USAGE_PARTITION_MONTHS_AHEAD + 2)
+        start, _ = partition_bounds(month)
+
+        with partitioned_engine.begin() as conn:
+            conn.execute(insert(SummaryUsage.__table__).values(date=start, provider="claude"))
+            assert self._rows_by_partition(conn)[DEFAULT_PARTITION] == 2
+
+            assert create_month_partition(conn, month) is True
+            assert create_month_partition(conn, month) is False
+
+            rows = self._rows_by_partition(conn)
+            assert rows[DEFAULT_PARTITION] == 1
+            assert rows[partition_name(month)] == 1
+
+    def test_archive_detaches_writes_and_drops(self, partitioned_engine, tmp_path):
+        """保持期間を過ぎたパーティションが切り離され、Parquetに書き出されてから削除されるテスト"""
+        # 切り離した後に失敗した前回の実行の続きも処理されること
+        with partitioned_engine.begin() as conn:
+            conn.execute(text("ALTER TABLE summary_usage DETACH PARTITION summary_usage_p202402"))
+
+        archived = archive_partitions(partitioned_engine, retention_months=1, archive_dir=tmp_path)
+
+        rows = {item["partition"]: item["rows"] for item in archived}
+        assert rows["summary_usage_p202401"] == 2
+        assert rows["summary_usage_p202402"] == 1
+        assert pq.read_table(tmp_path / "summary_usage_p202401.parquet").num_rows == 2
+        with partitioned_engine.connect() as conn:
+            assert not self._exists(conn, "summary_usage_p202401")
+            assert not self._exists(conn, "summary_usage_p202402")
+            assert all(month >= current_month() for _, month, _ in list_month_partitions(conn))
+            assert self._rows_by_partition(conn) == {DEFAULT_PARTITION: 1}
+
+    def test_schema_from_create_all_can_be_partitioned(self, engine):
+        """create_allで作成したテーブル（主キー(id, date)）もパーティション化できるテスト"""
+        with engine.begin() as conn:
+            Base.metadata.create_all(conn)
+            partition_summary_usage(conn)
+            conn.execute(insert(SummaryUsage.__table__).values(date=LEGACY_DATES[0], provider="claude"))
+
+            assert is_partitioned(conn)
+            assert self._rows_by_partition(conn) == {"summary_usage_p202401": 1}
+
+    def test_startup_creates_missing_future_partitions(self, partitioned_engine):
+        """起動時に不足している今後の月のパーティションだけが作成されるテスト"""
+        last_partition = partition_name(add_months(current_month(), SUMMARY_USAGE_PARTITION_MONTHS_AHEAD))
+        with partitioned_engine.begin() as conn:
+            conn.execute(text(f"ALTER TABLE summary_usage DETACH PARTITION {last_partition}"))
+            conn.execute(text(f"DROP TABLE {last_partition}"))
+            assert not partitions_ready(conn)
+
+        assert _ensure_future_partitions(partitioned_engine) is True
+        assert _ensure_future_partitions(partitioned_engine) is False
+        with partitioned_engine.connect() as conn:
+            assert partitions_ready(conn)
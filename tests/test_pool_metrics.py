@@ -0,0 +1,89 @@
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, text
+from sqlalchemy.exc import TimeoutError as PoolTimeoutError
+
+from database.pool_metrics import InstrumentedQueuePool, PoolMetrics, get_pool_stats, pool_metrics
+
+
+class TestPoolMetrics:
+    """コネクションプールの計測のテスト"""
+
+    @pytest.fixture
+    def engine(self):
+        """サイズ1・オーバーフローなしのSQLiteエンジン"""
+        pool_metrics.reset()
+        engine = create_engine(
+            "sqlite://",
+            poolclass=InstrumentedQueuePool,
+            pool_size=1,
+            max_overflow=0,
+            pool_timeout=0.05
+        )
+        yield engine
+        engine.dispose()
+        pool_metrics.reset()
+
+    def test_checkout_and_checkin_are_counted(self, engine):
+        """チェックアウトと返却の件数・待ち時間が記録されるテスト"""
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+            stats = get_pool_stats(engine)
+            assert stats["checked_out"] == 1
+
+        stats = get_pool_stats(engine)
+        assert stats["checkouts"] == 1
+        assert stats["checkins"] == 1
+        assert stats["connects"] == 1
+        assert stats["checked_out"] == 0
+        assert stats["pool_size"] == 1
+        assert stats["wait_p50_ms"] is not None
+
+    def test_timeout_is_counted(self, engine):
+        """プールが枯渇した場合にタイムアウト件数が記録されるテスト"""
+        with engine.connect():
+            with pytest.raises(PoolTimeoutError):
+                engine.connect()
+
+        stats = get_pool_stats(engine)
+        assert stats["timeouts"] == 1
+        assert stats["wait_max_ms"] >= 50
+
+    def test_stats_without_engine(self):
+        """エンジン未初期化時は累計の計測値のみ返すテスト"""
+        stats = get_pool_stats(None)
+
+        assert "checked_out" not in stats
+        assert "timeouts" in stats
+
+    def test_percentiles(self):
+        """待ち時間のパーセンタイルが計算されるテスト"""
+        metrics = PoolMetrics()
+        for ms in range(1, 101):
+            metrics.record_wait(ms / 1000)
+
+        snapshot = metrics.snapshot()
+        assert snapshot["wait_p50_ms"] == pytest.approx(51)
+        assert snapshot["wait_p95_ms"] == pytest.approx(96)
+        assert snapshot["wait_p99_ms"] == pytest.approx(100)
+        assert snapshot["wait_max_ms"] == pytest.approx(100)
+
+
+class TestRenderPoolStats:
+    """デバッグパネルへのコネクションプールの表示のテスト"""
+
+    def test_pool_stats_are_rendered(self):
+        """使用状況と待ち時間が表示され、タイムアウト時は警告されるテスト"""
+        from ui_components.query_debug import render_pool_stats
+
+        stats = {**PoolMetrics().snapshot(), "timeouts": 2, "pool_size": 5, "checked_out": 5,
+                 "checked_in": 0, "overflow": 3, "timeout": 30.0, "max_overflow": 10}
+
+        with patch("ui_components.query_debug.st") as mock_st:
+            render_pool_stats(stats)
+
+        mock_st.write.assert_called_once_with("使用中 5 / プール 5（オーバーフロー 3 / 10）")
+        mock_st.warning.assert_called_once()
+        frame = mock_st.dataframe.call_args.args[0]
+        assert frame.iloc[0]["待ち p50"] == "-"
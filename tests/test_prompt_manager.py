@@ -3,19 +3,31 @@ from unittest.mock import Mock, patch
 
 import pytest
 
+from database.models import Prompt
 from utils.exceptions import DatabaseError
 from utils.prompt_manager import (
+    clear_prompt_cache,
     create_or_update_prompt,
     delete_prompt,
     get_all_departments,
     get_all_prompts,
     get_current_datetime,
     get_prompt,
+    get_prompt_cache_stats,
     initialize_database,
     initialize_default_prompt,
+    resolve_prompt,
 )
 
 
+@pytest.fixture(autouse=True)
+def reset_prompt_cache():
+    """各テスト前後でプロンプトキャッシュをクリア"""
+    clear_prompt_cache()
+    yield
+    clear_prompt_cache()
+
+
 class TestGetCurrentDatetime:
     """get_current_datetime関数のテスト"""
     
@@ -73,10 +85,12 @@ class TestCreateOrUpdatePrompt:
 
     def test_create_or_update_prompt_update_existing(self, mock_database_manager):
         """既存プロンプトの更新テスト"""
-        # 既存のプロンプトが存在する場合
-        existing_prompt = {"id": 1, "content": "既存プロンプト"}
-        mock_database_manager.query_one.return_value = existing_prompt
-        mock_database_manager.update.return_value = {"id": 1, "content": "新しいプロンプト"}
+        # 既存のプロンプトと競合した場合は更新日時のみ新しくなる
+        mock_database_manager.upsert.return_value = {
+            "id": 1,
+            "created_at": datetime.datetime(2024, 1, 1, 12),
+            "updated_at": datetime.datetime(2024, 2, 1, 12)
+        }
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             success, message = create_or_update_prompt(
@@ -85,27 +99,42 @@ class TestCreateOrUpdatePrompt:
 
             assert success is True
             assert message == "プロンプトを更新しました"
-            mock_database_manager.query_one.assert_called_once()
-            mock_database_manager.update.assert_called_once()
+            mock_database_manager.upsert.assert_called_once_with(
+                Prompt,
+                {"department": "内科", "document_type": "主治医意見書", "doctor": "田中医師"},
+                {"content": "新しいプロンプト", "selected_model": "gemini"}
+            )
+            mock_database_manager.update_where.assert_not_called()
+            mock_database_manager.insert.assert_not_called()
 
     def test_create_or_update_prompt_create_new(self, mock_database_manager):
         """新規プロンプトの作成テスト"""
-        # 既存のプロンプトが存在しない場合
-        mock_database_manager.query_one.return_value = None
-        mock_database_manager.insert.return_value = {"id": 1}
+        # 新規に挿入された行は作成日時と更新日時が同じ
+        now = datetime.datetime(2024, 1, 1, 12)
+        mock_database_manager.upsert.return_value = {"id": 1, "created_at": now, "updated_at": now}
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
-            with patch('utils.prompt_manager.get_current_datetime') as mock_datetime:
-                mock_now = datetime.datetime(2024, 1, 1, 12)
-                mock_datetime.return_value = mock_now
-
-                success, message = create_or_update_prompt(
-                    "内科", "主治医意見書", "田中医師", "新しいプロンプト", "gemini"
-                )
+            success, message = create_or_update_prompt(
+                "内科", "主治医意見書", "田中医師", "新しいプロンプト", "gemini"
+            )
 
-                assert success is True
-                assert message == "プロンプトを新規作成しました"
-                mock_database_manager.insert.assert_called_once()
+            assert success is True
+            assert message == "プロンプトを新規作成しました"
+            mock_database_manager.upsert.assert_called_once()
+            mock_database_manager.insert.assert_not_called()
+
+    def test_create_or_update_prompt_does_not_duplicate(self, db_manager):
+        """同じキーで保存を繰り返しても1件のプロンプトを更新するテスト"""
+        with patch('utils.prompt_manager.get_db_manager', return_value=db_manager):
+            create_or_update_prompt("内科", "主治医意見書", "田中医師", "最初のプロンプト", "gemini")
+            success, _ = create_or_update_prompt("内科", "主治医意見書", "田中医師", "新しいプロンプト", "claude")
+
+        prompts = db_manager.query_all(Prompt, {"department": "内科"})
+        assert success is True
+        assert len(prompts) == 1
+        assert prompts[0]["content"] == "新しいプロンプト"
+        assert prompts[0]["selected_model"] == "claude"
+        assert prompts[0]["is_default"] is False
 
     def test_create_or_update_prompt_invalid_input(self):
         """無効な入力のテスト"""
@@ -116,7 +145,7 @@ class TestCreateOrUpdatePrompt:
 
     def test_create_or_update_prompt_database_error(self, mock_database_manager):
         """データベースエラーのテスト"""
-        mock_database_manager.query_one.side_effect = DatabaseError("DB接続エラー")
+        mock_database_manager.upsert.side_effect = DatabaseError("DB接続エラー")
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             success, message = create_or_update_prompt(
@@ -133,14 +162,14 @@ class TestDeletePrompt:
     def test_delete_prompt_success(self, mock_database_manager):
         """プロンプト削除の成功テスト"""
         from database.models import Prompt
-        mock_database_manager.delete.return_value = True
+        mock_database_manager.delete_where.return_value = 1
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             success, message = delete_prompt("内科", "主治医意見書", "田中医師")
 
             assert success is True
             assert message == "プロンプトを削除しました"
-            mock_database_manager.delete.assert_called_once_with(
+            mock_database_manager.delete_where.assert_called_once_with(
                 Prompt,
                 {"department": "内科", "document_type": "主治医意見書", "doctor": "田中医師"}
             )
@@ -155,7 +184,7 @@ class TestDeletePrompt:
 
     def test_delete_prompt_not_found(self, mock_database_manager):
         """存在しないプロンプトの削除テスト"""
-        mock_database_manager.delete.return_value = False
+        mock_database_manager.delete_where.return_value = 0
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             success, message = delete_prompt("内科", "主治医意見書", "田中医師")
@@ -165,7 +194,7 @@ class TestDeletePrompt:
 
     def test_delete_prompt_database_error(self, mock_database_manager):
         """データベースエラーのテスト"""
-        mock_database_manager.delete.side_effect = DatabaseError("DB接続エラー")
+        mock_database_manager.delete_where.side_effect = DatabaseError("DB接続エラー")
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             success, message = delete_prompt("内科", "主治医意見書", "田中医師")
@@ -186,13 +215,13 @@ class TestGetPrompt:
             "doctor": "田中医師",
             "content": "内科用プロンプト"
         }
-        mock_database_manager.query_one.return_value = expected_prompt
+        mock_database_manager.query_first_match.return_value = expected_prompt
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             result = get_prompt("内科", "主治医意見書", "田中医師")
 
             assert result == expected_prompt
-            mock_database_manager.query_one.assert_called_once()
+            mock_database_manager.query_first_match.assert_called_once()
 
     def test_get_prompt_fallback_to_default(self, mock_database_manager):
         """デフォルトプロンプトにフォールバックするテスト"""
@@ -204,34 +233,129 @@ class TestGetPrompt:
             "content": "デフォルトプロンプト"
         }
 
-        # 最初のクエリはNone、2番目のクエリでデフォルトを返す
-        mock_database_manager.query_one.side_effect = [None, default_prompt]
+        # 完全一致がない場合はデフォルトプロンプトが1回のクエリで返される
+        mock_database_manager.query_first_match.return_value = default_prompt
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             with patch('utils.prompt_manager.DEFAULT_DOCUMENT_TYPE', '主治医意見書'):
                 result = get_prompt("存在しない部署", "主治医意見書", "存在しない医師")
 
                 assert result == default_prompt
-                assert mock_database_manager.query_one.call_count == 2
+                mock_database_manager.query_first_match.assert_called_once_with(
+                    Prompt,
+                    [
+                        {"department": "存在しない部署", "document_type": "主治医意見書", "doctor": "存在しない医師"},
+                        {"department": "default", "document_type": "主治医意見書", "doctor": "default",
+                         "is_default": True}
+                    ],
+                    columns=["content", "selected_model"]
+                )
 
     def test_get_prompt_no_default_found(self, mock_database_manager):
         """デフォルトプロンプトも見つからない場合のテスト"""
-        mock_database_manager.query_one.return_value = None
+        mock_database_manager.query_first_match.return_value = None
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             result = get_prompt("存在しない部署", "存在しない文書", "存在しない医師")
 
             assert result is None
 
+    def test_get_prompt_uses_cache(self, mock_database_manager):
+        """2回目以降の取得でキャッシュが使われるテスト"""
+        expected_prompt = {"id": 1, "content": "内科用プロンプト"}
+        mock_database_manager.query_first_match.return_value = expected_prompt
+
+        with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
+            first = get_prompt("内科", "主治医意見書", "田中医師")
+            second = get_prompt("内科", "主治医意見書", "田中医師")
+
+            assert first == second == expected_prompt
+            mock_database_manager.query_first_match.assert_called_once()
+            stats = get_prompt_cache_stats()
+            assert stats["hits"] >= 1
+            assert stats["misses"] >= 1
+
+    def test_get_prompt_cache_invalidated_on_update(self, mock_database_manager):
+        """プロンプト更新時にキャッシュが無効化されるテスト"""
+        mock_database_manager.query_first_match.return_value = {"id": 1, "content": "古いプロンプト"}
+        mock_database_manager.upsert.return_value = {"id": 1, "created_at": None, "updated_at": None}
+
+        with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
+            get_prompt("内科", "主治医意見書", "田中医師")
+            create_or_update_prompt("内科", "主治医意見書", "田中医師", "新しいプロンプト")
+
+            mock_database_manager.query_first_match.return_value = {"id": 1, "content": "新しいプロンプト"}
+            result = get_prompt("内科", "主治医意見書", "田中医師")
+
+            assert result["content"] == "新しいプロンプト"
+
+    def test_get_prompt_cache_cleared_on_default_update(self, mock_database_manager):
+        """デフォルトプロンプト更新時にフォールバック先のキャッシュも破棄されるテスト"""
+        mock_database_manager.query_first_match.return_value = {"id": 1, "content": "古いデフォルト"}
+        mock_database_manager.upsert.return_value = {"id": 1, "created_at": None, "updated_at": None}
+
+        with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
+            with patch('utils.prompt_manager.DEFAULT_DOCUMENT_TYPE', '主治医意見書'):
+                get_prompt("内科", "主治医意見書", "田中医師")
+                create_or_update_prompt("default", "主治医意見書", "default", "新しいデフォルト")
+
+                mock_database_manager.query_first_match.return_value = {"id": 1, "content": "新しいデフォルト"}
+                result = get_prompt("内科", "主治医意見書", "田中医師")
+
+                assert result["content"] == "新しいデフォルト"
+
+    def test_get_prompt_cache_invalidated_by_notification(self, mock_database_manager):
+        """他プロセスからの無効化通知でキャッシュが破棄されるテスト"""
+        from database.notifier import publish_invalidation
+
+        mock_database_manager.query_first_match.return_value = {"id": 1, "content": "古いプロンプト"}
+
+        with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
+            get_prompt("内科", "主治医意見書", "田中医師")
+            publish_invalidation("Prompt", ("内科", "主治医意見書", "田中医師"))
+
+            mock_database_manager.query_first_match.return_value = {"id": 1, "content": "新しいプロンプト"}
+            result = get_prompt("内科", "主治医意見書", "田中医師")
+
+            assert result["content"] == "新しいプロンプト"
+
     def test_get_prompt_database_error(self, mock_database_manager):
         """データベースエラーのテスト"""
-        mock_database_manager.query_one.side_effect = Exception("DB接続エラー")
+        mock_database_manager.query_first_match.side_effect = Exception("DB接続エラー")
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             with pytest.raises(DatabaseError, match="プロンプトの取得に失敗しました"):
                 get_prompt("内科", "主治医意見書", "田中医師")
 
 
+class TestResolvePrompt:
+    """resolve_prompt関数のテスト"""
+
+    def test_resolve_prompt_found(self):
+        """プロンプトが見つかった場合のテスト"""
+        prompt_data = {"content": "内科用プロンプト", "selected_model": "Claude"}
+
+        with patch('utils.prompt_manager.get_prompt', return_value=prompt_data) as mock_get_prompt:
+            result = resolve_prompt("内科", "主治医意見書", "田中医師")
+
+            mock_get_prompt.assert_called_once_with("内科", "主治医意見書", "田中医師")
+            assert result["content"] == "内科用プロンプト"
+            assert result["selected_model"] == "Claude"
+            assert result["department"] == "内科"
+
+    def test_resolve_prompt_falls_back_to_config(self):
+        """プロンプトが存在しない場合に設定ファイルのプロンプトを使うテスト"""
+        mock_config = Mock()
+        mock_config.__getitem__ = Mock(return_value={'summary': '設定ファイルのプロンプト'})
+
+        with patch('utils.prompt_manager.get_prompt', return_value=None):
+            with patch('utils.prompt_manager.get_config', return_value=mock_config):
+                result = resolve_prompt("内科", "主治医意見書", "田中医師")
+
+                assert result["content"] == "設定ファイルのプロンプト"
+                assert result["selected_model"] is None
+
+
 class TestInitializeDefaultPrompt:
     """initialize_default_prompt関数のテスト"""
 
@@ -292,13 +416,12 @@ class TestInitializeDatabase:
         mock_config.__getitem__ = Mock(return_value={'summary': 'デフォルトプロンプト内容'})
 
         # 既存プロンプトが存在しない場合をシミュレート
-        mock_database_manager.query_one.return_value = None
-        mock_database_manager.insert.return_value = {"id": 1}
+        mock_database_manager.insert_missing.return_value = 2
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             with patch('utils.prompt_manager.get_config', return_value=mock_config):
                 with patch('utils.prompt_manager.DEFAULT_DEPARTMENT', ['内科']):
-                    with patch('utils.prompt_manager.DOCUMENT_TYPES', ['主治医意見書']):
+                    with patch('utils.prompt_manager.DOCUMENT_TYPES', ['主治医意見書', '現病歴']):
                         with patch('utils.prompt_manager.DEPARTMENT_DOCTORS_MAPPING', {'内科': ['田中医師']}):
                             with patch('utils.prompt_manager.get_current_datetime') as mock_datetime:
                                 mock_now = datetime.datetime(2024, 1, 1, 12)
@@ -310,16 +433,27 @@ class TestInitializeDatabase:
                                 mock_init_schema.assert_called_once()
                                 mock_init_default.assert_called_once()
 
-                                # 新しいプロンプトが挿入されることを確認
-                                mock_database_manager.insert.assert_called()
+                                # 全組み合わせが1回の一括処理に渡されることを確認
+                                mock_database_manager.insert_missing.assert_called_once()
+                                model_class, rows, key_columns = mock_database_manager.insert_missing.call_args[0]
+                                assert model_class == Prompt
+                                assert key_columns == ["department", "document_type", "doctor"]
+                                assert [(row["department"], row["document_type"], row["doctor"]) for row in rows] == [
+                                    ("内科", "主治医意見書", "田中医師"),
+                                    ("内科", "現病歴", "田中医師"),
+                                ]
+                                assert all(row["content"] == 'デフォルトプロンプト内容' for row in rows)
+
+                                # 行ごとの照会・挿入は行われない
+                                mock_database_manager.query_one.assert_not_called()
+                                mock_database_manager.insert.assert_not_called()
 
     @patch('utils.prompt_manager.init_schema')
     @patch('utils.prompt_manager.initialize_default_prompt')
     def test_initialize_database_existing_prompts(self, mock_init_default, mock_init_schema, mock_database_manager):
         """既存プロンプトがある場合のテスト"""
         # 既存プロンプトが存在する場合をシミュレート
-        existing_prompt = {"id": 1, "content": "既存プロンプト"}
-        mock_database_manager.query_one.return_value = existing_prompt
+        mock_database_manager.insert_missing.return_value = 0
 
         with patch('utils.prompt_manager.get_db_manager', return_value=mock_database_manager):
             with patch('utils.prompt_manager.DEFAULT_DEPARTMENT', ['内科']):
@@ -327,7 +461,8 @@ class TestInitializeDatabase:
                     with patch('utils.prompt_manager.DEPARTMENT_DOCTORS_MAPPING', {'内科': ['田中医師']}):
                         initialize_database()
 
-                        # 既存プロンプトがあるため、新しい挿入は行われない
+                        # 既存判定は一括処理側で行われ、個別の挿入は行われない
+                        mock_database_manager.insert_missing.assert_called_once()
                         mock_database_manager.insert.assert_not_called()
 
     @patch('utils.prompt_manager.init_schema')
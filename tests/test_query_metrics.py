@@ -0,0 +1,114 @@
+import contextvars
+import logging
+import threading
+from unittest.mock import patch
+
+import pytest
+from sqlalchemy import create_engine, text
+
+from database.query_metrics import current_scope, fingerprint, instrument_queries, track_queries
+
+
+@pytest.fixture
+def engine():
+    """SQLiteのインメモリエンジン"""
+    engine = create_engine("sqlite://")
+    with engine.begin() as conn:
+        conn.execute(text("CREATE TABLE items (id INTEGER PRIMARY KEY, name TEXT)"))
+        conn.execute(text("INSERT INTO items (name) VALUES ('a'), ('b'), ('c')"))
+    yield engine
+    engine.dispose()
+
+
+class TestFingerprint:
+    """SQLの正規化のテスト"""
+
+    def test_fingerprint_replaces_literals_and_parameters(self):
+        """リテラルとパラメータが置き換えられるテスト"""
+        assert fingerprint("SELECT *  FROM items\n WHERE id = 3 AND name = 'x'") == \
+            "SELECT * FROM items WHERE id = ? AND name = ?"
+        assert fingerprint("SELECT * FROM items WHERE id = %(id_1)s") == "SELECT * FROM items WHERE id = ?"
+
+    def test_fingerprint_collapses_parameter_lists(self):
+        """展開されたIN句のパラメータが1つにまとめられるテスト"""
+        assert fingerprint("SELECT * FROM items WHERE id IN (?, ?, ?)") == \
+            fingerprint("SELECT * FROM items WHERE id IN (%(id_1_1)s, %(id_1_2)s)")
+
+
+class TestTrackQueries:
+    """クエリ計測のスコープのテスト"""
+
+    def test_queries_are_grouped_by_fingerprint(self, engine):
+        """同じ形のクエリがまとめて集計されるテスト"""
+        with track_queries("script_run") as scope:
+            with engine.connect() as conn:
+                for item_id in range(1, 4):
+                    conn.execute(text("SELECT name FROM items WHERE id = :id"), {"id": item_id})
+                conn.execute(text("SELECT COUNT(*) FROM items"))
+
+        summary = scope.summary()
+        assert summary["count"] == 4
+        assert summary["by_fingerprint"][0]["count"] == 3
+        assert summary["by_fingerprint"][0]["fingerprint"] == "SELECT name FROM items WHERE id = ?"
+        assert summary["elapsed_ms"] is not None
+
+    def test_nested_scope_counts_in_parent(self, engine):
+        """内側のスコープのクエリが外側にも計上されるテスト"""
+        @instrument_queries("render_sidebar")
+        def render_sidebar():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        with track_queries("script_run") as scope:
+            render_sidebar()
+            render_sidebar()
+
+        summary = scope.summary()
+        assert summary["count"] == 2
+        assert summary["children"]["render_sidebar"] == {
+            "calls": 2, "count": 2, "total_ms": pytest.approx(summary["total_ms"])
+        }
+        assert render_sidebar.__name__ == "render_sidebar"
+
+    def test_queries_outside_scope_are_not_recorded(self, engine):
+        """スコープ外のクエリは計測されないテスト"""
+        with engine.connect() as conn:
+            conn.execute(text("SELECT 1"))
+
+        assert current_scope() is None
+
+    def test_scope_is_inherited_by_copied_context(self, engine):
+        """コンテキストを引き継いだスレッドのクエリが計上されるテスト"""
+        def worker():
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        with track_queries("process_summary") as scope:
+            thread = threading.Thread(target=contextvars.copy_context().run, args=(worker,))
+            thread.start()
+            thread.join()
+
+        assert scope.summary()["count"] == 1
+
+    def test_over_budget_is_logged(self, engine, caplog):
+        """予算を超えた場合にクエリの指紋を含む警告ログが出力されるテスト"""
+        with patch('database.query_metrics.QUERY_BUDGET_COUNT', 2), \
+                caplog.at_level(logging.WARNING, logger="database.query_metrics"):
+            with track_queries("script_run"):
+                with engine.connect() as conn:
+                    for _ in range(3):
+                        conn.execute(text("SELECT 1"))
+
+        [record] = caplog.records
+        assert record.levelno == logging.WARNING
+        assert "クエリ予算超過: script_run 3件" in record.getMessage()
+        assert "最多: 3回 SELECT ?" in record.getMessage()
+
+    def test_within_budget_is_not_logged(self, engine, caplog):
+        """予算内の場合はログが出力されないテスト"""
+        with track_queries("script_run") as scope:
+            with engine.connect() as conn:
+                conn.execute(text("SELECT 1"))
+
+        assert scope.over_budget(max_count=1, max_ms=10_000) is False
+        assert not caplog.records
@@ -0,0 +1,153 @@
+from unittest.mock import MagicMock, Mock, patch
+
+import pytest
+from sqlalchemy import create_engine, inspect
+from sqlalchemy.exc import ProgrammingError
+
+from database.migrations import SCHEMA_VERSION
+from database.schema import _ensure_future_partitions, create_tables, get_schema_version, initialize_database
+from utils.exceptions import DatabaseError
+
+
+def _mock_postgres_engine(in_lock_version):
+    """ロック取得後のバージョン確認でin_lock_versionを返すPostgreSQLエンジンのモック"""
+    engine = Mock()
+    engine.dialect.name = "postgresql"
+    connection = Mock()
+    connection.execute.return_value.scalar.side_effect = ["schema_version", in_lock_version]
+    engine.begin.return_value = MagicMock()
+    engine.begin.return_value.__enter__.return_value = connection
+    return engine, connection
+
+
+class TestCreateTables:
+    """create_tables関数のテスト"""
+
+    @pytest.fixture
+    def mock_db_manager(self):
+        with patch("database.schema.DatabaseManager") as mock_manager_class:
+            yield mock_manager_class.get_instance.return_value
+
+    @pytest.fixture(autouse=True)
+    def mock_ensure_future_partitions(self):
+        with patch("database.schema._ensure_future_partitions") as mock_ensure:
+            yield mock_ensure
+
+    def test_up_to_date_schema_checks_version_only(self, mock_db_manager, mock_ensure_future_partitions):
+        """スキーマが最新の場合はバージョンとパーティションの確認のみ行うテスト"""
+        engine = Mock()
+        engine.dialect.name = "postgresql"
+        mock_db_manager.get_engine.return_value = engine
+
+        with patch("database.schema.get_schema_version", return_value=SCHEMA_VERSION):
+            assert create_tables() is False
+
+        engine.begin.assert_not_called()
+        mock_ensure_future_partitions.assert_called_once_with(engine)
+
+    def test_outdated_schema_applies_pending_migrations(self, mock_db_manager):
+        """スキーマが古い場合はロックを取得して未適用のマイグレーションのみ行うテスト"""
+        engine, connection = _mock_postgres_engine(SCHEMA_VERSION - 1)
+        mock_db_manager.get_engine.return_value = engine
+
+        with patch("database.schema.get_schema_version", return_value=SCHEMA_VERSION - 1), \
+                patch("database.schema.Base.metadata.create_all") as mock_create_all, \
+                patch("database.schema.run_migrations", return_value=SCHEMA_VERSION) as mock_run_migrations:
+            assert create_tables() is True
+
+        statements = [str(call.args[0]) for call in connection.execute.call_args_list]
+        assert "pg_advisory_xact_lock" in statements[0]
+        assert any("INSERT INTO schema_version" in statement for statement in statements)
+        mock_create_all.assert_called_once_with(connection)
+        mock_run_migrations.assert_called_once_with(connection, SCHEMA_VERSION - 1)
+
+    def test_schema_upgraded_by_another_process(self, mock_db_manager):
+        """ロック待ちの間に他のプロセスが更新した場合は何もしないテスト"""
+        engine, _ = _mock_postgres_engine(SCHEMA_VERSION)
+        mock_db_manager.get_engine.return_value = engine
+
+        with patch("database.schema.get_schema_version", return_value=None), \
+                patch("database.schema.Base.metadata.create_all") as mock_create_all, \
+                patch("database.schema.run_migrations") as mock_run_migrations:
+            assert create_tables() is False
+
+        mock_create_all.assert_not_called()
+        mock_run_migrations.assert_not_called()
+
+    def test_non_postgresql_creates_tables_only(self, mock_db_manager, mock_ensure_future_partitions):
+        """PostgreSQL以外ではテーブル作成のみ行うテスト"""
+        engine = create_engine("sqlite://")
+        mock_db_manager.get_engine.return_value = engine
+
+        assert create_tables() is False
+        assert "prompts" in inspect(engine).get_table_names()
+        mock_ensure_future_partitions.assert_not_called()
+
+    def test_get_schema_version_without_table(self):
+        """バージョン管理テーブルが未作成の場合にNoneを返すテスト"""
+        engine = MagicMock()
+        engine.connect.return_value.__enter__.return_value.execute.side_effect = ProgrammingError(
+            "SELECT", {}, Exception("relation \"schema_version\" does not exist")
+        )
+
+        assert get_schema_version(engine) is None
+
+
+class TestEnsureFuturePartitions:
+    """起動時の今後の月のパーティション作成のテスト"""
+
+    @staticmethod
+    def _mock_engine():
+        engine = MagicMock()
+        connection = engine.connect.return_value.__enter__.return_value
+        transaction = engine.begin.return_value.__enter__.return_value
+        return engine, connection, transaction
+
+    def test_ready_partitions_are_checked_only(self):
+        """パーティションが揃っている場合は1回の確認のみでトランザクションを開始しないテスト"""
+        engine, connection, _ = self._mock_engine()
+
+        with patch("database.schema.partitions_ready", return_value=True) as mock_ready, \
+                patch("database.schema.ensure_partitions") as mock_ensure:
+            assert _ensure_future_partitions(engine) is False
+
+        mock_ready.assert_called_once_with(connection)
+        engine.begin.assert_not_called()
+        mock_ensure.assert_not_called()
+
+    def test_missing_partitions_are_created(self):
+        """不足している場合はパーティションテーブルに今後の月のパーティションを作成するテスト"""
+        engine, _, transaction = self._mock_engine()
+
+        with patch("database.schema.partitions_ready", return_value=False), \
+                patch("database.schema.is_partitioned", return_value=True), \
+                patch("database.schema.ensure_partitions") as mock_ensure:
+            assert _ensure_future_partitions(engine) is True
+
+        mock_ensure.assert_called_once_with(transaction)
+
+    def test_unpartitioned_table_is_skipped(self):
+        """パーティションテーブルに変換されていない場合は作成しないテスト"""
+        engine, _, _ = self._mock_engine()
+
+        with patch("database.schema.partitions_ready", return_value=False), \
+                patch("database.schema.is_partitioned", return_value=False), \
+                patch("database.schema.ensure_partitions") as mock_ensure:
+            assert _ensure_future_partitions(engine) is False
+
+        mock_ensure.assert_not_called()
+
+
+class TestInitializeDatabase:
+    """initialize_database関数のテスト"""
+
+    @patch("database.schema.create_tables")
+    def test_initialize_database_does_not_retry(self, mock_create_tables):
+        """失敗時に再試行せず例外を送出するテスト"""
+        mock_create_tables.side_effect = DatabaseError("接続エラー")
+
+        with patch("time.sleep") as mock_sleep, pytest.raises(DatabaseError):
+            initialize_database()
+
+        mock_create_tables.assert_called_once()
+        mock_sleep.assert_not_called()
@@ -0,0 +1,561 @@
+import csv
+import datetime
+import io
+from unittest.mock import MagicMock, Mock, patch
+
+import pyarrow.parquet as pq
+import pytest
+from sqlalchemy.dialects import postgresql
+from sqlalchemy.orm import Session
+
+from database.models import SummaryUsage
+from database.notifier import set_notifier
+from services.usage_service import save_usage_records
+from views.statistics_page import (
+    JST,
+    _sweep_exports,
+    build_latency_query,
+    build_usage_filters,
+    cleanup_expired_exports,
+    clear_statistics_cache,
+    discard_export,
+    export_usage_records,
+    format_department_data,
+    format_detail_data,
+    format_latency_chart_data,
+    get_export,
+    get_page_cursors,
+    get_usage_records_page,
+    get_usage_statistics,
+    invalidate_statistics_cache,
+    iter_usage_record_batches,
+    jst_period,
+    read_export,
+    render_usage_export,
+    start_export_sweeper,
+    store_export
+)
+
+START = datetime.datetime(2025, 4, 1)
+END = datetime.datetime(2025, 4, 30, 23, 59, 59)
+
+
+class _SessionState(dict):
+    """属性アクセスにも対応したsession_stateの代替"""
+
+    def __getattr__(self, name):
+        return self[name]
+
+    def __setattr__(self, name, value):
+        self[name] = value
+
+
+@pytest.fixture(autouse=True)
+def reset_statistics_cache():
+    """各テスト前後で統計キャッシュをクリア"""
+    clear_statistics_cache()
+    yield
+    clear_statistics_cache()
+
+
+def _insert_usage(db_manager, dates, provider="claude"):
+    db_manager.insert_many(SummaryUsage, [
+        {
+            "date": date,
+            "document_types": "退院時サマリ",
+            "model_detail": "Claude",
+            "provider": provider,
+            "department": "内科",
+            "doctor": "default",
+            "input_tokens": 100,
+            "output_tokens": 50,
+            "total_tokens": 150,
+            "processing_time": 3
+        }
+        for date in dates
+    ])
+
+
+class TestGetUsageRecordsPage:
+    """詳細レコードのキーセットページングのテスト"""
+
+    def test_pages_cover_all_rows_in_order(self, db_manager):
+        """同じ日時の行を含めて全行が重複・欠落なく新しい順に取得されるテスト"""
+        same_time = datetime.datetime(2025, 4, 10, 9, 0)
+        _insert_usage(db_manager, [
+            datetime.datetime(2025, 4, 5, 9, 0),
+            same_time,
+            same_time,
+            same_time,
+            datetime.datetime(2025, 4, 20, 9, 0),
+        ])
+
+        seen = []
+        cursor = None
+        pages = 0
+        while True:
+            page = get_usage_records_page(START, END, "すべて", "すべて", 2, cursor)
+            seen.extend(page["records"])
+            pages += 1
+            cursor = page["next_cursor"]
+            if cursor is None:
+                break
+
+        assert pages == 3
+        assert len({record["id"] for record in seen}) == 5
+        keys = [(record["date"], record["id"]) for record in seen]
+        assert keys == sorted(keys, reverse=True)
+
+    def test_page_applies_filters(self, db_manager):
+        """AIモデルの条件で絞り込まれるテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, 5, 9, 0)], provider="claude")
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, 6, 9, 0)], provider="gemini")
+
+        page = get_usage_records_page(START, END, "Gemini_Pro", "すべて", 50)
+
+        assert len(page["records"]) == 1
+        assert page["records"][0]["date"] == datetime.datetime(2025, 4, 6, 9, 0)
+        assert page["next_cursor"] is None
+
+    def test_last_page_has_no_next_cursor(self, db_manager):
+        """件数がちょうどページサイズの場合は次ページがないテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, day, 9, 0) for day in (1, 2)])
+
+        page = get_usage_records_page(START, END, "すべて", "すべて", 2)
+
+        assert len(page["records"]) == 2
+        assert page["next_cursor"] is None
+
+
+class TestJstPeriod:
+    """集計と詳細の期間をJSTの日で揃えるテスト"""
+
+    def test_usage_filters_use_jst_bounds(self):
+        """detail側の検索条件がJSTの0時を境界にするテスト"""
+        start, end = jst_period(datetime.date(2025, 4, 2), datetime.date(2025, 4, 2))
+
+        filters = build_usage_filters(start, end, "すべて", "すべて")
+
+        assert filters[0].right.value == JST.localize(datetime.datetime(2025, 4, 2))
+        assert filters[0].right.value.utcoffset() == datetime.timedelta(hours=9)
+        assert filters[1].right.value.date() == datetime.date(2025, 4, 2)
+
+    def test_naive_bounds_are_jst(self):
+        """タイムゾーンなしの日時はJSTとみなすテスト"""
+        filters = build_usage_filters(datetime.datetime(2025, 4, 2), END, "すべて", "すべて")
+
+        assert filters[0].right.value == JST.localize(datetime.datetime(2025, 4, 2))
+
+    def test_record_after_midnight_jst_is_in_both_totals_and_details(self, db_manager):
+        """JST 0:30の記録が集計と詳細の両方で同じ日に含まれるテスト"""
+        usage = {
+            "document_types": "退院時サマリ",
+            "model_detail": "Claude",
+            "provider": "claude",
+            "department": "内科",
+            "doctor": "default",
+            "input_tokens": 100,
+            "output_tokens": 50,
+            "total_tokens": 150,
+            "processing_time": 3
+        }
+        save_usage_records([
+            {**usage, "date": JST.localize(datetime.datetime(2025, 4, 1, 23, 30))},
+            {**usage, "date": JST.localize(datetime.datetime(2025, 4, 2, 0, 30))},
+        ])
+        start, end = jst_period(datetime.date(2025, 4, 2), datetime.date(2025, 4, 2))
+
+        stats = get_usage_statistics(start, end, "すべて", "すべて")
+        page = get_usage_records_page(start, end, "すべて", "すべて", 50)
+
+        assert stats["total"]["count"] == 1
+        assert len(page["records"]) == 1
+
+
+class TestStatisticsCache:
+    """統計キャッシュのテスト"""
+
+    def test_statistics_are_cached(self, db_manager):
+        """同じ条件の2回目はキャッシュから返されるテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, 5, 9, 0)])
+
+        first = get_usage_records_page(START, END, "すべて", "すべて", 50)
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, 6, 9, 0)])
+        second = get_usage_records_page(START, END, "すべて", "すべて", 50)
+
+        assert second is first
+
+    def test_new_usage_invalidates_containing_ranges(self, db_manager):
+        """利用記録の保存で、その日を含む期間のキャッシュだけが無効化されるテスト"""
+        usage = {
+            "date": datetime.datetime(2025, 4, 10, 9, 0),
+            "document_types": "退院時サマリ",
+            "model_detail": "Claude",
+            "provider": "claude",
+            "department": "内科",
+            "doctor": "default",
+            "input_tokens": 100,
+            "output_tokens": 50,
+            "total_tokens": 150,
+            "processing_time": 3
+        }
+        save_usage_records([usage])
+        april = get_usage_statistics(START, END, "すべて", "すべて")
+        march = get_usage_statistics(datetime.datetime(2025, 3, 1), datetime.datetime(2025, 3, 31), "すべて", "すべて")
+
+        save_usage_records([usage])
+
+        assert get_usage_statistics(START, END, "すべて", "すべて")["total"]["count"] == 2
+        assert april["total"]["count"] == 1
+        assert get_usage_statistics(
+            datetime.datetime(2025, 3, 1), datetime.datetime(2025, 3, 31), "すべて", "すべて"
+        ) is march
+
+    def test_local_cache_invalidated_when_notify_fails(self, db_manager):
+        """通知に失敗しても自プロセスの統計キャッシュは無効化されるテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, 5, 9, 0)])
+        before = get_usage_statistics(START, END, "すべて", "すべて")
+        failing_notifier = Mock()
+        failing_notifier.publish.side_effect = Exception("pg_notify失敗")
+        set_notifier(failing_notifier)
+
+        save_usage_records([{
+            "date": datetime.datetime(2025, 4, 6, 9, 0),
+            "document_types": "退院時サマリ",
+            "provider": "claude",
+            "input_tokens": 100,
+            "output_tokens": 50,
+            "total_tokens": 150,
+            "processing_time": 3
+        }])
+
+        failing_notifier.publish.assert_called_once()
+        assert get_usage_statistics(START, END, "すべて", "すべて") is not before
+
+    def test_invalidate_statistics_cache_by_day(self, db_manager):
+        """指定日を含まない期間のキャッシュは残るテスト"""
+        get_usage_records_page(START, END, "すべて", "すべて", 50)
+
+        assert invalidate_statistics_cache([datetime.date(2025, 5, 1)]) == 0
+        assert invalidate_statistics_cache([datetime.date(2025, 4, 30)]) == 1
+
+
+class TestExportUsageRecords:
+    """利用記録のエクスポートのテスト"""
+
+    def test_iter_usage_record_batches(self, db_manager):
+        """指定件数ずつ古い順に取得されるテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, day, 9, 0) for day in range(1, 6)])
+
+        batches = list(iter_usage_record_batches(START, END, "すべて", "すべて", batch_size=2))
+
+        assert [len(batch) for batch in batches] == [2, 2, 1]
+        dates = [record["date"] for batch in batches for record in batch]
+        assert dates == sorted(dates)
+
+    def test_export_csv(self, db_manager, tmp_path):
+        """CSVに全件が書き出されるテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, day, 9, 0) for day in range(1, 6)])
+
+        path = export_usage_records(START, END, "すべて", "すべて", "csv", batch_size=2, directory=tmp_path)
+        with open(path, encoding="utf-8-sig", newline="") as f:
+            rows = list(csv.DictReader(f))
+
+        assert len(rows) == 5
+        assert rows[0]["provider"] == "claude"
+        assert rows[0]["total_tokens"] == "150"
+
+    def test_export_parquet(self, db_manager, tmp_path):
+        """Parquetに全件が書き出されるテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, day, 9, 0) for day in range(1, 6)])
+
+        path = export_usage_records(START, END, "すべて", "すべて", "parquet", batch_size=2, directory=tmp_path)
+        table = pq.read_table(path)
+
+        assert table.num_rows == 5
+        assert table.column("input_tokens").to_pylist() == [100] * 5
+
+    def test_export_unsupported_format(self):
+        """未対応の出力形式でエラーになるテスト"""
+        with pytest.raises(ValueError):
+            export_usage_records(START, END, "すべて", "すべて", "xlsx")
+
+    def test_read_export_removes_file(self, tmp_path):
+        """読み込んだエクスポートファイルが削除され、上限を超える場合は読み込まないテスト"""
+        small = tmp_path / "summary_usage_small.csv"
+        large = tmp_path / "summary_usage_large.csv"
+        small.write_bytes(b"x" * 10)
+        large.write_bytes(b"x" * 11)
+
+        assert read_export(str(small), max_bytes=10) == b"x" * 10
+        assert read_export(str(large), max_bytes=10) is None
+        assert list(tmp_path.iterdir()) == []
+
+    def test_cleanup_expired_exports(self):
+        """期限を過ぎたダウンロード用のデータだけが破棄されるテスト"""
+        with patch('views.statistics_page.start_export_sweeper'):
+            expired = store_export(("old",), b"old", "old.csv")
+            recent = store_export(("new",), b"new", "new.csv")
+        get_export(expired)["created"] -= 7200
+
+        try:
+            assert cleanup_expired_exports(ttl=900) == 1
+            assert get_export(expired) is None
+            assert get_export(recent)["data"] == b"new"
+        finally:
+            discard_export(recent)
+
+    def test_export_sweeper_runs_on_interval(self):
+        """期限切れのデータが画面の描画とは別に一定間隔で破棄されるテスト"""
+        class StopSweeper(Exception):
+            pass
+
+        with patch('views.statistics_page.start_export_sweeper'):
+            token = store_export(("old",), b"old", "old.csv")
+        get_export(token)["created"] -= 7200
+
+        with patch('views.statistics_page.time.sleep', side_effect=[None, StopSweeper]) as mock_sleep, \
+                pytest.raises(StopSweeper):
+            _sweep_exports(60)
+
+        mock_sleep.assert_called_with(60)
+        assert get_export(token) is None
+
+    def test_export_sweeper_started_once(self):
+        """破棄用のスレッドがプロセスごとに1つだけ起動されるテスト"""
+        with patch('views.statistics_page._export_sweeper', None), \
+                patch('views.statistics_page.threading.Thread') as mock_thread:
+            mock_thread.return_value.is_alive.return_value = True
+            start_export_sweeper()
+            start_export_sweeper()
+
+        mock_thread.assert_called_once()
+        assert mock_thread.call_args.kwargs["daemon"] is True
+        mock_thread.return_value.start.assert_called_once()
+
+
+class TestRenderUsageExport:
+    """エクスポートのダウンロード表示のテスト"""
+
+    @staticmethod
+    def _render(session_state, clicked=False):
+        with patch('views.statistics_page.st') as mock_st:
+            mock_st.session_state = session_state
+            mock_st.columns.return_value = (MagicMock(), MagicMock())
+            mock_st.selectbox.return_value = "csv"
+            mock_st.button.return_value = clicked
+            render_usage_export(START, END, "すべて", "すべて")
+        return mock_st
+
+    def test_export_is_offered_with_download_button(self, db_manager):
+        """エクスポートしたデータがdownload_buttonで提供され、再描画後も表示されるテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, day, 9, 0) for day in range(1, 3)])
+        session_state = _SessionState()
+
+        self._render(session_state, clicked=True)
+        mock_st = self._render(session_state)
+
+        token = session_state["usage_export_token"]
+        try:
+            kwargs = mock_st.download_button.call_args.kwargs
+            assert kwargs["file_name"] == "summary_usage_20250401_20250430.csv"
+            assert kwargs["mime"] == "text/csv"
+            assert kwargs["on_click"] == "ignore"
+            rows = list(csv.DictReader(io.StringIO(kwargs["data"].decode("utf-8-sig"))))
+            assert len(rows) == 2
+            mock_st.markdown.assert_not_called()
+        finally:
+            discard_export(token)
+
+    def test_export_for_other_filters_is_hidden(self):
+        """検索条件が変わった場合は以前のエクスポートを表示しないテスト"""
+        with patch('views.statistics_page.start_export_sweeper'):
+            token = store_export((START, END, "Claude", "すべて", "csv"), b"data", "old.csv")
+        session_state = _SessionState(usage_export_token=token)
+
+        try:
+            mock_st = self._render(session_state)
+            mock_st.download_button.assert_not_called()
+        finally:
+            discard_export(token)
+
+    def test_oversized_export_is_rejected(self, db_manager, tmp_path):
+        """上限を超えるエクスポートは読み込まずに削除して警告を表示するテスト"""
+        _insert_usage(db_manager, [datetime.datetime(2025, 4, 1, 9, 0)])
+        session_state = _SessionState()
+
+        with patch('views.statistics_page.EXPORT_MAX_BYTES', 10), \
+                patch('tempfile.tempdir', str(tmp_path)):
+            mock_st = self._render(session_state, clicked=True)
+
+        mock_st.warning.assert_called_once()
+        mock_st.download_button.assert_not_called()
+        assert session_state["usage_export_token"] is None
+        assert list(tmp_path.iterdir()) == []
+
+
+class TestFormatData:
+    """統計データの整形のテスト"""
+
+    def test_format_detail_data(self):
+        """詳細レコードの表示用の変換テスト"""
+        records = [
+            {
+                "date": datetime.datetime(2025, 3, 31, 16, 0, tzinfo=datetime.timezone.utc),
+                "document_types": None,
+                "model_detail": "claude-3-sonnet",
+                "department": "default",
+                "doctor": "田中医師",
+                "input_tokens": 100,
+                "output_tokens": 50,
+                "processing_time": None
+            },
+            {
+                "date": datetime.datetime(2025, 3, 31, 15, 0, tzinfo=datetime.timezone.utc),
+                "document_types": "退院時サマリ",
+                "model_detail": None,
+                "department": "内科",
+                "doctor": "default",
+                "input_tokens": 200,
+                "output_tokens": 80,
+                "processing_time": 12
+            },
+        ]
+
+        df = format_detail_data(records)
+
+        assert df["作成日"].tolist() == ["2025/04/01", "2025/04/01"]
+        assert df["文書名"].tolist() == ["不明", "退院時サマリ"]
+        assert df["診療科"].tolist() == ["全科共通", "内科"]
+        assert df["医師名"].tolist() == ["田中医師", "医師共通"]
+        assert df["AIモデル"].tolist() == ["Claude", "Gemini_Pro"]
+        assert df["処理時間(秒)"].tolist() == [0, 12]
+
+    def test_format_detail_data_naive_dates_are_jst(self):
+        """タイムゾーンなしの日時がJSTとして扱われるテスト"""
+        records = [{
+            "date": datetime.datetime(2025, 3, 31, 23, 0),
+            "document_types": "退院時サマリ",
+            "model_detail": "gemini-2.5-pro",
+            "department": "内科",
+            "doctor": "default",
+            "input_tokens": 100,
+            "output_tokens": 50,
+            "processing_time": 3
+        }]
+
+        df = format_detail_data(records)
+
+        assert df["作成日"].tolist() == ["2025/03/31"]
+        assert df["AIモデル"].tolist() == ["Gemini_Pro"]
+
+    def test_format_detail_data_mixed_timezones(self):
+        """タイムゾーンの有無が混在していても行ごとにJSTの日付に変換されるテスト"""
+        base = {
+            "document_types": "退院時サマリ",
+            "model_detail": "claude",
+            "department": "内科",
+            "doctor": "default",
+            "input_tokens": 100,
+            "output_tokens": 50,
+            "processing_time": 3
+        }
+        records = [
+            {**base, "date": datetime.datetime(2025, 3, 31, 23, 0)},
+            {**base, "date": datetime.datetime(2025, 3, 31, 16, 0, tzinfo=datetime.timezone.utc)},
+            {**base, "date": datetime.datetime(2025, 3, 31, 14, 0)},
+        ]
+
+        df = format_detail_data(records)
+
+        assert df["作成日"].tolist() == ["2025/03/31", "2025/04/01", "2025/03/31"]
+
+    def test_format_department_data(self):
+        """診療科別統計の表示用の変換テスト"""
+        df = format_department_data([{
+            "department": "default",
+            "doctor": "default",
+            "document_types": None,
+            "count": 3,
+            "input_tokens": 300,
+            "output_tokens": 150,
+            "total_tokens": 450,
+            "processing_time": 9
+        }])
+
+        assert df.iloc[0].to_dict() == {
+            "文書名": "不明",
+            "診療科": "全科共通",
+            "医師名": "医師共通",
+            "作成件数": 3,
+            "入力トークン": 300,
+            "出力トークン": 150,
+            "合計トークン": 450,
+        }
+
+    def test_format_empty(self):
+        """空のデータで空のDataFrameが返されるテスト"""
+        assert format_detail_data([]).empty
+        assert format_department_data([]).empty
+
+
+class TestLatencyStatistics:
+    """処理時間パーセンタイル・スループット集計のテスト"""
+
+    def test_build_latency_query_aggregates_in_database(self):
+        """パーセンタイルと期間バケットがSQLで集計されるテスト"""
+        query = build_latency_query(Session(), START, END, "Claude", "すべて", "document_types", "week")
+        sql = str(query.statement.compile(dialect=postgresql.dialect()))
+
+        assert "date_trunc(" in sql
+        assert "timezone(" in sql
+        assert sql.count("percentile_cont(") == 3
+        assert "WITHIN GROUP (ORDER BY summary_usage.processing_time)" in sql
+        assert "GROUP BY" in sql
+        assert "summary_usage.document_types" in sql
+
+    def test_build_latency_query_rejects_unknown_options(self):
+        """未対応の集計単位・期間単位でエラーになるテスト"""
+        with pytest.raises(ValueError):
+            build_latency_query(Session(), START, END, "すべて", "すべて", "doctor", "day")
+        with pytest.raises(ValueError):
+            build_latency_query(Session(), START, END, "すべて", "すべて", "provider", "hour")
+
+    def test_format_latency_chart_data(self):
+        """期間バケットを行、グループを列とするDataFrameに変換されるテスト"""
+        day1 = datetime.datetime(2025, 4, 1)
+        day2 = datetime.datetime(2025, 4, 2)
+        df = format_latency_chart_data([
+            {"bucket": day1, "group": "claude", "count": 3, "p50": 10.0, "p95": 20.0, "p99": 25.0,
+             "output_tokens_per_second": 30.0},
+            {"bucket": day1, "group": "gemini", "count": 2, "p50": 5.0, "p95": 8.0, "p99": 9.0,
+             "output_tokens_per_second": 60.0},
+            {"bucket": day2, "group": "claude", "count": 1, "p50": 12.0, "p95": 12.0, "p99": 12.0,
+             "output_tokens_per_second": None},
+        ], "p95")
+
+        assert list(df.columns) == ["Claude", "Gemini_Pro"]
+        assert list(df.index) == [day1, day2]
+        assert df.loc[day1, "Claude"] == 20.0
+        assert df.loc[day2, "Claude"] == 12.0
+
+    def test_format_latency_chart_data_empty(self):
+        """データがない場合は空のDataFrameが返されるテスト"""
+        assert format_latency_chart_data([], "p50").empty
+
+
+class TestGetPageCursors:
+    """ページカーソル履歴のテスト"""
+
+    def test_cursors_reset_when_filters_change(self):
+        """検索条件が変わると先頭ページに戻るテスト"""
+        session_state = _SessionState()
+
+        with patch('views.statistics_page.st') as mock_st:
+            mock_st.session_state = session_state
+
+            cursors = get_page_cursors(("条件A",))
+            cursors.append((datetime.datetime(2025, 4, 1), 10))
+            assert get_page_cursors(("条件A",)) == [None, (datetime.datetime(2025, 4, 1), 10)]
+
+            assert get_page_cursors(("条件B",)) == [None]
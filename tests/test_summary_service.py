@@ -196,6 +196,19 @@ class TestDetermineFinalModel:
         assert switched == False
         assert original == 'Gemini_Pro'
 
+    @patch('services.summary_service.get_prompt')
+    @patch('services.summary_service.MAX_TOKEN_THRESHOLD', 1000)
+    def test_determine_final_model_with_resolved_prompt(self, mock_get_prompt):
+        """解決済みプロンプトが渡された場合は再取得しないテスト"""
+        model, switched, original = determine_final_model(
+            '内科', '診療録', '医師', 'Claude', False, 'テスト', '',
+            {'content': 'テストプロンプト', 'selected_model': 'Gemini_Pro'}
+        )
+
+        assert model == 'Gemini_Pro'
+        assert switched == False
+        mock_get_prompt.assert_not_called()
+
     @patch('services.summary_service.get_prompt')
     @patch('services.summary_service.MAX_TOKEN_THRESHOLD', 10)
     @patch('services.summary_service.GOOGLE_CREDENTIALS_JSON', 'test_creds')
@@ -254,6 +267,7 @@ class TestGenerateSummaryTask:
     """サマリー生成タスクのテストクラス"""
 
     @patch('services.summary_service.normalize_selection_params')
+    @patch('services.summary_service.resolve_prompt')
     @patch('services.summary_service.determine_final_model')
     @patch('services.summary_service.get_provider_and_model')
     @patch('services.summary_service.validate_api_credentials_for_provider')
@@ -262,11 +276,12 @@ class TestGenerateSummaryTask:
     @patch('services.summary_service.parse_output_summary')
     def test_generate_summary_task_success(
             self, mock_parse, mock_format, mock_generate, mock_validate,
-            mock_get_provider, mock_determine, mock_normalize
+            mock_get_provider, mock_determine, mock_resolve, mock_normalize
     ):
         """サマリー生成タスクの成功テスト"""
         # モックの設定
         mock_normalize.return_value = ('内科', '診療録')
+        mock_resolve.return_value = {'content': 'テストプロンプト', 'selected_model': None}
         mock_determine.return_value = ('Claude', False, 'Claude')
         mock_get_provider.return_value = ('claude', 'claude-3-sonnet')
         mock_generate.return_value = ('生成されたサマリー', 100, 200)
@@ -286,9 +301,41 @@ class TestGenerateSummaryTask:
         assert result['input_tokens'] == 100
         assert result['output_tokens'] == 200
         assert result['model_detail'] == 'Claude'  # providerが'gemini'以外の場合はfinal_modelが使用される
+        assert result['provider'] == 'claude'
         assert result['model_switched'] == False
         assert result['original_model'] is None
 
+    @patch('services.summary_service.normalize_selection_params')
+    @patch('services.summary_service.resolve_prompt')
+    @patch('services.summary_service.get_prompt')
+    @patch('services.summary_service.get_provider_and_model')
+    @patch('services.summary_service.validate_api_credentials_for_provider')
+    @patch('services.summary_service.generate_summary')
+    @patch('services.summary_service.MAX_TOKEN_THRESHOLD', 100000)
+    def test_generate_summary_task_resolves_prompt_once(
+            self, mock_generate, mock_validate, mock_get_provider,
+            mock_get_prompt, mock_resolve, mock_normalize
+    ):
+        """プロンプトが1回だけ解決され、API呼び出しに引き渡されるテスト"""
+        resolved_prompt = {'content': 'テストプロンプト', 'selected_model': 'Claude'}
+        mock_normalize.return_value = ('内科', '診療録')
+        mock_resolve.return_value = resolved_prompt
+        mock_get_provider.return_value = ('claude', 'claude-3-sonnet')
+        mock_generate.return_value = ('生成されたサマリー', 100, 200)
+
+        result_queue = queue.Queue()
+
+        generate_summary_task(TEST_INPUT_TEXT, '内科', 'Gemini_Pro', result_queue, TEST_ADDITIONAL_INFO, '診療録',
+                              '田中医師')
+
+        result = result_queue.get()
+
+        assert result['success'] == True
+        mock_resolve.assert_called_once_with('内科', '診療録', '田中医師')
+        mock_get_prompt.assert_not_called()
+        mock_get_provider.assert_called_once_with('Claude')
+        assert mock_generate.call_args.kwargs['resolved_prompt'] is resolved_prompt
+
     @patch('services.summary_service.normalize_selection_params')
     def test_generate_summary_task_exception(self, mock_normalize):
         """サマリー生成タスクの例外処理テスト"""
@@ -312,17 +359,13 @@ class TestGenerateSummaryTask:
 class TestSaveUsageToDatabase:
     """データベース保存のテストクラス"""
 
-    @patch('services.summary_service.DatabaseManager')
+    @patch('services.summary_service.enqueue_usage')
     @patch('streamlit.warning')
-    def test_save_usage_to_database_success(self, mock_warning, mock_db_manager):
+    def test_save_usage_to_database_success(self, mock_warning, mock_enqueue_usage):
         """データベース保存成功のテスト"""
-        from database.models import SummaryUsage
-        mock_db_instance = Mock()
-        mock_db_manager.get_instance.return_value = mock_db_instance
-        mock_db_instance.insert.return_value = {"id": 1}
-
         result = {
             'model_detail': 'claude-3-sonnet',
+            'provider': 'claude',
             'input_tokens': 100,
             'output_tokens': 200,
             'processing_time': 5.5
@@ -336,16 +379,18 @@ class TestSaveUsageToDatabase:
 
         save_usage_to_database(result, session_params)
 
-        mock_db_instance.insert.assert_called_once()
-        call_args = mock_db_instance.insert.call_args
-        assert call_args[0][0] == SummaryUsage
+        mock_enqueue_usage.assert_called_once()
+        usage = mock_enqueue_usage.call_args[0][0]
+        assert usage['provider'] == 'claude'
+        assert usage['total_tokens'] == 300
+        assert usage['processing_time'] == 6
         mock_warning.assert_not_called()
 
-    @patch('services.summary_service.DatabaseManager')
+    @patch('services.summary_service.enqueue_usage')
     @patch('streamlit.warning')
-    def test_save_usage_to_database_exception(self, mock_warning, mock_db_manager):
+    def test_save_usage_to_database_exception(self, mock_warning, mock_enqueue_usage):
         """データベース保存エラーのテスト"""
-        mock_db_manager.get_instance.side_effect = Exception("DB接続エラー")
+        mock_enqueue_usage.side_effect = Exception("DB接続エラー")
 
         result = {
             'model_detail': 'claude-3-sonnet',
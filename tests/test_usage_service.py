@@ -0,0 +1,251 @@
+import datetime
+import logging
+from unittest.mock import patch
+
+import pytest
+
+from database.db import DatabaseManager
+from database.models import SummaryUsage, SummaryUsageDaily
+from services.usage_service import JST, UsageWriter, build_daily_rows, replay_spilled_usage, save_usage_records
+from utils.exceptions import DatabaseError
+
+
+def _usage(date, provider="claude", department="内科", doctor="田中医師", document_types="退院時サマリ",
+           input_tokens=100, output_tokens=50, processing_time=3):
+    return {
+        "date": date,
+        "app_type": "test",
+        "document_types": document_types,
+        "model_detail": "Claude",
+        "provider": provider,
+        "department": department,
+        "doctor": doctor,
+        "input_tokens": input_tokens,
+        "output_tokens": output_tokens,
+        "total_tokens": input_tokens + output_tokens,
+        "processing_time": processing_time
+    }
+
+
+class TestBuildDailyRows:
+    """日次集計行の作成のテスト"""
+
+    def test_build_daily_rows_groups_by_key(self):
+        """同じ集計キーの利用記録が合計されるテスト"""
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        rows = build_daily_rows([_usage(date), _usage(date, input_tokens=200), _usage(date, doctor="医師B")])
+
+        assert len(rows) == 2
+        totals = next(row for row in rows if row["doctor"] == "田中医師")
+        assert totals["count"] == 2
+        assert totals["input_tokens"] == 300
+        assert totals["total_tokens"] == 400
+
+    def test_build_daily_rows_uses_jst_day(self):
+        """UTCの日付ではなくJSTの日付で集計されるテスト"""
+        date = datetime.datetime(2025, 3, 31, 16, 0, tzinfo=datetime.timezone.utc)
+        rows = build_daily_rows([_usage(date)])
+
+        assert rows[0]["day"] == datetime.date(2025, 4, 1)
+
+    def test_build_daily_rows_fills_missing_keys(self):
+        """未設定のキーが一意制約で比較できる値に置き換えられるテスト"""
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        rows = build_daily_rows([_usage(date, provider=None, department=None, doctor=None, document_types=None)])
+
+        assert rows[0]["provider"] == ""
+        assert rows[0]["department"] == "default"
+        assert rows[0]["doctor"] == "default"
+        assert rows[0]["document_types"] == ""
+
+
+class TestSaveUsageRecords:
+    """利用記録の保存のテスト"""
+
+    def test_save_usage_records_updates_daily_rollup(self, db_manager):
+        """利用記録の保存時に日次集計が加算されるテスト"""
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+
+        save_usage_records([_usage(date)])
+        save_usage_records([_usage(date, input_tokens=200, processing_time=5), _usage(date, provider="gemini")])
+
+        assert db_manager.count(SummaryUsage) == 3
+        daily = db_manager.query_one(SummaryUsageDaily, {"provider": "claude"})
+        assert daily["count"] == 2
+        assert daily["input_tokens"] == 300
+        assert daily["output_tokens"] == 100
+        assert daily["processing_time"] == 8
+        assert db_manager.count(SummaryUsageDaily) == 2
+
+    def test_save_usage_records_empty(self, db_manager):
+        """空のリストでは何も保存しないテスト"""
+        save_usage_records([])
+
+        assert db_manager.count(SummaryUsage) == 0
+        assert db_manager.count(SummaryUsageDaily) == 0
+
+
+class TestUsageWriter:
+    """利用記録のバックグラウンド保存のテスト"""
+
+    @patch('services.usage_service.save_usage_records')
+    def test_flush_by_batch_size(self, mock_save):
+        """batch_size件ごとにまとめて保存されるテスト"""
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        writer = UsageWriter(batch_size=2, flush_interval=10)
+
+        for _ in range(5):
+            writer.enqueue(_usage(date))
+        writer.close(timeout=5)
+
+        saved = [len(call.args[0]) for call in mock_save.call_args_list]
+        assert sum(saved) == 5
+        assert max(saved) <= 2
+        stats = writer.stats()
+        assert stats["written"] == 5
+        assert stats["queue_depth"] == 0
+
+    @patch('services.usage_service.save_usage_records')
+    def test_flush_by_interval(self, mock_save):
+        """batch_sizeに満たなくてもflush_interval経過後に保存されるテスト"""
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        writer = UsageWriter(batch_size=100, flush_interval=0.05)
+
+        writer.enqueue(_usage(date))
+        for _ in range(100):
+            if mock_save.called:
+                break
+            writer._stop_event.wait(0.02)
+
+        mock_save.assert_called_once()
+        writer.close(timeout=5)
+
+    @patch('services.usage_service.save_usage_records')
+    def test_enqueue_saves_synchronously_when_queue_full(self, mock_save):
+        """キューが満杯の場合は呼び出し元で保存されるテスト"""
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        writer = UsageWriter(batch_size=10, flush_interval=10, max_queue_size=1)
+        writer._queue.put_nowait(_usage(date))
+
+        with patch.object(writer, 'start'):
+            writer.enqueue(_usage(date, provider="gemini"))
+
+        mock_save.assert_called_once()
+        assert mock_save.call_args.args[0][0]["provider"] == "gemini"
+
+    @patch('services.usage_service.save_usage_records')
+    def test_failed_flush_is_spilled_on_close(self, mock_save, tmp_path):
+        """保存に失敗し続けた記録が終了時にファイルへ退避されるテスト"""
+        mock_save.side_effect = Exception("DB error")
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        spill_path = tmp_path / "usage_records.jsonl"
+        writer = UsageWriter(batch_size=10, flush_interval=10, retry_backoff=60, spill_path=str(spill_path))
+
+        writer.enqueue(_usage(date))
+        writer.close(timeout=5)
+
+        stats = writer.stats()
+        assert stats["written"] == 0
+        assert stats["spilled"] == 1
+        assert stats["pending_retry"] == 0
+        assert stats["last_flush_seconds"] is not None
+        assert len(spill_path.read_text(encoding="utf-8").splitlines()) == 1
+
+    @patch('services.usage_service.save_usage_records')
+    def test_stats_are_logged_periodically(self, mock_save, caplog):
+        """stats_interval秒ごとに書き込みスレッドから保存状況がログに出力されるテスト"""
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        writer = UsageWriter(batch_size=1, flush_interval=0.01, stats_interval=0.01)
+
+        with caplog.at_level(logging.INFO, logger="services.usage_service"):
+            writer.enqueue(_usage(date))
+            for _ in range(100):
+                if any("保存状況" in record.getMessage() for record in caplog.records):
+                    break
+                writer._stop_event.wait(0.02)
+            writer.close(timeout=5)
+
+        [record, *_] = [record for record in caplog.records if "保存状況" in record.getMessage()]
+        assert record.levelno == logging.INFO
+
+    def test_stats_log_warns_on_new_spills(self, caplog):
+        """前回のログ出力から退避が増えた場合のみ警告となるテスト"""
+        writer = UsageWriter()
+        writer._spilled = 1
+
+        with caplog.at_level(logging.INFO, logger="services.usage_service"):
+            writer._log_stats()
+            writer._log_stats()
+
+        assert [record.levelno for record in caplog.records] == [logging.WARNING, logging.INFO]
+        assert "退避 1件" in caplog.records[0].getMessage()
+
+    def test_stats_are_rendered_in_debug_panel(self):
+        """デバッグパネルに保存状況が表示され、退避がある場合は警告されるテスト"""
+        from ui_components.query_debug import render_usage_writer_stats
+
+        writer = UsageWriter()
+        writer._spilled = 2
+
+        with patch("ui_components.query_debug.st") as mock_st:
+            render_usage_writer_stats(writer.stats())
+
+        assert "退避 2件" in mock_st.warning.call_args.args[0]
+        frame = mock_st.dataframe.call_args.args[0]
+        assert frame.iloc[0]["保存 平均"] == "-"
+
+    def test_failed_batch_is_retried(self, db_manager, tmp_path):
+        """unit_of_workが失敗したバッチが破棄されず再試行で保存されるテスト"""
+        original_unit_of_work = DatabaseManager.unit_of_work
+        calls = []
+
+        def flaky_unit_of_work(self):
+            calls.append(1)
+            if len(calls) == 1:
+                raise DatabaseError("接続エラー")
+            return original_unit_of_work(self)
+
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        spill_path = tmp_path / "usage_records.jsonl"
+        writer = UsageWriter(batch_size=10, flush_interval=0.02, retry_backoff=0.01, spill_path=str(spill_path))
+
+        with patch.object(DatabaseManager, "unit_of_work", flaky_unit_of_work):
+            writer.enqueue(_usage(date))
+            writer.enqueue(_usage(date, provider="gemini"))
+            for _ in range(200):
+                if writer.stats()["written"] == 2:
+                    break
+                writer._stop_event.wait(0.02)
+            writer.close(timeout=5)
+
+        stats = writer.stats()
+        assert stats["failed"] == 2
+        assert stats["retried"] == 2
+        assert stats["written"] == 2
+        assert stats["spilled"] == 0
+        assert db_manager.count(SummaryUsage) == 2
+        assert not spill_path.exists()
+
+    def test_spilled_records_can_be_replayed(self, db_manager, tmp_path):
+        """再試行の上限を超えて退避した記録を保存し直せるテスト"""
+        date = JST.localize(datetime.datetime(2025, 4, 1, 10, 0))
+        spill_path = tmp_path / "usage_records.jsonl"
+        writer = UsageWriter(batch_size=10, flush_interval=0.02, max_retries=1, retry_backoff=0.01,
+                             spill_path=str(spill_path))
+
+        with patch('services.usage_service.save_usage_records', side_effect=Exception("DB error")):
+            writer.enqueue(_usage(date))
+            for _ in range(200):
+                if writer.stats()["spilled"] == 1:
+                    break
+                writer._stop_event.wait(0.02)
+            writer.close(timeout=5)
+
+        assert writer.stats()["failed"] == 2
+        assert writer.stats()["spilled"] == 1
+
+        assert replay_spilled_usage(str(spill_path)) == 1
+        assert db_manager.count(SummaryUsage) == 1
+        assert db_manager.query_one(SummaryUsageDaily, {"provider": "claude"})["count"] == 1
+        assert not spill_path.exists()
+        assert replay_spilled_usage(str(spill_path)) == 0
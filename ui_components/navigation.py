@@ -2,8 +2,22 @@ import streamlit as st
 
 from database.db import DatabaseManager
 from database.models import AppSetting
-from utils.config import APP_TYPE, CLAUDE_API_KEY, GEMINI_MODEL, GOOGLE_CREDENTIALS_JSON, PROMPT_MANAGEMENT
-from utils.constants import DEFAULT_DEPARTMENT, DEFAULT_DOCUMENT_TYPE, DEPARTMENT_DOCTORS_MAPPING, DOCUMENT_TYPES
+from database.query_metrics import instrument_queries
+from utils.config import (
+    APP_TYPE,
+    CLAUDE_API_KEY,
+    DB_STARTUP_WAIT,
+    GEMINI_MODEL,
+    GOOGLE_CREDENTIALS_JSON,
+    PROMPT_MANAGEMENT,
+)
+from utils.constants import (
+    DEFAULT_DEPARTMENT,
+    DEFAULT_DOCUMENT_TYPE,
+    DEPARTMENT_DOCTORS_MAPPING,
+    DOCUMENT_TYPES,
+    MESSAGES,
+)
 from utils.prompt_manager import get_prompt
 
 
@@ -29,6 +43,7 @@ def update_document_model():
             st.session_state.selected_model = st.session_state.available_models[0]
 
 
+@instrument_queries("render_sidebar")
 def render_sidebar():
     departments = ["default"] + [dept for dept in DEFAULT_DEPARTMENT if dept != "default"]
 
@@ -181,12 +196,38 @@ def save_user_settings(department, model, doctor="default", document_type=DEFAUL
         print(f"設定の保存に失敗しました: {str(e)}")
 
 
+def render_database_status():
+    """データベースの接続確認が完了していない間、縮退運転中である旨を表示する"""
+    try:
+        DatabaseManager.get_instance()
+    except Exception as e:
+        st.warning(MESSAGES["DATABASE_UNAVAILABLE"].format(error=str(e)))
+        return
+
+    if DatabaseManager.is_ready():
+        return
+
+    error = DatabaseManager.readiness_error()
+    if error:
+        st.warning(MESSAGES["DATABASE_UNAVAILABLE"].format(error=error))
+    else:
+        st.info(MESSAGES["DATABASE_CONNECTING"])
+
+
 def load_user_settings():
     try:
         db_manager = DatabaseManager.get_instance()
+        # 接続確認が終わっていない場合は初回描画を優先し、保存済みの設定を使わない
+        if not db_manager.wait_until_ready(DB_STARTUP_WAIT):
+            return None, None, None, None
+
         setting_id = f"user_preferences_{APP_TYPE}"
 
-        settings = db_manager.query_one(AppSetting, {"setting_id": setting_id})
+        settings = db_manager.query_one(
+            AppSetting,
+            {"setting_id": setting_id},
+            columns=["selected_department", "selected_model", "selected_document_type", "selected_doctor"]
+        )
 
         if settings:
             return (
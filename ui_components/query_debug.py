@@ -0,0 +1,78 @@
+from typing import Any, Dict, Optional
+
+import pandas as pd
+import streamlit as st
+
+from utils.config import QUERY_BUDGET_COUNT, QUERY_BUDGET_MS
+
+
+def render_query_debug_panel(summary: Dict[str, Any], pool_stats: Optional[Dict[str, Any]] = None,
+                             writer_stats: Optional[Dict[str, Any]] = None) -> None:
+    """直前のスクリプト実行で発行されたクエリの集計とコネクションプール・利用記録の保存状況をサイドバーに表示する"""
+    over_budget = summary["count"] > QUERY_BUDGET_COUNT or summary["total_ms"] > QUERY_BUDGET_MS
+
+    with st.sidebar.expander("クエリ計測", expanded=over_budget):
+        st.caption(f"予算: {QUERY_BUDGET_COUNT}件 / {QUERY_BUDGET_MS:.0f}ms")
+        if over_budget:
+            st.warning(f"⚠️ {summary['count']}件 / {summary['total_ms']:.1f}ms で予算を超過しています")
+        else:
+            st.write(f"{summary['count']}件 / {summary['total_ms']:.1f}ms（最大 {summary['max_ms']:.1f}ms）")
+
+        if summary["children"]:
+            st.dataframe(pd.DataFrame([
+                {"処理": name, "呼び出し": totals["calls"], "クエリ数": totals["count"],
+                 "合計(ms)": round(totals["total_ms"], 1)}
+                for name, totals in summary["children"].items()
+            ]), hide_index=True)
+
+        if summary["by_fingerprint"]:
+            st.dataframe(pd.DataFrame([
+                {"回数": item["count"], "合計(ms)": round(item["total_ms"], 1), "行数": item["rows"],
+                 "SQL": item["fingerprint"]}
+                for item in summary["by_fingerprint"]
+            ]), hide_index=True)
+
+        if pool_stats is not None:
+            render_pool_stats(pool_stats)
+        if writer_stats is not None:
+            render_usage_writer_stats(writer_stats)
+
+
+def _format_ms(value: Optional[float]) -> str:
+    return "-" if value is None else f"{value:.1f}ms"
+
+
+def render_pool_stats(pool_stats: Dict[str, Any]) -> None:
+    """コネクションプールの使用状況とチェックアウト待ち時間を表示する"""
+    st.caption("コネクションプール")
+    if "pool_size" in pool_stats:
+        st.write(f"使用中 {pool_stats['checked_out']} / プール {pool_stats['pool_size']}"
+                 f"（オーバーフロー {pool_stats['overflow']} / {pool_stats.get('max_overflow', '-')}）")
+    if pool_stats["timeouts"]:
+        st.warning(f"⚠️ 接続待ちのタイムアウトが{pool_stats['timeouts']}件発生しています")
+    st.dataframe(pd.DataFrame([{
+        "待ち p50": _format_ms(pool_stats["wait_p50_ms"]),
+        "p95": _format_ms(pool_stats["wait_p95_ms"]),
+        "p99": _format_ms(pool_stats["wait_p99_ms"]),
+        "最大": _format_ms(pool_stats["wait_max_ms"]),
+        "接続": pool_stats["connects"],
+        "チェックアウト": pool_stats["checkouts"],
+        "無効化": pool_stats["invalidations"],
+    }]), hide_index=True)
+
+
+def render_usage_writer_stats(writer_stats: Dict[str, Any]) -> None:
+    """利用記録のバックグラウンド保存の滞留件数と失敗・退避件数を表示する"""
+    st.caption("利用記録の保存")
+    if writer_stats["pending_retry"] or writer_stats["spilled"] or writer_stats["lost"]:
+        st.warning(f"⚠️ 再試行待ち {writer_stats['pending_retry']}件 / 退避 {writer_stats['spilled']}件 / "
+                   f"消失 {writer_stats['lost']}件")
+    avg_flush_seconds = writer_stats["avg_flush_seconds"]
+    st.dataframe(pd.DataFrame([{
+        "滞留": writer_stats["queue_depth"],
+        "保存": writer_stats["written"],
+        "失敗": writer_stats["failed"],
+        "再試行": writer_stats["retried"],
+        "保存 平均": _format_ms(None if avg_flush_seconds is None else avg_flush_seconds * 1000),
+        "最大": _format_ms(writer_stats["max_flush_seconds"] * 1000),
+    }]), hide_index=True)
@@ -0,0 +1,111 @@
+import threading
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from cachetools import TTLCache
+
+
+class _CountingTTLCache(TTLCache):
+    """容量超過による追い出しと期限切れの件数を数えるTTLCache"""
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__(maxsize=maxsize, ttl=ttl)
+        self.evictions = 0
+        self.expirations = 0
+
+    def popitem(self):
+        item = super().popitem()
+        self.evictions += 1
+        return item
+
+    def expire(self, time=None):
+        expired = super().expire(time)
+        self.expirations += len(expired)
+        return expired
+
+
+class LRUTTLCache:
+    """
+    スレッドセーフなLRU+TTLキャッシュ
+
+    Noneも値としてキャッシュする。無効化と読み込みが競合した場合は、
+    無効化より前に開始した読み込み結果を保存しない。
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = _CountingTTLCache(maxsize=maxsize, ttl=ttl)
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._hits = 0
+        self._misses = 0
+        self._invalidations = 0
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]) -> Any:
+        """
+        キャッシュから値を取得し、存在しない場合はloaderで読み込んで保存する
+
+        Args:
+            key: キャッシュキー
+            loader: キャッシュミス時に呼び出す読み込み関数
+
+        Returns:
+            キャッシュ済みまたは読み込んだ値
+        """
+        with self._lock:
+            if key in self._cache:
+                self._hits += 1
+                return self._cache[key]
+            self._misses += 1
+            generation = self._generation
+
+        value = loader()
+
+        with self._lock:
+            if generation == self._generation:
+                self._cache[key] = value
+        return value
+
+    def invalidate(self, key: Hashable) -> None:
+        """指定したキーを無効化する"""
+        with self._lock:
+            self._generation += 1
+            self._invalidations += 1
+            self._cache.pop(key, None)
+
+    def invalidate_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """
+        条件に一致するキーをまとめて無効化する
+
+        Returns:
+            無効化したエントリ数
+        """
+        with self._lock:
+            self._generation += 1
+            keys = [key for key in list(self._cache.keys()) if predicate(key)]
+            for key in keys:
+                self._cache.pop(key, None)
+            self._invalidations += len(keys)
+            return len(keys)
+
+    def clear(self) -> None:
+        """全エントリを無効化する"""
+        with self._lock:
+            self._generation += 1
+            self._invalidations += len(self._cache)
+            self._cache.clear()
+
+    def stats(self) -> Dict[str, Optional[float]]:
+        """ヒット・ミス・追い出し件数などの統計を返す"""
+        with self._lock:
+            self._cache.expire()
+            lookups = self._hits + self._misses
+            return {
+                "hits": self._hits,
+                "misses": self._misses,
+                "hit_rate": self._hits / lookups if lookups else None,
+                "evictions": self._cache.evictions,
+                "expirations": self._cache.expirations,
+                "invalidations": self._invalidations,
+                "size": len(self._cache),
+                "maxsize": self._cache.maxsize,
+                "ttl": self._cache.ttl,
+            }
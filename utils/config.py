@@ -68,6 +68,32 @@ SELECTED_AI_MODEL: str = os.environ.get("SELECTED_AI_MODEL", "claude")
 MAX_INPUT_TOKENS: int = int(os.environ.get("MAX_INPUT_TOKENS", "300000"))
 MIN_INPUT_TOKENS: int = int(os.environ.get("MIN_INPUT_TOKENS", "100"))
 MAX_TOKEN_THRESHOLD: int = int(os.environ.get("MAX_TOKEN_THRESHOLD", "100000"))
+DB_POOL_SIZE: int = int(os.environ.get("DB_POOL_SIZE", "5"))
+DB_MAX_OVERFLOW: int = int(os.environ.get("DB_MAX_OVERFLOW", "10"))
+DB_POOL_TIMEOUT: int = int(os.environ.get("DB_POOL_TIMEOUT", "30"))
+DB_POOL_RECYCLE: int = int(os.environ.get("DB_POOL_RECYCLE", "3600"))
+DB_PROBE_MAX_INTERVAL: float = float(os.environ.get("DB_PROBE_MAX_INTERVAL", "30"))
+DB_STARTUP_WAIT: float = float(os.environ.get("DB_STARTUP_WAIT", "1.0"))
 PROMPT_MANAGEMENT: bool = os.environ.get("PROMPT_MANAGEMENT", "False").lower() == "true"
+PROMPT_CACHE_MAXSIZE: int = int(os.environ.get("PROMPT_CACHE_MAXSIZE", "512"))
+PROMPT_CACHE_TTL: int = int(os.environ.get("PROMPT_CACHE_TTL", "300"))
+STATISTICS_CACHE_MAXSIZE: int = int(os.environ.get("STATISTICS_CACHE_MAXSIZE", "256"))
+STATISTICS_CACHE_TTL: int = int(os.environ.get("STATISTICS_CACHE_TTL", "600"))
+USAGE_WRITER_BATCH_SIZE: int = int(os.environ.get("USAGE_WRITER_BATCH_SIZE", "50"))
+USAGE_WRITER_FLUSH_INTERVAL: float = float(os.environ.get("USAGE_WRITER_FLUSH_INTERVAL", "2.0"))
+USAGE_WRITER_MAX_QUEUE_SIZE: int = int(os.environ.get("USAGE_WRITER_MAX_QUEUE_SIZE", "10000"))
+USAGE_WRITER_MAX_RETRIES: int = int(os.environ.get("USAGE_WRITER_MAX_RETRIES", "5"))
+USAGE_WRITER_RETRY_BACKOFF: float = float(os.environ.get("USAGE_WRITER_RETRY_BACKOFF", "1.0"))
+USAGE_WRITER_SPILL_PATH: str = os.environ.get("USAGE_WRITER_SPILL_PATH", "spill/usage_records.jsonl")
+USAGE_WRITER_STATS_INTERVAL: float = float(os.environ.get("USAGE_WRITER_STATS_INTERVAL", "300"))
+USAGE_EXPORT_TTL: int = int(os.environ.get("USAGE_EXPORT_TTL", "900"))
+USAGE_EXPORT_MAX_BYTES: int = int(os.environ.get("USAGE_EXPORT_MAX_BYTES", str(100 * 1024 * 1024)))
+SUMMARY_USAGE_PARTITION_MONTHS_AHEAD: int = int(os.environ.get("SUMMARY_USAGE_PARTITION_MONTHS_AHEAD", "3"))
+SUMMARY_USAGE_RETENTION_MONTHS: int = int(os.environ.get("SUMMARY_USAGE_RETENTION_MONTHS", "24"))
+SUMMARY_USAGE_ARCHIVE_DIR: str = os.environ.get("SUMMARY_USAGE_ARCHIVE_DIR", "archive/summary_usage")
+QUERY_DEBUG: bool = os.environ.get("QUERY_DEBUG", "False").lower() == "true"
+QUERY_BUDGET_COUNT: int = int(os.environ.get("QUERY_BUDGET_COUNT", "30"))
+QUERY_BUDGET_MS: float = float(os.environ.get("QUERY_BUDGET_MS", "500"))
+CACHE_INVALIDATION_BACKEND: str = os.environ.get("CACHE_INVALIDATION_BACKEND", "postgres").lower()
 
 APP_TYPE: str = os.environ.get("APP_TYPE", "default")
@@ -47,13 +47,17 @@ MESSAGES = {
     "DATABASE_CONNECTION_INFO_MISSING": "PostgreSQL接続情報が設定されていません。環境変数または設定ファイルを確認してください。",
     "DATABASE_CONNECTION_ERROR": "PostgreSQLへの接続に失敗しました: {error}",
     "DATABASE_NOT_INITIALIZED": "データベース接続が初期化されていません",
+    "DATABASE_CONNECTING": "⚠️ データベースに接続しています。接続が完了するまで保存済みの設定や統計情報は利用できません。",
+    "DATABASE_UNAVAILABLE": "⚠️ データベースに接続できません。再接続を試行しています: {error}",
     "DATABASE_QUERY_ERROR": "クエリ実行中にエラーが発生しました: {error}",
     "DATABASE_GET_RECORD_ERROR": "レコード取得中にエラーが発生しました: {error}",
     "DATABASE_INSERT_ERROR": "レコード挿入中にエラーが発生しました: {error}",
     "DATABASE_UPDATE_ERROR": "レコード更新中にエラーが発生しました: {error}",
     "DATABASE_UPSERT_ERROR": "レコードのupsert中にエラーが発生しました: {error}",
     "DATABASE_DELETE_ERROR": "レコード削除中にエラーが発生しました: {error}",
+    "DATABASE_FILTER_REQUIRED": "条件を指定せずに一括で更新・削除することはできません",
     "DATABASE_COUNT_ERROR": "カウント実行中にエラーが発生しました: {error}",
+    "DATABASE_TRANSACTION_ERROR": "トランザクションのコミット中にエラーが発生しました: {error}",
     "DATABASE_TABLE_CREATE_ERROR": "テーブル作成中にエラーが発生しました: {error}",
     "DATABASE_INIT_FAILED": "データベースの初期化に失敗しました: {error}",
 
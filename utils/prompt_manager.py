@@ -3,11 +3,18 @@ from typing import Any, Dict, List, Optional, Tuple
 
 from database.db import DatabaseManager
 from database.models import Prompt
+from database.notifier import publish_invalidation, register_invalidation_handler, start_invalidation_listener
 from database.schema import initialize_database as init_schema
-from utils.config import get_config
+from utils.cache import LRUTTLCache
+from utils.config import PROMPT_CACHE_MAXSIZE, PROMPT_CACHE_TTL, get_config
 from utils.constants import DEFAULT_DEPARTMENT, DEFAULT_DOCUMENT_TYPE, DEPARTMENT_DOCTORS_MAPPING, DOCUMENT_TYPES
 from utils.exceptions import AppError, DatabaseError
 
+_prompt_cache = LRUTTLCache(maxsize=PROMPT_CACHE_MAXSIZE, ttl=PROMPT_CACHE_TTL)
+
+# 文書作成時に参照する列のみ取得し、プロンプト以外の列を読み込まない
+PROMPT_COLUMNS = ["content", "selected_model"]
+
 
 def get_db_manager() -> DatabaseManager:
     try:
@@ -32,38 +39,120 @@ def get_all_prompts() -> List[Dict[str, Any]]:
         raise DatabaseError(f"プロンプト一覧の取得に失敗しました: {str(e)}")
 
 
+def get_prompt_cache_stats() -> Dict[str, Any]:
+    return _prompt_cache.stats()
+
+
+def invalidate_prompt_cache(department: str, document_type: str, doctor: str) -> None:
+    """
+    プロンプトキャッシュを無効化する
+
+    デフォルトプロンプトは他の組み合わせのフォールバック先として
+    キャッシュされているため、変更時はキャッシュ全体を破棄する
+    """
+    if department == "default" and document_type == DEFAULT_DOCUMENT_TYPE and doctor == "default":
+        _prompt_cache.clear()
+    else:
+        _prompt_cache.invalidate((department, document_type, doctor))
+
+
+def clear_prompt_cache() -> None:
+    _prompt_cache.clear()
+
+
+def _notify_prompt_changed(department: str, document_type: str, doctor: str) -> None:
+    invalidate_prompt_cache(department, document_type, doctor)
+    publish_invalidation(Prompt.__name__, (department, document_type, doctor))
+
+
+def _handle_cache_invalidation(message: Dict[str, Any]) -> None:
+    if message.get("model") not in (None, Prompt.__name__):
+        return
+
+    key = message.get("key")
+    if key is None:
+        _prompt_cache.clear()
+    else:
+        invalidate_prompt_cache(*key)
+
+
+register_invalidation_handler(_handle_cache_invalidation)
+
+
 def get_prompt(
         department: str = "default",
         document_type: str = DEFAULT_DOCUMENT_TYPE,
         doctor: str = "default"
 ) -> Optional[Dict[str, Any]]:
+    start_invalidation_listener()
+    prompt = _prompt_cache.get_or_load(
+        (department, document_type, doctor),
+        lambda: _load_prompt(department, document_type, doctor)
+    )
+    return dict(prompt) if prompt else prompt
+
+
+def _load_prompt(department: str, document_type: str, doctor: str) -> Optional[Dict[str, Any]]:
     try:
         db_manager = get_db_manager()
 
-        prompt = db_manager.query_one(
+        return db_manager.query_first_match(
             Prompt,
-            {
-            "department": department,
-            "document_type": document_type,
-            "doctor": doctor
-        })
-
-        if not prompt:
-            prompt = db_manager.query_one(
-                Prompt,
+            [
                 {
-                "department": "default",
-                "document_type": DEFAULT_DOCUMENT_TYPE,
-                "doctor": "default",
-                "is_default": True
-            })
-
-        return prompt
+                    "department": department,
+                    "document_type": document_type,
+                    "doctor": doctor
+                },
+                {
+                    "department": "default",
+                    "document_type": DEFAULT_DOCUMENT_TYPE,
+                    "doctor": "default",
+                    "is_default": True
+                }
+            ],
+            columns=PROMPT_COLUMNS
+        )
 
     except Exception as e:
         raise DatabaseError(f"プロンプトの取得に失敗しました: {str(e)}")
 
 
+def resolve_prompt(
+        department: str = "default",
+        document_type: str = DEFAULT_DOCUMENT_TYPE,
+        doctor: str = "default"
+) -> Dict[str, Any]:
+    """
+    1回の作成リクエストで使い回すプロンプトを解決する
+
+    Args:
+        department: 診療科
+        document_type: 文書タイプ
+        doctor: 医師名
+
+    Returns:
+        content(プロンプト本文)とselected_model(プロンプトで指定されたモデル)を含む辞書
+    """
+    prompt_data = get_prompt(department, document_type, doctor)
+
+    if prompt_data:
+        content = prompt_data["content"]
+        selected_model = prompt_data.get("selected_model")
+    else:
+        config = get_config()
+        content = config['PROMPTS']['summary']
+        selected_model = None
+
+    return {
+        "department": department,
+        "document_type": document_type,
+        "doctor": doctor,
+        "content": content,
+        "selected_model": selected_model
+    }
+
+
 def create_or_update_prompt(
         department: str,
         document_type: str,
@@ -96,31 +185,21 @@ def create_or_update_prompt(
             "doctor": doctor
         }
 
-        existing = db_manager.query_one(Prompt, filters)
+        # 一意インデックス(department, document_type, doctor)に対するINSERT ... ON CONFLICT DO UPDATEで
+        # 同時に保存しても重複や一意制約違反が起きないようにする。
+        # 作成日時と更新日時はDB側で設定され、新規作成時のみ同じ値になる
+        record = db_manager.upsert(
+            Prompt,
+            filters,
+            {
+            "content": content,
+            "selected_model": selected_model
+        })
 
-        if existing:
-            db_manager.update(
-                Prompt,
-                filters,
-                {
-                "content": content,
-                "selected_model": selected_model
-            })
+        _notify_prompt_changed(department, document_type, doctor)
+        if record["created_at"] != record["updated_at"]:
             return True, "プロンプトを更新しました"
         else:
-            now = get_current_datetime()
-            db_manager.insert(
-                Prompt,
-                {
-                "department": department,
-                "document_type": document_type,
-                "doctor": doctor,
-                "content": content,
-                "selected_model": selected_model,
-                "is_default": False,
-                "created_at": now,
-                "updated_at": now
-            })
             return True, "プロンプトを新規作成しました"
 
     except DatabaseError as e:
@@ -140,7 +219,7 @@ def delete_prompt(
 
         db_manager = get_db_manager()
 
-        deleted = db_manager.delete(
+        deleted = db_manager.delete_where(
             Prompt,
             {
             "department": department,
@@ -149,6 +228,7 @@ def delete_prompt(
         })
 
         if deleted:
+            _notify_prompt_changed(department, document_type, doctor)
             return True, "プロンプトを削除しました"
         else:
             return False, "プロンプトが見つかりません"
@@ -170,7 +250,7 @@ def initialize_default_prompt() -> None:
             "document_type": DEFAULT_DOCUMENT_TYPE,
             "doctor": "default",
             "is_default": True
-        })
+        }, columns=["id"])
 
         if not default_prompt:
             config = get_config()
@@ -202,32 +282,27 @@ def initialize_database() -> None:
         default_prompt_content = config['PROMPTS']['summary']
         departments = DEFAULT_DEPARTMENT
         document_types = DOCUMENT_TYPES
+        now = get_current_datetime()
 
+        rows = []
         for dept in departments:
             doctors = DEPARTMENT_DOCTORS_MAPPING.get(dept, ["default"])
             for doctor in doctors:
                 for doc_type in document_types:
-                    existing = db_manager.query_one(
-                        Prompt,
-                        {
+                    rows.append({
                         "department": dept,
                         "document_type": doc_type,
-                        "doctor": doctor
+                        "doctor": doctor,
+                        "content": default_prompt_content,
+                        "is_default": False,
+                        "created_at": now,
+                        "updated_at": now
                     })
 
-                    if not existing:
-                        now = get_current_datetime()
-                        db_manager.insert(
-                            Prompt,
-                            {
-                            "department": dept,
-                            "document_type": doc_type,
-                            "doctor": doctor,
-                            "content": default_prompt_content,
-                            "is_default": False,
-                            "created_at": now,
-                            "updated_at": now
-                        })
+        db_manager.insert_missing(Prompt, rows, ["department", "document_type", "doctor"])
+
+        clear_prompt_cache()
+        publish_invalidation(Prompt.__name__)
 
     except Exception as e:
         raise DatabaseError(f"データベースの初期化に失敗しました: {str(e)}")
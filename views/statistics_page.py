@@ -1,18 +1,39 @@
+import csv
 import datetime
-from typing import Any, Dict, List
+import logging
+import os
+import secrets
+import tempfile
+import threading
+import time
+from pathlib import Path
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Tuple
 
 import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
 import pytz
 import streamlit as st
-from sqlalchemy import and_, func
+from sqlalchemy import BigInteger, Float, and_, cast, func, or_, select
 
 from database.db import DatabaseManager
-from database.models import SummaryUsage
+from database.models import SummaryUsage, SummaryUsageDaily
+from database.notifier import register_invalidation_handler, start_invalidation_listener
+from database.query_metrics import instrument_queries
 from ui_components.navigation import change_page
+from utils.cache import LRUTTLCache
+from utils.config import (
+    STATISTICS_CACHE_MAXSIZE,
+    STATISTICS_CACHE_TTL,
+    USAGE_EXPORT_MAX_BYTES,
+    USAGE_EXPORT_TTL,
+)
 from utils.constants import DOCUMENT_TYPE_OPTIONS
 from utils.error_handlers import handle_error
 from utils.exceptions import DatabaseError
 
+logger = logging.getLogger(__name__)
+
 JST = pytz.timezone('Asia/Tokyo')
 
 MODEL_MAPPING = {
@@ -20,6 +41,178 @@ MODEL_MAPPING = {
     "Claude": "claude",
 }
 
+USAGE_PAGE_SIZES = [50, 100, 200]
+
+DEPARTMENT_COLUMNS = ["文書名", "診療科", "医師名", "作成件数", "入力トークン", "出力トークン", "合計トークン"]
+DETAIL_COLUMNS = ["作成日", "文書名", "診療科", "医師名", "AIモデル", "入力トークン", "出力トークン", "処理時間(秒)"]
+
+LATENCY_BUCKETS = {
+    "日": "day",
+    "週": "week",
+    "月": "month",
+}
+LATENCY_GROUPS = {
+    "AIモデル別": "provider",
+    "文書名別": "document_types",
+}
+LATENCY_METRICS = {
+    "処理時間 p50(秒)": "p50",
+    "処理時間 p95(秒)": "p95",
+    "処理時間 p99(秒)": "p99",
+    "出力トークン/秒": "output_tokens_per_second",
+}
+
+_statistics_cache = LRUTTLCache(maxsize=STATISTICS_CACHE_MAXSIZE, ttl=STATISTICS_CACHE_TTL)
+
+# エクスポートのトークンごとのダウンロード用データ
+_exports: Dict[str, Dict[str, Any]] = {}
+_exports_lock = threading.Lock()
+_export_sweeper: Optional[threading.Thread] = None
+
+EXPORT_BATCH_SIZE = 5000
+# download_buttonに渡すデータはメモリに保持されるため、エクスポートの大きさを制限する
+EXPORT_MAX_BYTES = USAGE_EXPORT_MAX_BYTES
+# 期限切れのエクスポートを削除する間隔(秒)
+EXPORT_SWEEP_INTERVAL = 60
+EXPORT_FORMATS = {
+    "csv": "text/csv",
+    "parquet": "application/vnd.apache.parquet",
+}
+EXPORT_COLUMNS = [
+    "id", "date", "app_type", "document_types", "model_detail", "provider", "department", "doctor",
+    "input_tokens", "output_tokens", "total_tokens", "processing_time",
+]
+EXPORT_PARQUET_SCHEMA = pa.schema([
+    ("id", pa.int64()),
+    ("date", pa.timestamp("us", tz="Asia/Tokyo")),
+    ("app_type", pa.string()),
+    ("document_types", pa.string()),
+    ("model_detail", pa.string()),
+    ("provider", pa.string()),
+    ("department", pa.string()),
+    ("doctor", pa.string()),
+    ("input_tokens", pa.int64()),
+    ("output_tokens", pa.int64()),
+    ("total_tokens", pa.int64()),
+    ("processing_time", pa.int64()),
+])
+
+
+def to_jst(value: datetime.datetime) -> datetime.datetime:
+    """タイムゾーンなしの日時はJSTとみなし、JSTの日時にする"""
+    if value.tzinfo is None:
+        return JST.localize(value)
+    return value.astimezone(JST)
+
+
+def jst_period(start_date: datetime.date, end_date: datetime.date) -> Tuple[datetime.datetime, datetime.datetime]:
+    """
+    開始日0時から終了日の終わりまでの期間をJSTの日時で返す
+
+    summary_usage（timestamptz）の検索条件とsummary_usage_daily（JSTの日付）の検索条件を
+    同じ日時から作ることで、DBのタイムゾーン設定にかかわらず集計と詳細の期間を一致させる
+    """
+    return (
+        JST.localize(datetime.datetime.combine(start_date, datetime.time.min)),
+        JST.localize(datetime.datetime.combine(end_date, datetime.time.max))
+    )
+
+
+def build_usage_filters(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str
+) -> List[Any]:
+    """summary_usageの検索条件を構築する"""
+    filters = [
+        SummaryUsage.date >= to_jst(start_datetime),
+        SummaryUsage.date <= to_jst(end_datetime)
+    ]
+
+    if selected_model != "すべて":
+        provider = MODEL_MAPPING.get(selected_model)
+        if provider:
+            filters.append(SummaryUsage.provider == provider)
+
+    if selected_document_type != "すべて":
+        if selected_document_type == "不明":
+            filters.append(SummaryUsage.document_types.is_(None))
+        else:
+            filters.append(SummaryUsage.document_types == selected_document_type)
+
+    return filters
+
+
+def build_daily_filters(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str
+) -> List[Any]:
+    """summary_usage_dailyの検索条件を構築する"""
+    filters = [
+        SummaryUsageDaily.day >= to_jst(start_datetime).date(),
+        SummaryUsageDaily.day <= to_jst(end_datetime).date()
+    ]
+
+    if selected_model != "すべて":
+        provider = MODEL_MAPPING.get(selected_model)
+        if provider:
+            filters.append(SummaryUsageDaily.provider == provider)
+
+    if selected_document_type != "すべて":
+        if selected_document_type == "不明":
+            filters.append(SummaryUsageDaily.document_types == "")
+        else:
+            filters.append(SummaryUsageDaily.document_types == selected_document_type)
+
+    return filters
+
+
+def _sum(column) -> Any:
+    # PostgreSQLではbigintのSUMがnumeric(Decimal)になるため整数に戻す
+    return cast(func.sum(column), BigInteger)
+
+
+def get_statistics_cache_stats() -> Dict[str, Any]:
+    return _statistics_cache.stats()
+
+
+def clear_statistics_cache() -> None:
+    _statistics_cache.clear()
+
+
+def invalidate_statistics_cache(days: Iterable[datetime.date]) -> int:
+    """
+    指定した日を期間に含む統計キャッシュを無効化する
+
+    キャッシュキーは(種別, 開始日時, 終了日時, ...)の形式
+
+    Returns:
+        無効化したエントリ数
+    """
+    days = list(days)
+
+    def contains_any_day(key: Any) -> bool:
+        return any(key[1].date() <= day <= key[2].date() for day in days)
+
+    return _statistics_cache.invalidate_where(contains_any_day)
+
+
+def _handle_cache_invalidation(message: Dict[str, Any]) -> None:
+    if message.get("model") not in (None, SummaryUsage.__name__):
+        return
+
+    key = message.get("key")
+    if key is None:
+        _statistics_cache.clear()
+    else:
+        invalidate_statistics_cache(datetime.date.fromisoformat(day) for day in key)
+
+
+register_invalidation_handler(_handle_cache_invalidation)
+
 
 def get_usage_statistics(
         start_datetime: datetime.datetime,
@@ -27,67 +220,57 @@ def get_usage_statistics(
         selected_model: str,
         selected_document_type: str
 ) -> Dict[str, Any]:
+    start_invalidation_listener()
+    return _statistics_cache.get_or_load(
+        ("statistics", start_datetime, end_datetime, selected_model, selected_document_type),
+        lambda: _load_usage_statistics(start_datetime, end_datetime, selected_model, selected_document_type)
+    )
+
+
+def _load_usage_statistics(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str
+) -> Dict[str, Any]:
 
     db_manager = DatabaseManager.get_instance()
     session = db_manager.get_session()
 
     try:
-        # 基本フィルタを構築
-        filters = [
-            SummaryUsage.date >= start_datetime,
-            SummaryUsage.date <= end_datetime
-        ]
-
-        # モデルフィルタを追加
-        if selected_model != "すべて":
-            pattern = MODEL_MAPPING.get(selected_model)
-            if pattern:
-                filters.append(SummaryUsage.model_detail.ilike(f"%{pattern}%"))
-
-        # 文書タイプフィルタを追加
-        if selected_document_type != "すべて":
-            if selected_document_type == "不明":
-                filters.append(SummaryUsage.document_types.is_(None))
-            else:
-                filters.append(SummaryUsage.document_types == selected_document_type)
+        daily_filters = build_daily_filters(start_datetime, end_datetime, selected_model, selected_document_type)
 
+        # 集計値は日次集計テーブルから取得し、期間の長さによらず日数×キー数の行だけを読む
         total_query = session.query(
-            func.count(SummaryUsage.id).label("count"),
-            func.sum(SummaryUsage.input_tokens).label("total_input_tokens"),
-            func.sum(SummaryUsage.output_tokens).label("total_output_tokens"),
-            func.sum(SummaryUsage.total_tokens).label("total_tokens")
-        ).filter(and_(*filters))
+            func.coalesce(_sum(SummaryUsageDaily.count), 0).label("count"),
+            _sum(SummaryUsageDaily.input_tokens).label("total_input_tokens"),
+            _sum(SummaryUsageDaily.output_tokens).label("total_output_tokens"),
+            _sum(SummaryUsageDaily.total_tokens).label("total_tokens")
+        ).filter(and_(*daily_filters))
 
         total_result = total_query.first()
 
         if not total_result or total_result.count == 0:
-            return {"total": None, "by_department": [], "records": []}
+            return {"total": None, "by_department": []}
 
         # 診療科・医師・文書タイプ別の統計を取得
         dept_query = session.query(
-            func.coalesce(SummaryUsage.department, 'default').label("department"),
-            func.coalesce(SummaryUsage.doctor, 'default').label("doctor"),
-            SummaryUsage.document_types,
-            func.count(SummaryUsage.id).label("count"),
-            func.sum(SummaryUsage.input_tokens).label("input_tokens"),
-            func.sum(SummaryUsage.output_tokens).label("output_tokens"),
-            func.sum(SummaryUsage.total_tokens).label("total_tokens"),
-            func.sum(SummaryUsage.processing_time).label("processing_time")
-        ).filter(and_(*filters)).group_by(
-            SummaryUsage.department,
-            SummaryUsage.doctor,
-            SummaryUsage.document_types
-        ).order_by(func.count(SummaryUsage.id).desc())
+            SummaryUsageDaily.department,
+            SummaryUsageDaily.doctor,
+            SummaryUsageDaily.document_types,
+            _sum(SummaryUsageDaily.count).label("count"),
+            _sum(SummaryUsageDaily.input_tokens).label("input_tokens"),
+            _sum(SummaryUsageDaily.output_tokens).label("output_tokens"),
+            _sum(SummaryUsageDaily.total_tokens).label("total_tokens"),
+            _sum(SummaryUsageDaily.processing_time).label("processing_time")
+        ).filter(and_(*daily_filters)).group_by(
+            SummaryUsageDaily.department,
+            SummaryUsageDaily.doctor,
+            SummaryUsageDaily.document_types
+        ).order_by(_sum(SummaryUsageDaily.count).desc())
 
         dept_results = dept_query.all()
 
-        # 個別レコードを取得
-        records_query = session.query(SummaryUsage).filter(
-            and_(*filters)
-        ).order_by(SummaryUsage.date.desc())
-
-        records = records_query.all()
-
         return {
             "total": {
                 "count": total_result.count,
@@ -99,7 +282,7 @@ def get_usage_statistics(
                 {
                     "department": row.department,
                     "doctor": row.doctor,
-                    "document_types": row.document_types,
+                    "document_types": row.document_types or None,
                     "count": row.count,
                     "input_tokens": row.input_tokens,
                     "output_tokens": row.output_tokens,
@@ -107,19 +290,6 @@ def get_usage_statistics(
                     "processing_time": row.processing_time
                 }
                 for row in dept_results
-            ],
-            "records": [
-                {
-                    "date": record.date,
-                    "document_types": record.document_types,
-                    "model_detail": record.model_detail,
-                    "department": record.department,
-                    "doctor": record.doctor,
-                    "input_tokens": record.input_tokens,
-                    "output_tokens": record.output_tokens,
-                    "processing_time": record.processing_time
-                }
-                for record in records
             ]
         }
 
@@ -129,57 +299,451 @@ def get_usage_statistics(
         session.close()
 
 
+def get_usage_records_page(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str,
+        page_size: int,
+        cursor: Optional[Tuple[datetime.datetime, int]] = None
+) -> Dict[str, Any]:
+    """
+    詳細レコードを(date desc, id desc)順のキーセットページングで1ページ分取得する
+
+    Args:
+        start_datetime: 開始日時
+        end_datetime: 終了日時
+        selected_model: AIモデル
+        selected_document_type: 文書名
+        page_size: 1ページの件数
+        cursor: 前ページ最終行の(date, id)。Noneの場合は先頭ページ
+
+    Returns:
+        records(レコードのリスト)とnext_cursor(次ページのカーソル、最終ページの場合はNone)を含む辞書
+    """
+    start_invalidation_listener()
+    return _statistics_cache.get_or_load(
+        ("records", start_datetime, end_datetime, selected_model, selected_document_type, page_size, cursor),
+        lambda: _load_usage_records_page(
+            start_datetime, end_datetime, selected_model, selected_document_type, page_size, cursor
+        )
+    )
+
+
+def _load_usage_records_page(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str,
+        page_size: int,
+        cursor: Optional[Tuple[datetime.datetime, int]] = None
+) -> Dict[str, Any]:
+    db_manager = DatabaseManager.get_instance()
+    session = db_manager.get_session()
+
+    try:
+        filters = build_usage_filters(start_datetime, end_datetime, selected_model, selected_document_type)
+
+        if cursor is not None:
+            cursor_date, cursor_id = cursor
+            filters.append(or_(
+                SummaryUsage.date < cursor_date,
+                and_(SummaryUsage.date == cursor_date, SummaryUsage.id < cursor_id)
+            ))
+
+        # 次ページの有無を判定するため1件多く取得する
+        rows = session.query(
+            SummaryUsage.id,
+            SummaryUsage.date,
+            SummaryUsage.document_types,
+            SummaryUsage.model_detail,
+            SummaryUsage.department,
+            SummaryUsage.doctor,
+            SummaryUsage.input_tokens,
+            SummaryUsage.output_tokens,
+            SummaryUsage.processing_time
+        ).filter(and_(*filters)).order_by(
+            SummaryUsage.date.desc(),
+            SummaryUsage.id.desc()
+        ).limit(page_size + 1).all()
+
+        has_next = len(rows) > page_size
+        rows = rows[:page_size]
+
+        return {
+            "records": [dict(row._mapping) for row in rows],
+            "next_cursor": (rows[-1].date, rows[-1].id) if has_next else None
+        }
+
+    except Exception as e:
+        raise DatabaseError(f"統計データの取得に失敗しました: {str(e)}")
+    finally:
+        session.close()
+
+
+def build_latency_query(
+        session,
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str,
+        group_by: str = "provider",
+        bucket: str = "day"
+):
+    """
+    期間バケット×グループごとの処理時間パーセンタイルとスループットを集計するクエリを構築する
+
+    集計はpercentile_contとdate_truncでDB側で行い、集計結果の行だけを返す（PostgreSQLのみ）
+    """
+    if group_by not in LATENCY_GROUPS.values():
+        raise ValueError(f"未対応の集計単位です: {group_by}")
+    if bucket not in LATENCY_BUCKETS.values():
+        raise ValueError(f"未対応の期間単位です: {bucket}")
+
+    filters = build_usage_filters(start_datetime, end_datetime, selected_model, selected_document_type)
+    filters.append(SummaryUsage.processing_time.isnot(None))
+
+    bucket_column = func.date_trunc(bucket, func.timezone("Asia/Tokyo", SummaryUsage.date)).label("bucket")
+    group_column = getattr(SummaryUsage, group_by)
+
+    return session.query(
+        bucket_column,
+        group_column.label("group"),
+        func.count(SummaryUsage.id).label("count"),
+        func.percentile_cont(0.5).within_group(SummaryUsage.processing_time).label("p50"),
+        func.percentile_cont(0.95).within_group(SummaryUsage.processing_time).label("p95"),
+        func.percentile_cont(0.99).within_group(SummaryUsage.processing_time).label("p99"),
+        (
+            cast(func.sum(SummaryUsage.output_tokens), Float)
+            / func.nullif(func.sum(SummaryUsage.processing_time), 0)
+        ).label("output_tokens_per_second")
+    ).filter(and_(*filters)).group_by(
+        bucket_column,
+        group_column
+    ).order_by(bucket_column)
+
+
+def get_latency_statistics(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str,
+        group_by: str = "provider",
+        bucket: str = "day"
+) -> List[Dict[str, Any]]:
+    """
+    処理時間のp50/p95/p99と出力トークン/秒を期間バケット・グループごとに取得する
+
+    Args:
+        start_datetime: 開始日時
+        end_datetime: 終了日時
+        selected_model: AIモデル
+        selected_document_type: 文書名
+        group_by: "provider"または"document_types"
+        bucket: "day"、"week"または"month"
+
+    Returns:
+        bucket, group, count, p50, p95, p99, output_tokens_per_secondを含む辞書のリスト
+    """
+    start_invalidation_listener()
+    return _statistics_cache.get_or_load(
+        ("latency", start_datetime, end_datetime, selected_model, selected_document_type, group_by, bucket),
+        lambda: _load_latency_statistics(
+            start_datetime, end_datetime, selected_model, selected_document_type, group_by, bucket
+        )
+    )
+
+
+def _load_latency_statistics(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str,
+        group_by: str,
+        bucket: str
+) -> List[Dict[str, Any]]:
+    db_manager = DatabaseManager.get_instance()
+    session = db_manager.get_session()
+
+    try:
+        query = build_latency_query(
+            session, start_datetime, end_datetime, selected_model, selected_document_type, group_by, bucket
+        )
+        return [dict(row._mapping) for row in query.all()]
+
+    except Exception as e:
+        raise DatabaseError(f"処理時間の統計の取得に失敗しました: {str(e)}")
+    finally:
+        session.close()
+
+
+def format_latency_chart_data(latency_stats: List[Dict[str, Any]], metric: str) -> pd.DataFrame:
+    """期間バケットを行、グループを列とするグラフ用のDataFrameに変換する"""
+    if not latency_stats:
+        return pd.DataFrame()
+
+    providers = {provider: model for model, provider in MODEL_MAPPING.items()}
+    df = pd.DataFrame.from_records(latency_stats)
+    df["group"] = [providers.get(group, group) or "不明" for group in df["group"]]
+    df[metric] = df[metric].astype("float64")
+
+    return df.pivot_table(index="bucket", columns="group", values=metric, aggfunc="first").sort_index()
+
+
+def iter_usage_record_batches(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str,
+        batch_size: int = EXPORT_BATCH_SIZE
+) -> Iterator[List[Dict[str, Any]]]:
+    """
+    条件に一致するsummary_usageの行をサーバーサイドカーソルからbatch_size件ずつ取得する
+
+    Args:
+        start_datetime: 開始日時
+        end_datetime: 終了日時
+        selected_model: AIモデル
+        selected_document_type: 文書名
+        batch_size: 1回に取得する件数
+
+    Returns:
+        レコードの辞書のリストを順に返すイテレータ
+    """
+    db_manager = DatabaseManager.get_instance()
+    session = db_manager.get_session()
+
+    try:
+        filters = build_usage_filters(start_datetime, end_datetime, selected_model, selected_document_type)
+        table: Any = SummaryUsage.__table__
+
+        statement = select(*[table.c[name] for name in EXPORT_COLUMNS]).where(
+            and_(*filters)
+        ).order_by(
+            SummaryUsage.date,
+            SummaryUsage.id
+        ).execution_options(yield_per=batch_size)
+
+        for partition in session.execute(statement).partitions():
+            yield [dict(row._mapping) for row in partition]
+
+    except Exception as e:
+        raise DatabaseError(f"利用記録のエクスポートに失敗しました: {str(e)}")
+    finally:
+        session.close()
+
+
+def export_usage_records(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str,
+        export_format: str = "csv",
+        batch_size: int = EXPORT_BATCH_SIZE,
+        directory: Optional[Path] = None
+) -> str:
+    """
+    利用記録をバッチごとに一時ファイルへ書き出す（読み込みと書き込みのメモリ使用量は件数によらず一定）
+
+    Args:
+        start_datetime: 開始日時
+        end_datetime: 終了日時
+        selected_model: AIモデル
+        selected_document_type: 文書名
+        export_format: "csv"または"parquet"
+        batch_size: 1回に取得・書き込みする件数
+        directory: 出力先（未指定の場合はOSの一時ディレクトリ）
+
+    Returns:
+        書き出したファイルのパス（不要になったら呼び出し元で削除する）
+    """
+    if export_format not in EXPORT_FORMATS:
+        raise ValueError(f"未対応の出力形式です: {export_format}")
+
+    batches = iter_usage_record_batches(
+        start_datetime, end_datetime, selected_model, selected_document_type, batch_size
+    )
+    fd, path = tempfile.mkstemp(prefix="summary_usage_", suffix=f".{export_format}", dir=directory)
+    os.close(fd)
+
+    try:
+        if export_format == "csv":
+            # Excelで文字化けしないようBOM付きUTF-8で出力する
+            with open(path, "w", newline="", encoding="utf-8-sig") as f:
+                writer = csv.DictWriter(f, fieldnames=EXPORT_COLUMNS)
+                writer.writeheader()
+                for batch in batches:
+                    writer.writerows(batch)
+        else:
+            with pq.ParquetWriter(path, EXPORT_PARQUET_SCHEMA) as writer:
+                for batch in batches:
+                    writer.write_table(pa.Table.from_pylist(batch, schema=EXPORT_PARQUET_SCHEMA))
+    except Exception:
+        if os.path.exists(path):
+            os.remove(path)
+        raise
+
+    return path
+
+
+def read_export(path: str, max_bytes: Optional[int] = None) -> Optional[bytes]:
+    """
+    エクスポートしたファイルを読み込んで削除する
+
+    Returns:
+        ファイルの内容（max_bytes（未指定の場合はEXPORT_MAX_BYTES）を超える場合は読み込まずにNone）
+    """
+    try:
+        if os.path.getsize(path) > (EXPORT_MAX_BYTES if max_bytes is None else max_bytes):
+            return None
+        return Path(path).read_bytes()
+    finally:
+        os.remove(path)
+
+
+def store_export(key: Tuple[Any, ...], data: bytes, file_name: str) -> str:
+    """
+    ダウンロード用のデータを期限付きで保持し、取り出すためのトークンを返す
+
+    再描画のたびにdownload_buttonへ同じデータを渡せるよう、プロセス内に保持する
+    """
+    token = secrets.token_urlsafe(16)
+    with _exports_lock:
+        _exports[token] = {"key": key, "data": data, "file_name": file_name, "created": time.monotonic()}
+    start_export_sweeper()
+    return token
+
+
+def get_export(token: Optional[str]) -> Optional[Dict[str, Any]]:
+    if token is None:
+        return None
+    with _exports_lock:
+        return _exports.get(token)
+
+
+def discard_export(token: Optional[str]) -> None:
+    if token is None:
+        return
+    with _exports_lock:
+        _exports.pop(token, None)
+
+
+def cleanup_expired_exports(ttl: float = USAGE_EXPORT_TTL) -> int:
+    """
+    作成からttl秒を過ぎたダウンロード用のデータを破棄する
+
+    セッションを閉じた利用者のデータも対象にする
+
+    Returns:
+        破棄した件数
+    """
+    deadline = time.monotonic() - ttl
+    with _exports_lock:
+        expired = [token for token, export in _exports.items() if export["created"] < deadline]
+        for token in expired:
+            del _exports[token]
+    return len(expired)
+
+
+def _sweep_exports(interval: float) -> None:
+    while True:
+        time.sleep(interval)
+        try:
+            cleanup_expired_exports()
+        except Exception as e:
+            logger.warning("エクスポートの削除中にエラーが発生しました: %s", e)
+
+
+def start_export_sweeper(interval: float = EXPORT_SWEEP_INTERVAL) -> None:
+    """期限切れのエクスポートを定期的に破棄するスレッドを起動する（起動済みの場合は何もしない）"""
+    global _export_sweeper
+    with _exports_lock:
+        # fork後の子プロセスではスレッドが停止しているため起動し直す
+        if _export_sweeper is not None and _export_sweeper.is_alive():
+            return
+        _export_sweeper = threading.Thread(
+            target=_sweep_exports, args=(interval,), name="usage-export-sweeper", daemon=True
+        )
+        _export_sweeper.start()
+
+
+def get_page_cursors(filter_key: Tuple[Any, ...]) -> List[Optional[Tuple[datetime.datetime, int]]]:
+    """表示中ページまでのカーソル履歴を取得する（検索条件が変わった場合は先頭ページに戻す）"""
+    if st.session_state.get("usage_page_filter_key") != filter_key:
+        cursors: List[Optional[Tuple[datetime.datetime, int]]] = [None]
+        st.session_state.usage_page_filter_key = filter_key
+        st.session_state.usage_page_cursors = cursors
+    return st.session_state.usage_page_cursors
+
+
+def _model_label(model_detail: Optional[str]) -> str:
+    lowered = str(model_detail).lower()
+    for model_name, pattern in MODEL_MAPPING.items():
+        if pattern in lowered:
+            return model_name
+    return "Gemini_Pro"
+
+
 def format_department_data(dept_stats: List[Dict[str, Any]]) -> pd.DataFrame:
     """診療科別統計データをDataFrameに変換する"""
-    data = []
-    for stat in dept_stats:
-        dept_name = "全科共通" if stat["department"] == "default" else stat["department"]
-        doctor_name = "医師共通" if stat["doctor"] == "default" else stat["doctor"]
-        document_types = stat["document_types"] or "不明"
-        data.append({
-            "文書名": document_types,
-            "診療科": dept_name,
-            "医師名": doctor_name,
-            "作成件数": stat["count"],
-            "入力トークン": stat["input_tokens"],
-            "出力トークン": stat["output_tokens"],
-            "合計トークン": stat["total_tokens"],
-        })
-    return pd.DataFrame(data)
+    rows = [
+        (
+            stat["document_types"] or "不明",
+            "全科共通" if stat["department"] == "default" else stat["department"],
+            "医師共通" if stat["doctor"] == "default" else stat["doctor"],
+            stat["count"],
+            stat["input_tokens"],
+            stat["output_tokens"],
+            stat["total_tokens"],
+        )
+        for stat in dept_stats
+    ]
+    return pd.DataFrame.from_records(rows, columns=DEPARTMENT_COLUMNS)
 
 
 def format_detail_data(records: List[Dict[str, Any]]) -> pd.DataFrame:
-    """詳細レコードをDataFrameに変換する"""
-    detail_data = []
-    for record in records:
-        model_detail = str(record.get("model_detail", "")).lower()
-        model_info = "Gemini_Pro"
+    """
+    詳細レコードをDataFrameに変換する
 
-        for model_name, pattern in MODEL_MAPPING.items():
-            if pattern in model_detail:
-                model_info = model_name
-                break
+    表示は1ページ（最大200行）単位のため、列単位の変換より行ごとのループの方が速い。
+    モデル名の判定と日付の文字列化は値ごとに1回だけ行い、結果を使い回す
+    """
+    model_labels: Dict[Optional[str], str] = {}
+    date_labels: Dict[datetime.date, str] = {}
+    rows = []
 
+    for record in records:
+        # タイムゾーンなしの日時はJSTとみなす（行ごとに判定するため混在していても正しく変換される）
         record_date = record["date"]
-        if record_date.tzinfo:
-            jst_date = record_date.astimezone(JST)
-        else:
-            jst_date = JST.localize(record_date)
-
-        detail_data.append({
-            "作成日": jst_date.strftime("%Y/%m/%d"),
-            "文書名": record.get("document_types") or "不明",
-            "診療科": "全科共通" if record.get("department") == "default" else record.get("department"),
-            "医師名": "医師共通" if record.get("doctor") == "default" else record.get("doctor"),
-            "AIモデル": model_info,
-            "入力トークン": record["input_tokens"],
-            "出力トークン": record["output_tokens"],
-            "処理時間(秒)": round(record["processing_time"]) if record["processing_time"] else 0,
-        })
-    return pd.DataFrame(detail_data)
+        if record_date.tzinfo is not None:
+            record_date = record_date.astimezone(JST)
+        day = record_date.date()
+        date_label = date_labels.get(day)
+        if date_label is None:
+            date_label = date_labels[day] = day.strftime("%Y/%m/%d")
+
+        model_detail = record["model_detail"]
+        model_label = model_labels.get(model_detail)
+        if model_label is None:
+            model_label = model_labels[model_detail] = _model_label(model_detail)
+
+        processing_time = record["processing_time"]
+        rows.append((
+            date_label,
+            record["document_types"] or "不明",
+            "全科共通" if record["department"] == "default" else record["department"],
+            "医師共通" if record["doctor"] == "default" else record["doctor"],
+            model_label,
+            record["input_tokens"],
+            record["output_tokens"],
+            round(processing_time) if processing_time else 0,
+        ))
+
+    return pd.DataFrame.from_records(rows, columns=DETAIL_COLUMNS)
 
 
 @handle_error
+@instrument_queries("usage_statistics_ui")
 def usage_statistics_ui():
     if st.button("作成画面に戻る", key="back_to_main_from_stats"):
         change_page("main")
@@ -188,7 +752,7 @@ def usage_statistics_ui():
     col1, col2 = st.columns(2)
 
     with col1:
-        today = datetime.datetime.now().date()
+        today = datetime.datetime.now(JST).date()
         start_date = st.date_input("開始日", today - datetime.timedelta(days=7))
 
     with col2:
@@ -203,8 +767,7 @@ def usage_statistics_ui():
     with col4:
         selected_document_type = st.selectbox("文書名", DOCUMENT_TYPE_OPTIONS, index=0)
 
-    start_datetime = datetime.datetime.combine(start_date, datetime.time.min)
-    end_datetime = datetime.datetime.combine(end_date, datetime.time.max)
+    start_datetime, end_datetime = jst_period(start_date, end_date)
 
     # 統計データを取得
     stats = get_usage_statistics(start_datetime, end_datetime, selected_model, selected_document_type)
@@ -217,6 +780,106 @@ def usage_statistics_ui():
     dept_df = format_department_data(stats["by_department"])
     st.dataframe(dept_df, hide_index=True)
 
-    # 詳細レコードを表示
-    detail_df = format_detail_data(stats["records"])
+    # 詳細レコードを1ページ分だけ取得して表示
+    page_size = st.selectbox("表示件数", USAGE_PAGE_SIZES, index=0, key="usage_page_size")
+    cursors = get_page_cursors(
+        (start_datetime, end_datetime, selected_model, selected_document_type, page_size)
+    )
+    page = get_usage_records_page(
+        start_datetime, end_datetime, selected_model, selected_document_type, page_size, cursors[-1]
+    )
+
+    detail_df = format_detail_data(page["records"])
     st.dataframe(detail_df, hide_index=True)
+
+    col_prev, col_page, col_next = st.columns([1, 2, 1])
+
+    with col_prev:
+        if st.button("前へ", key="usage_prev_page", disabled=len(cursors) <= 1):
+            cursors.pop()
+            st.rerun()
+
+    with col_page:
+        st.caption(f"{len(cursors)}ページ目")
+
+    with col_next:
+        if st.button("次へ", key="usage_next_page", disabled=page["next_cursor"] is None):
+            cursors.append(page["next_cursor"])
+            st.rerun()
+
+    render_latency_charts(start_datetime, end_datetime, selected_model, selected_document_type)
+
+    render_usage_export(start_datetime, end_datetime, selected_model, selected_document_type)
+
+
+def render_latency_charts(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str
+) -> None:
+    st.subheader("処理時間・スループット")
+
+    col_group, col_bucket, col_metric = st.columns(3)
+
+    with col_group:
+        group_label = st.selectbox("集計単位", list(LATENCY_GROUPS), index=0, key="latency_group")
+
+    with col_bucket:
+        bucket_label = st.selectbox("期間単位", list(LATENCY_BUCKETS), index=0, key="latency_bucket")
+
+    with col_metric:
+        metric_label = st.selectbox("指標", list(LATENCY_METRICS), index=1, key="latency_metric")
+
+    latency_stats = get_latency_statistics(
+        start_datetime, end_datetime, selected_model, selected_document_type,
+        LATENCY_GROUPS[group_label], LATENCY_BUCKETS[bucket_label]
+    )
+
+    chart_df = format_latency_chart_data(latency_stats, LATENCY_METRICS[metric_label])
+    if chart_df.empty:
+        st.info("処理時間が記録されたデータがありません")
+        return
+
+    st.line_chart(chart_df)
+
+
+def render_usage_export(
+        start_datetime: datetime.datetime,
+        end_datetime: datetime.datetime,
+        selected_model: str,
+        selected_document_type: str
+) -> None:
+    col_format, col_export = st.columns(2)
+
+    with col_format:
+        export_format = st.selectbox("出力形式", list(EXPORT_FORMATS), index=0, key="usage_export_format")
+
+    export_key = (start_datetime, end_datetime, selected_model, selected_document_type, export_format)
+
+    with col_export:
+        if st.button("エクスポート", key="usage_export"):
+            discard_export(st.session_state.get("usage_export_token"))
+            st.session_state.usage_export_token = None
+
+            export_path = export_usage_records(
+                start_datetime, end_datetime, selected_model, selected_document_type, export_format
+            )
+            data = read_export(export_path)
+            if data is None:
+                st.warning("出力データが大きすぎるためダウンロードできません。期間や条件を絞り込んでください")
+            else:
+                file_name = f"summary_usage_{start_datetime:%Y%m%d}_{end_datetime:%Y%m%d}.{export_format}"
+                st.session_state.usage_export_token = store_export(export_key, data, file_name)
+
+    export = get_export(st.session_state.get("usage_export_token"))
+    if export is not None and export["key"] == export_key:
+        st.download_button(
+            "ダウンロード",
+            data=export["data"],
+            file_name=export["file_name"],
+            mime=EXPORT_FORMATS[export_format],
+            key="usage_export_download",
+            on_click="ignore"
+        )
+        st.caption(f"ダウンロードは作成から{USAGE_EXPORT_TTL // 60}分間有効です")